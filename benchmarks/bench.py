@@ -0,0 +1,533 @@
+"""
+Benchmark suite for hccinfhir.
+
+Runs each pipeline stage and the end-to-end processor over a seeded synthetic
+population (see hccinfhir.synthetic) and reports throughput, p50/p99 latency per
+unit of work and peak traced memory.
+
+Every benchmark has a "warm" variant, where the reference tables and filters are
+already cached, and most have a "cold" variant, where the caches are cleared and
+the tables are loaded from the database before each unit of work.
+
+Usage:
+    python benchmarks/bench.py
+    python benchmarks/bench.py --members 2000 --repeat 5 --only extract_sld_fhir end_to_end
+    python benchmarks/bench.py --output results.json --baseline benchmarks/baseline.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json --save-baseline
+
+With --baseline, the throughput and allocated blocks of every benchmark are
+compared against the recorded baseline and the exit status is 1 if any of them
+regressed beyond its tolerance. Throughput depends on the machine: record the
+baseline on the machine that runs the comparison (e.g. the CI runner).
+"""
+
+import argparse
+import datetime
+import gc
+import importlib.metadata
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from itertools import compress
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from hccinfhir import HCCInFHIR
+from hccinfhir.decoders import decode_lines, decoder_name, get_decoder
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.extractor_837 import extract_sld_837
+from hccinfhir.extractor_fhir import extract_sld_fhir
+from hccinfhir.filter import apply_filter, compile_filter, compile_tob_rules, get_eligible_cpt_hcpcs
+from hccinfhir.model_calculate import _categorize_for_model
+from hccinfhir.model_coefficients import apply_coefficients
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.model_dx_to_cc import apply_mapping
+from hccinfhir.model_hierarchies import apply_hierarchies
+from hccinfhir.model_interactions import apply_interactions
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+MODEL_NAME = "CMS-HCC Model V28"
+YEAR = 2026
+
+# EOB lines per unit of the NDJSON decoding benchmarks, as read by hccinfhir.readers
+NDJSON_BATCH = 1000
+
+# A unit of work: the arguments of one call and the number of items it processes
+Unit = Tuple[tuple, int]
+
+
+def clear_caches() -> None:
+    """Drop every in-process cache so the next call reloads its tables from the DB."""
+    compile_model.cache_clear()
+    get_eligible_cpt_hcpcs.cache_clear()
+    compile_tob_rules.cache_clear()
+
+
+class Workload:
+    """Synthetic inputs for every stage, grouped per member."""
+
+    def __init__(self, generator: SyntheticClaimsGenerator):
+        model = compile_model(MODEL_NAME)
+        claim_filter = compile_filter(year=YEAR)
+        self.generator = generator
+        self.members: List[Dict[str, Any]] = []
+        for index, (member_id, demographics) in enumerate(generator.demographics().items()):
+            claims = generator.member_claims(index)
+            eobs = [generator.render_eob(claim) for claim in claims]
+            slds = [sld for eob in eobs for sld in extract_sld_fhir(eob)]
+            filtered = list(compress(slds, claim_filter.mask(slds)))
+            dx_codes = sorted({dx for sld in filtered for dx in sld.claim_diagnosis_codes})
+            cc_set = set(apply_mapping(dx_codes, MODEL_NAME, model.dx_to_cc_mapping))
+            categorized = _categorize_for_model(demographics, model)
+            hcc_set = apply_hierarchies(set(cc_set), MODEL_NAME, model.hierarchies)
+            self.members.append({
+                'member_id': member_id,
+                'demographics': demographics,
+                'categorized': categorized,
+                'claims': claims,
+                'eobs': eobs,
+                'eob_lines': [json.dumps(eob, separators=(',', ':')).encode() for eob in eobs],
+                'x12': [generator.x12_837(claim_type, claims) for claim_type in ('837P', '837I')],
+                'slds': slds,
+                'dx_codes': dx_codes,
+                'cc_set': cc_set,
+                'hcc_set': hcc_set,
+                'interactions': apply_interactions(categorized, hcc_set, MODEL_NAME),
+            })
+
+    @property
+    def n_claims(self) -> int:
+        return sum(len(m['claims']) for m in self.members)
+
+    def eob_line_batches(self, size: int = NDJSON_BATCH) -> List[Unit]:
+        """The NDJSON lines of every EOB, in batches of size lines."""
+        lines = [line for m in self.members for line in m['eob_lines']]
+        return [((lines[i:i + size],), len(lines[i:i + size])) for i in range(0, len(lines), size)]
+
+
+# Each benchmark returns the function to time and its units of work for a variant.
+# Variants not listed in BENCHMARKS[name][1] are not run.
+BenchmarkFactory = Callable[[Workload, bool], Tuple[Callable[..., Any], List[Unit]]]
+BENCHMARKS: Dict[str, Tuple[BenchmarkFactory, Sequence[str], str]] = {}
+
+
+def benchmark(name: str, variants: Sequence[str] = ('warm', 'cold'), item: str = 'members'):
+    def register(factory: BenchmarkFactory) -> BenchmarkFactory:
+        BENCHMARKS[name] = (factory, variants, item)
+        return factory
+    return register
+
+
+@benchmark('extract_sld_fhir', item='eobs')
+def bench_extract_sld_fhir(workload: Workload, cold: bool):
+    def run(eobs):
+        claim_filter = compile_filter(year=YEAR)
+        return [sld for eob in eobs for sld in extract_sld_fhir(eob, claim_filter)]
+    return run, [((m['eobs'],), len(m['eobs'])) for m in workload.members]
+
+
+@benchmark('decode_json', variants=('warm',), item='eobs')
+def bench_decode_json(workload: Workload, cold: bool):
+    # Decoding alone, one json.loads per line: the cost before hccinfhir.decoders
+    def run(lines):
+        return [json.loads(line) for line in lines]
+    return run, workload.eob_line_batches()
+
+
+@benchmark('decode_lines', variants=('warm',), item='eobs')
+def bench_decode_lines(workload: Workload, cold: bool):
+    # Decoding alone, with the decoder and batching of the bulk readers
+    loads = get_decoder()
+
+    def run(lines):
+        return decode_lines(lines, loads)
+    return run, workload.eob_line_batches()
+
+
+@benchmark('ingest_ndjson', variants=('warm',), item='eobs')
+def bench_ingest_ndjson(workload: Workload, cold: bool):
+    # NDJSON lines to filtered service level data, as the batch command extracts them
+    loads = get_decoder()
+
+    def run(lines):
+        claim_filter = compile_filter(year=YEAR)
+        return extract_sld_list(decode_lines(lines, loads), "fhir", claim_filter=claim_filter)
+    return run, workload.eob_line_batches()
+
+
+@benchmark('scan_ndjson', variants=('warm',), item='eobs')
+def bench_scan_ndjson(workload: Workload, cold: bool):
+    # Same output as ingest_ndjson, with the lines validated as JSON (extract_sld_fhir_json)
+    def run(lines):
+        claim_filter = compile_filter(year=YEAR)
+        return extract_sld_list(lines, "fhir", claim_filter=claim_filter)
+    return run, workload.eob_line_batches()
+
+
+@benchmark('extract_sld_837', item='claims')
+def bench_extract_sld_837(workload: Workload, cold: bool):
+    def run(x12_files):
+        claim_filter = compile_filter(year=YEAR)
+        return [sld for content in x12_files for sld in extract_sld_837(content, claim_filter)]
+    return run, [((m['x12'],), len(m['claims'])) for m in workload.members]
+
+
+@benchmark('apply_filter', item='service_lines')
+def bench_apply_filter(workload: Workload, cold: bool):
+    def run(slds):
+        return apply_filter(slds, year=YEAR)
+    return run, [((m['slds'],), len(m['slds'])) for m in workload.members]
+
+
+@benchmark('apply_mapping')
+def bench_apply_mapping(workload: Workload, cold: bool):
+    def run(dx_codes):
+        mapping = None if cold else compile_model(MODEL_NAME).dx_to_cc_mapping
+        return apply_mapping(dx_codes, MODEL_NAME, mapping)
+    return run, [((m['dx_codes'],), 1) for m in workload.members]
+
+
+@benchmark('apply_hierarchies')
+def bench_apply_hierarchies(workload: Workload, cold: bool):
+    def run(cc_set):
+        hierarchies = None if cold else compile_model(MODEL_NAME).hierarchies
+        return apply_hierarchies(set(cc_set), MODEL_NAME, hierarchies)
+    return run, [((m['cc_set'],), 1) for m in workload.members]
+
+
+@benchmark('apply_interactions', variants=('warm',))
+def bench_apply_interactions(workload: Workload, cold: bool):
+    # Interactions are pure Python rules without reference tables: there is no cold path
+    def run(demographics, hcc_set):
+        return apply_interactions(demographics, hcc_set, MODEL_NAME)
+    return run, [((m['categorized'], m['hcc_set']), 1) for m in workload.members]
+
+
+@benchmark('apply_coefficients')
+def bench_apply_coefficients(workload: Workload, cold: bool):
+    def run(demographics, hcc_set, interactions):
+        coefficients = None if cold else compile_model(MODEL_NAME).coefficients
+        return apply_coefficients(demographics, hcc_set, interactions, MODEL_NAME, coefficients)
+    return run, [((m['categorized'], m['hcc_set'], m['interactions']), 1) for m in workload.members]
+
+
+@benchmark('end_to_end', item='eobs')
+def bench_end_to_end(workload: Workload, cold: bool):
+    processor = HCCInFHIR(model_name=MODEL_NAME)
+
+    def run(eobs, demographics):
+        # A cold run uses a fresh processor, as a new process would
+        return (HCCInFHIR(model_name=MODEL_NAME) if cold else processor).run(eobs, demographics)
+    return run, [((m['eobs'], m['demographics']), len(m['eobs'])) for m in workload.members]
+
+
+def traced_blocks() -> int:
+    """Number of memory blocks currently traced by tracemalloc."""
+    return sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def run_benchmark(name: str,
+                  variant: str,
+                  workload: Workload,
+                  repeat: int = 5,
+                  cold_units: int = 10,
+                  measure_memory: bool = True) -> Dict[str, Any]:
+    """
+    Run one benchmark variant and return its measurements.
+
+    Warm variants run a warm-up pass, then `repeat` timed passes over all units;
+    the throughput is that of the fastest pass.
+    Cold variants clear the caches before each unit and only run the first
+    `cold_units` units, since every unit then pays for the DB loads.
+    """
+    factory, _, item = BENCHMARKS[name]
+    cold = variant == 'cold'
+    fn, units = factory(workload, cold)
+    if cold:
+        units = units[:cold_units]
+    else:
+        for args, _ in units:
+            fn(*args)
+
+    latencies = []
+    pass_times = []
+    items_per_pass = sum(n_items for _, n_items in units)
+    for _ in range(repeat):
+        pass_time = 0.0
+        for args, _ in units:
+            if cold:
+                clear_caches()
+            start = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            pass_time += elapsed
+        pass_times.append(pass_time)
+    # Throughput of the fastest pass: the other passes only add scheduling noise
+    best_pass = min(pass_times) if pass_times else 0.0
+
+    peak_kib = alloc_blocks = None
+    if measure_memory:
+        if cold:
+            clear_caches()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = traced_blocks()
+            outputs = []
+            for args, _ in units:
+                if cold:
+                    clear_caches()
+                outputs.append(fn(*args))
+            peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+            # Blocks still allocated once every unit ran, with the outputs kept alive:
+            # the objects a unit of work leaves behind, which is what grows when a hot
+            # path starts materializing more than it needs
+            alloc_blocks = (traced_blocks() - before) / len(units) if units else 0.0
+        finally:
+            tracemalloc.stop()
+            outputs = None
+
+    latencies.sort()
+    return {
+        'name': name,
+        'variant': variant,
+        'item': item,
+        'units': len(units),
+        'items': items_per_pass,
+        'seconds': sum(pass_times),
+        'throughput': items_per_pass / best_pass if best_pass else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'peak_kib': peak_kib,
+        'alloc_blocks': alloc_blocks,
+    }
+
+
+def run_benchmarks(workload: Workload,
+                   names: Optional[Sequence[str]] = None,
+                   variants: Sequence[str] = ('warm', 'cold'),
+                   repeat: int = 5,
+                   cold_units: int = 10,
+                   measure_memory: bool = True) -> List[Dict[str, Any]]:
+    """Run the selected benchmarks (default: all) and return one result per variant."""
+    results = []
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark: {name}. Available: {sorted(BENCHMARKS)}")
+        for variant in BENCHMARKS[name][1]:
+            if variant in variants:
+                results.append(run_benchmark(name, variant, workload, repeat, cold_units, measure_memory))
+    # Leave the caches warm for whoever runs next
+    compile_model(MODEL_NAME)
+    return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    header = f"{'benchmark':<20} {'variant':<7} {'throughput':>26} {'p50 ms':>10} {'p99 ms':>10} {'peak KiB':>10}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        peak = f"{r['peak_kib']:10.1f}" if r['peak_kib'] is not None else f"{'-':>10}"
+        throughput = f"{r['throughput']:,.0f} {r['item']}/s"
+        lines.append(f"{r['name']:<20} {r['variant']:<7} {throughput:>26} "
+                     f"{r['p50_ms']:10.3f} {r['p99_ms']:10.3f} {peak}")
+    return "\n".join(lines)
+
+
+# Tracked metrics and whether a higher value is better
+TRACKED_METRICS = {'throughput': True, 'alloc_blocks': False}
+# Relative change tolerated before a tracked metric counts as a regression.
+# A baseline file can override them under "tolerances", keyed by "default",
+# a variant ("cold"), a benchmark name ("end_to_end") or "name:variant".
+DEFAULT_TOLERANCES = {'throughput': 0.30, 'alloc_blocks': 0.10}
+
+
+def environment_metadata(workload_args: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe the machine, interpreter and package versions the results were measured with."""
+    versions = {}
+    for package in ('hccinfhir', 'pydantic', 'sqlalchemy', 'orjson'):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+        'json_decoder': decoder_name(),
+        'git_commit': commit,
+        'workload': workload_args,
+    }
+
+
+def write_results(path: str, results: List[Dict[str, Any]], metadata: Dict[str, Any],
+                  tolerances: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    document = {'metadata': metadata, 'results': results}
+    if tolerances is not None:
+        document['tolerances'] = tolerances
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_tolerance(tolerances: Dict[str, Dict[str, float]], name: str, variant: str, metric: str) -> float:
+    tolerance = DEFAULT_TOLERANCES[metric]
+    for key in ('default', variant, name, f"{name}:{variant}"):
+        tolerance = tolerances.get(key, {}).get(metric, tolerance)
+    return tolerance
+
+
+def compare_results(results: List[Dict[str, Any]], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Compare results against a baseline document and return one row per tracked metric.
+
+    A row is a regression when the metric moved in the wrong direction by more
+    than its tolerance. Benchmarks missing from the baseline are not compared.
+    """
+    tolerances = baseline.get('tolerances', {})
+    expected = {(r['name'], r['variant']): r for r in baseline.get('results', [])}
+    rows = []
+    for result in results:
+        base = expected.get((result['name'], result['variant']))
+        if base is None:
+            continue
+        for metric, higher_is_better in TRACKED_METRICS.items():
+            current, reference = result.get(metric), base.get(metric)
+            if current is None or reference is None or reference == 0:
+                continue
+            change = (current - reference) / reference
+            tolerance = get_tolerance(tolerances, result['name'], result['variant'], metric)
+            regression = -change > tolerance if higher_is_better else change > tolerance
+            rows.append({
+                'name': result['name'],
+                'variant': result['variant'],
+                'metric': metric,
+                'baseline': reference,
+                'current': current,
+                'change': change,
+                'tolerance': tolerance,
+                'regression': regression,
+            })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    header = f"{'benchmark':<20} {'variant':<7} {'metric':<13} {'baseline':>12} {'current':>12} {'change':>8}  status"
+    lines = [header, '-' * len(header)]
+    for r in rows:
+        status = f"REGRESSION (> {r['tolerance']:.0%})" if r['regression'] else 'ok'
+        lines.append(f"{r['name']:<20} {r['variant']:<7} {r['metric']:<13} {r['baseline']:12.1f} "
+                     f"{r['current']:12.1f} {r['change']:+8.1%}  {status}")
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="hccinfhir benchmark suite")
+    parser.add_argument('--members', type=int, default=300, help="Number of synthetic members")
+    parser.add_argument('--claims-per-member', type=int, nargs=2, default=(1, 12), metavar=('MIN', 'MAX'))
+    parser.add_argument('--dx-per-claim', type=int, nargs=2, default=(1, 6), metavar=('MIN', 'MAX'))
+    parser.add_argument('--mapped-dx-rate', type=float, default=0.3)
+    parser.add_argument('--dx-distribution', choices=('zipf', 'uniform'), default='zipf')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="Timed passes per warm benchmark")
+    parser.add_argument('--cold-units', type=int, default=10, help="Units of work per cold benchmark")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument('--variants', nargs='+', choices=('warm', 'cold'), default=('warm', 'cold'))
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--output', help="Write the results and environment metadata to this JSON file")
+    parser.add_argument('--baseline', help="Compare against this JSON file; exit with 1 on regression")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write the results to --baseline instead of comparing, keeping its tolerances")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        print("--save-baseline requires --baseline", file=sys.stderr)
+        return 2
+
+    workload_args = {
+        'seed': args.seed,
+        'members': args.members,
+        'claims_per_member': list(args.claims_per_member),
+        'dx_per_claim': list(args.dx_per_claim),
+        'mapped_dx_rate': args.mapped_dx_rate,
+        'dx_distribution': args.dx_distribution,
+        'repeat': args.repeat,
+        'cold_units': args.cold_units,
+    }
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        baseline = load_results(args.baseline)
+        baseline_workload = baseline.get('metadata', {}).get('workload')
+        if not args.save_baseline and baseline_workload != workload_args:
+            print(f"Workload differs from the baseline, results are not comparable:\n"
+                  f"  baseline: {baseline_workload}\n  current:  {workload_args}", file=sys.stderr)
+            return 2
+    elif args.baseline and not args.save_baseline:
+        print(f"Baseline not found: {args.baseline}", file=sys.stderr)
+        return 2
+
+    generator = SyntheticClaimsGenerator(seed=args.seed,
+                                         n_members=args.members,
+                                         claims_per_member=tuple(args.claims_per_member),
+                                         dx_per_claim=tuple(args.dx_per_claim),
+                                         mapped_dx_rate=args.mapped_dx_rate,
+                                         dx_distribution=args.dx_distribution,
+                                         model_name=MODEL_NAME,
+                                         year=YEAR)
+    workload = Workload(generator)
+    print(f"Workload: {len(workload.members)} members, {workload.n_claims} claims (seed {args.seed})")
+    results = run_benchmarks(workload, args.only, args.variants, args.repeat,
+                             args.cold_units, not args.no_memory)
+    print(format_results(results))
+
+    metadata = environment_metadata(workload_args)
+    if args.output:
+        write_results(args.output, results, metadata)
+    if args.save_baseline:
+        tolerances = baseline.get('tolerances') if baseline else {'default': dict(DEFAULT_TOLERANCES)}
+        write_results(args.baseline, results, metadata, tolerances)
+        print(f"Baseline written to {args.baseline}")
+    elif baseline is not None:
+        rows = compare_results(results, baseline)
+        print()
+        print(format_comparison(rows))
+        regressions = [r for r in rows if r['regression']]
+        if regressions:
+            print(f"\n{len(regressions)} tracked metric(s) regressed beyond tolerance", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
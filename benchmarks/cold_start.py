@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark for hccinfhir.
+
+Measures what a CLI invocation or a serverless cold start pays before doing any
+work, in fresh interpreters:
+
+    import_package    `import hccinfhir`
+    import_processor  `from hccinfhir import HCCInFHIR`
+    first_score       HCCInFHIR() and a first run on the sample EOBs, which loads the
+                      reference tables from the database (already built)
+    second_score      the same run again, for comparison
+
+Each measurement is repeated in --runs fresh processes; the table reports the
+minimum and median. It also lists the heavy dependencies already imported after
+`import hccinfhir`, which should be none.
+
+Usage:
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 20 --output cold_start.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional, Sequence
+
+from bench import environment_metadata, write_results
+
+HEAVY_MODULES = ('sqlalchemy', 'pandas', 'pydantic', 'asyncio', 'multiprocessing')
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import hccinfhir
+imported_package = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+from hccinfhir import HCCInFHIR
+imported_processor = time.perf_counter()
+
+from hccinfhir.samples import get_eob_sample_list, get_demographics_sample
+eobs, demographics = get_eob_sample_list(), get_demographics_sample()
+
+start_score = time.perf_counter()
+HCCInFHIR().run(eobs, demographics)
+first_score = time.perf_counter()
+HCCInFHIR().run(eobs, demographics)
+second_score = time.perf_counter()
+
+print(json.dumps({{
+    'import_package': imported_package - start,
+    'import_processor': imported_processor - imported_package,
+    'first_score': first_score - start_score,
+    'second_score': second_score - first_score,
+    'heavy_modules_at_import': heavy,
+}}))
+"""
+
+MEASUREMENTS = ('import_package', 'import_processor', 'first_score', 'second_score')
+
+
+def run_child(env: Dict[str, str]) -> Dict[str, Any]:
+    completed = subprocess.run([sys.executable, '-c', CHILD.format(heavy=HEAVY_MODULES)],
+                               capture_output=True, text=True, env=env, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_cold_start(runs: int) -> List[Dict[str, Any]]:
+    """Run the measurements in `runs` fresh interpreters and summarize them."""
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [src, env.get('PYTHONPATH')]))
+
+    run_child(env)  # make sure the database exists and the bytecode is compiled
+    samples = [run_child(env) for _ in range(runs)]
+
+    results = []
+    for name in MEASUREMENTS:
+        values = sorted(sample[name] * 1000 for sample in samples)
+        results.append({
+            'name': name,
+            'runs': runs,
+            'min_ms': values[0],
+            'median_ms': statistics.median(values),
+            'max_ms': values[-1],
+        })
+    results.append({'name': 'heavy_modules_at_import',
+                    'modules': sorted({m for sample in samples for m in sample['heavy_modules_at_import']})})
+    return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    lines = [f"{'measurement':<18} {'min ms':>9} {'median ms':>10} {'max ms':>9}"]
+    for result in results:
+        if 'median_ms' in result:
+            lines.append(f"{result['name']:<18} {result['min_ms']:>9.1f} {result['median_ms']:>10.1f} "
+                         f"{result['max_ms']:>9.1f}")
+        else:
+            lines.append(f"{result['name']}: {', '.join(result['modules']) or 'none'}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="hccinfhir cold-start benchmark")
+    parser.add_argument('--runs', type=int, default=10, help="Number of fresh interpreters")
+    parser.add_argument('--output', help="Write the results and environment metadata to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_cold_start(args.runs)
+    print(format_results(results))
+    if args.output:
+        write_results(args.output, results, environment_metadata({'runs': args.runs}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
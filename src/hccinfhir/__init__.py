@@ -4,23 +4,90 @@ HCCInFHIR - HCC Algorithm for FHIR Resources
 A Python library for processing FHIR EOB resources and calculating HCC risk scores.
 """
 
-# Main classes
-from .hccinfhir import HCCInFHIR
-from .extractor import extract_sld, extract_sld_list
-from .filter import apply_filter
-from .model_calculate import calculate_raf
-from .datamodels import Demographics, ServiceLevelData, RAFResult, ModelName
-
-# Sample data functions
-from .samples import (
-    SampleData,
-    get_eob_sample,
-    get_eob_sample_list,
-    get_837_sample,
-    get_837_sample_list,
-    list_available_samples,
-    get_demographics_sample
-)
+from typing import TYPE_CHECKING
+
+# Public names and the submodule defining them. Submodules are imported on first
+# access (PEP 562), so `import hccinfhir` does not pay for pydantic, SQLAlchemy or
+# the reference data until they are used.
+_LAZY_IMPORTS = {
+    # Main classes
+    "HCCInFHIR": ".hccinfhir",
+    "extract_sld": ".extractor",
+    "extract_sld_list": ".extractor",
+    "iter_bundle_resources": ".extractor_fhir",
+    "iter_bundle_pages": ".extractor_fhir",
+    "MemberAccumulator": ".accumulator",
+    "apply_filter": ".filter",
+    "filter_mask": ".filter",
+    "compile_filter": ".filter",
+    "CompiledFilter": ".filter",
+    "calculate_raf": ".model_calculate",
+    "calculate_raf_multi": ".model_calculate",
+    "calculate_raf_from_hccs": ".model_calculate",
+    "calculate_raf_from_hccs_batch": ".model_calculate",
+    "Demographics": ".datamodels",
+    "ServiceLevelData": ".datamodels",
+    "RAFResult": ".datamodels",
+    "MultiModelRAFResult": ".datamodels",
+    "ModelName": ".datamodels",
+    "Metrics": ".instrumentation",
+    "IssueCollector": ".issues",
+    "ExtractionIssue": ".issues",
+    "score_population": ".population",
+    "PopulationMember": ".population",
+    "MemberResult": ".population",
+    "score_dataframe": ".dataframe",
+    "preload": ".cache",
+    "ResultSink": ".writers",
+
+    # Sample data functions
+    "SampleData": ".samples",
+    "get_eob_sample": ".samples",
+    "get_eob_sample_list": ".samples",
+    "get_837_sample": ".samples",
+    "get_837_sample_list": ".samples",
+    "list_available_samples": ".samples",
+    "get_demographics_sample": ".samples",
+}
+
+if TYPE_CHECKING:
+    from .hccinfhir import HCCInFHIR
+    from .extractor import extract_sld, extract_sld_list
+    from .extractor_fhir import iter_bundle_resources, iter_bundle_pages
+    from .accumulator import MemberAccumulator
+    from .filter import apply_filter, filter_mask, compile_filter, CompiledFilter
+    from .model_calculate import calculate_raf, calculate_raf_multi, calculate_raf_from_hccs, calculate_raf_from_hccs_batch
+    from .datamodels import Demographics, ServiceLevelData, RAFResult, MultiModelRAFResult, ModelName
+    from .instrumentation import Metrics
+    from .issues import IssueCollector, ExtractionIssue
+    from .population import score_population, PopulationMember, MemberResult
+    from .dataframe import score_dataframe
+    from .cache import preload
+    from .writers import ResultSink
+    from .samples import (
+        SampleData,
+        get_eob_sample,
+        get_eob_sample_list,
+        get_837_sample,
+        get_837_sample_list,
+        list_available_samples,
+        get_demographics_sample
+    )
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value  # later accesses skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
 
 __version__ = "0.1.2"
 __author__ = "Yubin Park"
@@ -31,12 +98,31 @@ __all__ = [
     "HCCInFHIR",
     "extract_sld",
     "extract_sld_list", 
+    "iter_bundle_resources",
+    "iter_bundle_pages",
     "apply_filter",
+    "filter_mask",
+    "compile_filter",
+    "CompiledFilter",
     "calculate_raf",
+    "calculate_raf_multi",
+    "calculate_raf_from_hccs",
+    "calculate_raf_from_hccs_batch",
     "Demographics",
     "ServiceLevelData",
     "RAFResult",
+    "MultiModelRAFResult",
     "ModelName",
+    "MemberAccumulator",
+    "Metrics",
+    "IssueCollector",
+    "ExtractionIssue",
+    "score_population",
+    "PopulationMember",
+    "MemberResult",
+    "score_dataframe",
+    "preload",
+    "ResultSink",
     
     # Sample data
     "SampleData",
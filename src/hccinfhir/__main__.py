@@ -0,0 +1,4 @@
+import sys
+from hccinfhir.cli import main
+
+sys.exit(main())
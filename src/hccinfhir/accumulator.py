@@ -0,0 +1,139 @@
+from itertools import compress
+from typing import Any, Dict, Iterable, Optional, Set, Union
+from hccinfhir.datamodels import Demographics, ModelName, RAFResult, ServiceLevelData
+from hccinfhir.filter import CompiledFilter
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.model_dx_to_cc import normalize_diagnosis_codes, map_normalized_diagnoses
+from hccinfhir.model_calculate import _categorize_for_model, _score_compiled_ccs
+
+
+class MemberAccumulator:
+    """
+    Incremental, mergeable RAF state for a single member.
+
+    Keeps the normalized diagnosis codes, the CC -> diagnosis provenance and the current
+    RAF result. Adding claims only maps the diagnosis codes not seen before, and the
+    member is only re-scored when the set of CCs changes. Accumulators built from
+    different files or shards can be merged without reprocessing the raw claims.
+
+    Example:
+        >>> acc = MemberAccumulator({"age": 70, "sex": "F"}, "CMS-HCC Model V28")
+        >>> delta = acc.add(extract_sld(eob))   # RAF change caused by this claim
+        >>> acc.merge(other_shard_acc)
+        >>> acc.result().risk_score
+    """
+
+    def __init__(self,
+                 demographics: Union[Demographics, Dict[str, Any]],
+                 model_name: ModelName = "CMS-HCC Model V28",
+                 claim_filter: Optional[CompiledFilter] = None,
+                 member_id: Optional[str] = None):
+        """
+        Args:
+            demographics: Demographics information
+            model_name: The name of the model to use for the calculation
+            claim_filter: Optional compiled filter applied to the service level data passed to add
+            member_id: Optional member identifier, checked when merging
+        """
+        self.model = compile_model(model_name)
+        self.demographics = _categorize_for_model(demographics, self.model)
+        self.claim_filter = claim_filter
+        self.member_id = member_id
+        self.dx_codes: Set[str] = set()
+        self.cc_to_dx: Dict[str, Set[str]] = {}
+        self.sld_count = 0
+        self._result = self._score()
+        self._provenance_changed = False
+
+    @property
+    def model_name(self) -> ModelName:
+        return self.model.model_name
+
+    @property
+    def risk_score(self) -> float:
+        return self._result.risk_score
+
+    @property
+    def hcc_set(self) -> Set[str]:
+        """Current HCCs (after hierarchies)."""
+        return set(self._result.hcc_list)
+
+    def _score(self) -> RAFResult:
+        cc_to_dx = {cc: set(dx) for cc, dx in self.cc_to_dx.items()}
+        return _score_compiled_ccs(set(cc_to_dx), self.demographics, self.model,
+                                   cc_to_dx, sorted(self.dx_codes))
+
+    def _update(self, cc_to_dx: Dict[str, Set[str]]) -> float:
+        """Merge CC -> dx provenance into the state and re-score if the CCs changed.
+
+        Without new CCs the score cannot change; the result is then only refreshed
+        lazily by result(), for the provenance and diagnosis codes.
+        """
+        new_cc = False
+        for cc, dx in cc_to_dx.items():
+            current = self.cc_to_dx.get(cc)
+            if current is None:
+                self.cc_to_dx[cc] = set(dx)
+                new_cc = True
+            else:
+                current.update(dx)
+        if not new_cc:
+            self._provenance_changed = True
+            return 0.0
+
+        previous = self._result.risk_score
+        self._result = self._score()
+        self._provenance_changed = False
+        return self._result.risk_score - previous
+
+    def add_diagnosis_codes(self, diagnosis_codes: Iterable[str]) -> float:
+        """Add diagnosis codes and return the resulting change in risk score."""
+        new_dx = normalize_diagnosis_codes(diagnosis_codes) - self.dx_codes
+        if not new_dx:
+            return 0.0
+        self.dx_codes.update(new_dx)
+        model = self.model
+        return self._update(map_normalized_diagnoses(new_dx, model.model_name, model.dx_to_cc_mapping))
+
+    def add(self, service_data: Iterable[ServiceLevelData]) -> float:
+        """
+        Add the service level data of a claim and return the resulting change in risk score.
+
+        If the accumulator has a claim_filter, lines failing it are ignored.
+        """
+        service_data = list(service_data)
+        if self.claim_filter is not None:
+            service_data = list(compress(service_data, self.claim_filter.mask(service_data)))
+        self.sld_count += len(service_data)
+        return self.add_diagnosis_codes(code for sld in service_data for code in sld.claim_diagnosis_codes)
+
+    def merge(self, other: 'MemberAccumulator') -> 'MemberAccumulator':
+        """
+        Merge another accumulator of the same member and model into this one.
+
+        Returns:
+            self, so that accumulators can be combined with functools.reduce
+
+        Raises:
+            ValueError: If the accumulators are for different models, members or demographics
+        """
+        if other.model_name != self.model_name:
+            raise ValueError(f"Cannot merge accumulators of different models: {self.model_name} != {other.model_name}")
+        if self.member_id is not None and other.member_id is not None and self.member_id != other.member_id:
+            raise ValueError(f"Cannot merge accumulators of different members: {self.member_id} != {other.member_id}")
+        if other.demographics != self.demographics:
+            raise ValueError("Cannot merge accumulators with different demographics")
+
+        if self.member_id is None:
+            self.member_id = other.member_id
+        self.sld_count += other.sld_count
+        self.dx_codes.update(other.dx_codes)
+        self._update(other.cc_to_dx)
+        return self
+
+    def result(self) -> RAFResult:
+        """Return the current RAFResult."""
+        if self._provenance_changed:
+            self._result = self._score()
+            self._provenance_changed = False
+        return self._result
@@ -0,0 +1,211 @@
+"""
+FHIR Bulk Data ($export) ingestion.
+
+An $export job writes NDJSON files per resource type, e.g.
+ExplanationOfBenefit_1.ndjson, Patient.ndjson and Coverage.ndjson, and a manifest
+listing them (the output entries, with type and url). read_export resolves the
+files of a downloaded export from its manifest or, without one, from the first
+resource of every file in the directory.
+
+The EOB files feed the batch pipeline of the `hccinfhir score-export` command (see
+hccinfhir.cli): they are read in parallel and reduced to the diagnosis codes of
+each patient, grouped across files and spilled to disk beyond a memory budget.
+Unless a demographics file is given, the demographics of the members come from
+the export itself: sex and age from Patient, and the original and current
+reasons for entitlement and the dual status from the Blue Button variables of
+Coverage (read_coverage, read_export_demographics).
+"""
+
+import json
+import os
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+from hccinfhir.decoders import Decoder, DecoderName, get_decoder
+from hccinfhir.readers import (COMPRESSED_EXTENSIONS, FHIR_EXTENSIONS, _base_name, expand_inputs,
+                               iter_ndjson_lines, read_claims)
+
+BB_VARIABLES = "https://bluebutton.cms.gov/resources/variables/"
+
+# Manifest names tried first in an export directory; any other .json file with
+# an "output" list is accepted as well
+MANIFEST_NAMES = ('manifest.json', 'export-manifest.json', 'output.json')
+
+SEX_CODES = {'male': 'M', 'female': 'F'}
+# Dual status codes accepted by Demographics
+DUAL_CODES = frozenset(['NA', '99', '00', '01', '02', '03', '04', '05', '06', '07', '08', '09', '10'])
+
+
+def _read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """The manifest at path, or None if the file is not one."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if isinstance(manifest, dict) and isinstance(manifest.get('output'), list):
+        return manifest
+    return None
+
+
+def find_manifest(directory: str) -> Optional[str]:
+    """Path of the manifest of an export directory, or None."""
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    names.sort(key=lambda name: name not in MANIFEST_NAMES)
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and _read_manifest(path) is not None:
+            return path
+    return None
+
+
+def _local_file(url: str, directory: str) -> str:
+    """
+    The downloaded file of a manifest url: the file of the same name in the
+    manifest directory, possibly compressed after download, or a local path or
+    file:// url as is.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in ('', 'file'):
+        path = unquote(parsed.path)
+        if not os.path.isabs(path):
+            path = os.path.join(directory, path)
+        if os.path.isfile(path):
+            return path
+    name = os.path.basename(unquote(parsed.path))
+    for candidate in [name] + [name + extension for extension in COMPRESSED_EXTENSIONS]:
+        path = os.path.join(directory, candidate)
+        if name and os.path.isfile(path):
+            return path
+    raise ValueError(f"{url} of the export manifest is not in {directory}")
+
+
+def resource_type_of(path: str) -> Optional[str]:
+    """resourceType of the first resource of an NDJSON file, or None if it is empty."""
+    for line in iter_ndjson_lines(path):
+        return json.loads(line).get('resourceType')
+    return None
+
+
+def read_export(path: str) -> Dict[str, List[str]]:
+    """
+    Files of a downloaded Bulk Data export, by resource type.
+
+    Args:
+        path: The manifest, or the export directory. In a directory without a
+            manifest, every NDJSON file (possibly compressed) is classified by its
+            first resource, so files can be named freely.
+
+    Returns:
+        Sorted file paths per resourceType, e.g. {"ExplanationOfBenefit": [...],
+        "Patient": [...]}. The error files of the manifest are left out.
+    """
+    manifest_path = path if os.path.isfile(path) else find_manifest(path)
+    files: Dict[str, List[str]] = {}
+    if manifest_path is not None:
+        manifest = _read_manifest(manifest_path)
+        if manifest is None:
+            raise ValueError(f"{path} is not a Bulk Data export manifest")
+        directory = os.path.dirname(os.path.abspath(manifest_path))
+        for output in manifest['output']:
+            files.setdefault(output['type'], []).append(_local_file(output['url'], directory))
+    else:
+        for file_path in expand_inputs([path]):
+            if not _base_name(file_path).endswith(FHIR_EXTENSIONS) or file_path.endswith('.json'):
+                continue
+            resource_type = resource_type_of(file_path)
+            if resource_type is not None:
+                files.setdefault(resource_type, []).append(file_path)
+    return {resource_type: sorted(paths) for resource_type, paths in files.items()}
+
+
+def coverage_demographics(coverage: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Demographics fields of a Blue Button Coverage: orec, crec, and the dual status
+    of the latest month of the year that has one (dual_01 to dual_12).
+    """
+    fields = {}
+    dual_month = 0
+    for extension in coverage.get('extension') or ():
+        url = extension.get('url') or ''
+        if not url.startswith(BB_VARIABLES):
+            continue
+        code = (extension.get('valueCoding') or {}).get('code')
+        if code is None:
+            continue
+        name = url[len(BB_VARIABLES):]
+        if name in ('orec', 'crec'):
+            fields[name] = code
+        elif name.startswith('dual_') and name[5:].isdigit() and code in DUAL_CODES:
+            month = int(name[5:])
+            if month > dual_month:
+                dual_month = month
+                fields['dual_elgbl_cd'] = code
+    return fields
+
+
+def read_coverage(paths: Iterable[str],
+                  decoder: Union[DecoderName, Decoder, None] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Demographics fields of the Coverage files of an export, per patient id.
+
+    The several Coverages of a patient (Part A, B, D...) are merged. Only these few
+    fields are kept per member, so the index is small next to the claims. Lines
+    are decoded one by one rather than with the garbage collector paused (see
+    decode_lines), as this runs on a thread next to forking worker pools.
+    """
+    loads = get_decoder(decoder)
+    by_patient: Dict[str, Dict[str, str]] = {}
+    for path in paths:
+        for line in iter_ndjson_lines(path):
+            coverage = loads(line)
+            reference = (coverage.get('beneficiary') or {}).get('reference')
+            fields = coverage_demographics(coverage)
+            if reference and fields:
+                by_patient.setdefault(reference.split('/')[-1], {}).update(fields)
+    return by_patient
+
+
+def age_on(birth_date: str, as_of: date) -> int:
+    """Age in whole years on as_of of a FHIR birthDate (YYYY, YYYY-MM or YYYY-MM-DD)."""
+    parts = [int(part) for part in birth_date[:10].split('-')]
+    year, month, day = (parts + [1, 1])[:3]
+    return as_of.year - year - ((as_of.month, as_of.day) < (month, day))
+
+
+def patient_demographics(patient: Dict[str, Any], as_of: date,
+                         coverage: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Demographics fields of a Patient: sex, and age on as_of (CMS uses February 1st
+    of the payment year), merged with the fields of its Coverage. Missing fields
+    are left out, so that Demographics reports them.
+    """
+    demographics: Dict[str, Any] = dict(coverage or ())
+    sex = SEX_CODES.get(patient.get('gender'))
+    if sex:
+        demographics['sex'] = sex
+    if patient.get('birthDate'):
+        demographics['age'] = age_on(patient['birthDate'], as_of)
+    return demographics
+
+
+def read_export_demographics(patient_paths: Iterable[str], as_of: date,
+                             coverage: Optional[Dict[str, Dict[str, str]]] = None,
+                             decoder: Union[DecoderName, Decoder, None] = None
+                             ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (member_id, demographics) from the Patient files of an export, in the
+    format of read_demographics.
+
+    Args:
+        patient_paths: Patient NDJSON files
+        as_of: Date on which ages are computed
+        coverage: Coverage fields per patient id (see read_coverage)
+        decoder: JSON decoder, see hccinfhir.decoders
+    """
+    coverage = coverage or {}
+    for path in patient_paths:
+        for patient in read_claims(path, 'fhir', decoder=decoder):
+            member_id = patient.get('id')
+            if member_id:
+                yield member_id, patient_demographics(patient, as_of, coverage.get(member_id))
@@ -0,0 +1,100 @@
+"""
+Per-process caches of the reference data loaded from the database.
+
+preload fills the caches ahead of time, e.g. in the parent of a pre-fork server so
+that the workers share the compiled tables (copy-on-write) instead of loading them
+on their first request.
+"""
+
+import gc
+import os
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar, get_args
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Every load_once cache, so that their locks can be renewed in forked children
+_caches: List[Any] = []
+
+def load_once(func: F) -> F:
+    """
+    Cache the result of a reference data loader per arguments.
+
+    Unlike functools.lru_cache, concurrent first calls with the same arguments load
+    the data once: the others wait for it. Cached results are read without locking,
+    so the loaders should return immutable values. The cache is emptied with
+    `func.cache_clear()`.
+    """
+    cache: Dict[Any, Any] = {}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        with wrapper._lock:
+            if key not in cache:
+                cache[key] = func(*args, **kwargs)
+            return cache[key]
+
+    def cache_clear() -> None:
+        with wrapper._lock:
+            cache.clear()
+
+    wrapper._lock = threading.Lock()
+    wrapper.cache_clear = cache_clear
+    _caches.append(wrapper)
+    return wrapper
+
+def _after_fork_in_child() -> None:
+    # A lock held by another thread of the parent at fork time would never be released
+    for wrapper in _caches:
+        wrapper._lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+def preload(models: Optional[Iterable[str]] = None,
+            years: Optional[Iterable[int]] = None,
+            freeze: bool = False) -> None:
+    """
+    Load the reference tables of the given models and the eligible CPT/HCPCS codes of
+    the given years into the per-process caches.
+
+    Call it in the parent process before forking workers (pre-fork servers,
+    multiprocessing with the "fork" start method): the children inherit the loaded
+    tables and serve their first request at steady-state latency. The database
+    connections are closed afterwards, and children open their own (see
+    hccinfhir.database), so no SQLite handle is shared across processes.
+
+    Args:
+        models: Models to compile. Default is every supported model.
+        years: Years of the eligible CPT/HCPCS codes. Default is every available year.
+        freeze: Call gc.freeze() once loaded, so that the garbage collector of the
+            children does not write to the shared objects and unshare their pages
+
+    Example:
+        >>> preload(models=["CMS-HCC Model V28"], years=[2026], freeze=True)
+        >>> # then fork the workers (gunicorn --preload, multiprocessing "fork", ...)
+    """
+    from hccinfhir.datamodels import ModelName, ProcFilteringFilename
+    from hccinfhir.database import dispose_engine
+    from hccinfhir.filter import compile_filter
+    from hccinfhir.model_compiled import compile_model
+
+    if models is None:
+        models = get_args(ModelName)
+    if years is None:
+        years = [int(filename.split('_')[-1].split('.')[0]) for filename in get_args(ProcFilteringFilename)]
+
+    for model_name in models:
+        compile_model(model_name)
+    for year in years:
+        compile_filter(year=year)
+
+    dispose_engine()
+    if freeze:
+        gc.freeze()
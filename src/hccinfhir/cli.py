@@ -0,0 +1,368 @@
+"""
+Command line interface.
+
+    hccinfhir score CLAIMS... --demographics members.csv --output scores.csv
+    hccinfhir score-export EXPORT_DIR --output scores.csv
+    hccinfhir score-person-diag PERSON.csv DIAG.csv --output scores.csv
+
+Batch scoring runs in two phases. Claim files (EOB NDJSON or X12 837, plain or
+gzip/bz2/xz compressed, given as files, directories or glob patterns) are first
+reduced in parallel to the diagnosis codes of each member; the demographics file
+is then streamed and every member is scored once against each model, on the same
+pool size, with results written as they complete. Beyond --max-memory, the codes
+are spilled to hash partitions on disk; the demographics are partitioned the same
+way and each worker then joins and scores whole partitions. Everything runs
+offline against the bundled reference data.
+
+score-export runs the same pipeline on the ExplanationOfBenefit files of a Bulk
+Data $export (see hccinfhir.bulk_export), with the demographics of its Patient and
+Coverage files unless a demographics file is given. score-person-diag scores CMS
+SAS software style PERSON and DIAG files (see hccinfhir.person_diag).
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from hccinfhir.readers import (ClaimFormat, Extraction, MemberDiagnoses, detect_format, expand_inputs,
+                               extract_member_diagnoses, iter_ndjson_lines, read_demographics)
+
+DEFAULT_MODEL = "CMS-HCC Model V28"
+
+
+class Progress:
+    """Throughput report on a text stream, at most every interval seconds."""
+
+    def __init__(self, stream: TextIO, interval: float = 5.0, enabled: bool = True):
+        self.stream = stream
+        self.interval = interval
+        self.enabled = enabled
+        self.phase = ''
+        self.unit = ''
+        self.count = 0
+        self.started = self.reported = time.perf_counter()
+
+    def start(self, phase: str, unit: str) -> None:
+        self.phase, self.unit, self.count = phase, unit, 0
+        self.started = self.reported = time.perf_counter()
+
+    def update(self, n: int = 1) -> None:
+        self.count += n
+        if self.enabled:
+            now = time.perf_counter()
+            if now - self.reported >= self.interval:
+                self.reported = now
+                self._print(now, '...')
+
+    def finish(self) -> float:
+        """Report the phase total and return its elapsed seconds."""
+        now = time.perf_counter()
+        if self.enabled:
+            self._print(now, 'done')
+        return now - self.started
+
+    def _print(self, now: float, state: str) -> None:
+        elapsed = now - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        self.stream.write(f"{self.phase}: {self.count:,} {self.unit} in {elapsed:.1f}s "
+                          f"({rate:,.0f} {self.unit}/s) {state}\n")
+        self.stream.flush()
+
+
+# Arguments of extract_member_diagnoses: claim format, payload, year, service_lines, decoder
+ExtractionTask = Tuple[ClaimFormat, Any, Optional[int], bool, Optional[str]]
+
+
+def _extraction_tasks(paths: Sequence[str], input_format: str, eobs_per_task: int,
+                      year: Optional[int], service_lines: bool,
+                      threaded_decompression: bool = False,
+                      json_decoder: Optional[str] = None) -> Iterator[ExtractionTask]:
+    """Split the claim files into tasks: chunks of EOB lines, or one 837 file each."""
+    for path in paths:
+        claim_format = detect_format(path) if input_format == 'auto' else input_format
+        if claim_format == '837':
+            yield '837', path, year, service_lines, json_decoder
+            continue
+        lines = iter_ndjson_lines(path, threaded_decompression)
+        while True:
+            chunk = list(islice(lines, eobs_per_task))
+            if not chunk:
+                break
+            yield 'fhir', chunk, year, service_lines, json_decoder
+
+
+def _extract_task(task: ExtractionTask) -> List[Extraction]:
+    return [extract_member_diagnoses(*task)]
+
+
+def _extract(tasks: Iterator[ExtractionTask], workers: int, year: Optional[int]) -> Iterator[Extraction]:
+    """Run the extraction tasks, in worker processes unless workers is 1."""
+    if workers == 1:
+        for task in tasks:
+            yield extract_member_diagnoses(*task)
+        return
+
+    from hccinfhir.population import _stream
+
+    context = multiprocessing.get_context()
+    if year is not None and context.get_start_method() == 'fork':
+        # Forked workers inherit the compiled filter
+        from hccinfhir.filter import compile_filter
+        compile_filter(year=year)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        yield from _stream(executor, _extract_task, tasks, 2 * workers, ordered=False)
+
+
+def _score(args: argparse.Namespace, out: TextIO, paths: List[str], input_format: str,
+           demographics: Callable[[], Iterable[Tuple[str, Dict[str, Any]]]]) -> int:
+    """
+    Extract the claim files, then score the members of the demographics stream,
+    called once the extraction is done.
+    """
+    from hccinfhir.population import score_partitions, score_population
+    from hccinfhir.writers import ResultSink, member_rows
+
+    models = args.models or [DEFAULT_MODEL]
+    year = None if args.no_filter else args.year
+    workers = max(1, args.workers or os.cpu_count() or 1)
+    max_bytes = int(args.max_memory * 1024 * 1024) if args.max_memory else None
+    progress = Progress(out, args.progress_interval, enabled=not args.quiet)
+    counts = {'records': 0, 'service_lines': 0, 'issues': 0, 'no_patient_id': 0}
+    started = time.perf_counter()
+
+    n_partitions = args.partitions or max(16, 4 * workers)
+    with MemberDiagnoses(max_bytes=max_bytes, n_partitions=n_partitions, tmp_dir=args.tmp_dir) as store, \
+            ResultSink(args.output, args.hcc_details, args.service_lines, args.output_format) as sink:
+        progress.start(f"extract {len(paths)} file(s)", 'claims')
+        tasks = _extraction_tasks(paths, input_format, args.eobs_per_task, year, bool(args.service_lines),
+                                  args.threaded_decompression, args.json_decoder)
+        for diagnoses, task_counts, service_lines in _extract(tasks, workers, year):
+            store.update(diagnoses)
+            if service_lines is not None:
+                sink.service_lines.write_columns(service_lines)
+            for key, value in task_counts.items():
+                counts[key] += value
+            progress.update(task_counts['records'])
+        progress.finish()
+
+        progress.start('score', 'members')
+        unmatched: List[str] = []
+        errors = scored = 0
+        scoring = {'model_name': models[0], 'model_names': models if len(models) > 1 else None,
+                   'backend': 'serial' if workers == 1 else 'process', 'max_workers': workers}
+        if store.spilled:
+            # Partitions are joined and scored in the workers, which send back the output rows
+            transform = partial(member_rows, hcc_details=sink.hcc_details is not None)
+            for partition in score_partitions(store.partitions(demographics()), transform=transform, **scoring):
+                for rows in partition.results:
+                    sink.write_rows(rows)
+                    if rows.error:
+                        errors += 1
+                    else:
+                        scored += 1
+                unmatched.extend(partition.unmatched)
+                progress.update(len(partition.results))
+        else:
+            for member_id, result, error in score_population(store.join(demographics(), unmatched),
+                                                             input_format='diagnosis', chunk_size=args.chunk_size,
+                                                             ordered=False, **scoring):
+                sink.write(member_id, result, error)
+                if error:
+                    errors += 1
+                else:
+                    scored += 1
+                progress.update()
+        for member_id in sorted(unmatched):
+            sink.write(member_id, None, "No demographics for this member")
+        progress.finish()
+        spills = store.spills
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - started
+        out.write(f"{counts['records']:,} claims, {counts['service_lines']:,} service lines kept, "
+                  f"{counts['issues']:,} invalid inputs, {counts['no_patient_id']:,} lines without patient id\n"
+                  f"{scored:,} members scored, {errors:,} errors, {len(unmatched):,} members without "
+                  f"demographics, {spills} spills to disk\n"
+                  f"{sink.results.rows_written:,} rows written to {args.output} in {elapsed:.1f}s\n")
+    return 0
+
+
+def score_command(args: argparse.Namespace, out: TextIO) -> int:
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        out.write("hccinfhir: no input files found\n")
+        return 1
+    return _score(args, out, paths, args.input_format,
+                  lambda: read_demographics(args.demographics, args.member_id_field))
+
+
+def score_export_command(args: argparse.Namespace, out: TextIO) -> int:
+    from hccinfhir.bulk_export import read_coverage, read_export, read_export_demographics
+    from hccinfhir.decoders import get_decoder
+
+    files = read_export(args.export)
+    paths = files.get('ExplanationOfBenefit')
+    if not paths:
+        out.write(f"hccinfhir: no ExplanationOfBenefit files in {args.export}\n")
+        return 1
+    if not args.quiet:
+        out.write("export: " + ", ".join(f"{len(files[resource_type])} {resource_type}"
+                                         for resource_type in sorted(files)) + " file(s)\n")
+    if args.demographics:
+        return _score(args, out, paths, 'fhir',
+                      lambda: read_demographics(args.demographics, args.member_id_field))
+    if not files.get('Patient'):
+        raise ValueError(f"{args.export} has no Patient files; pass --demographics")
+
+    as_of = date.fromisoformat(args.age_as_of) if args.age_as_of else date(args.year, 2, 1)
+    decoder = get_decoder(args.json_decoder)  # resolved before the Coverage thread starts
+    # The Coverage files are indexed on a thread while the EOB files are extracted
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='hccinfhir-coverage') as pool:
+        coverage = pool.submit(read_coverage, files.get('Coverage', []), decoder)
+        return _score(args, out, paths, 'fhir',
+                      lambda: read_export_demographics(files['Patient'], as_of, coverage.result(), decoder))
+
+
+def score_person_diag_command(args: argparse.Namespace, out: TextIO) -> int:
+    from hccinfhir.person_diag import score_person_diag
+
+    started = time.perf_counter()
+    as_of = date.fromisoformat(args.age_as_of) if args.age_as_of else date(args.payment_year, 2, 1)
+    counts = score_person_diag(
+        args.person, args.diag, args.output, args.models or [DEFAULT_MODEL], age_as_of=as_of,
+        id_field=args.id_field, diag_field=args.diag_field,
+        delimiter='\t' if args.delimiter == 'tab' else args.delimiter, presorted=args.presorted,
+        sort_buffer_rows=args.sort_buffer_rows, tmp_dir=args.tmp_dir, output_format=args.output_format,
+        max_workers=max(1, args.workers or os.cpu_count() or 1), chunk_size=args.chunk_size)
+    if not args.quiet:
+        out.write(f"{counts['members']:,} members scored, {counts['errors']:,} errors, "
+                  f"{counts['unmatched']:,} DIAG members without a PERSON row, written to {args.output} "
+                  f"in {time.perf_counter() - started:.1f}s\n")
+    return 0
+
+
+def rebuild_db_command(args: argparse.Namespace, out: TextIO) -> int:
+    from hccinfhir.hccinfhir import rebuild_database
+    rebuild_database()
+    if not args.quiet:
+        out.write("Reference database rebuilt\n")
+    return 0
+
+
+def _add_scoring_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by the score and score-export commands."""
+    parser.add_argument('-o', '--output', required=True, help="Output file (.csv, .ndjson or .parquet)")
+    parser.add_argument('--output-format', choices=['csv', 'ndjson', 'parquet'],
+                        help="Format of the output files; inferred from each extension by default")
+    parser.add_argument('--hcc-details', help="Also write one row per member, model and HCC to this file")
+    parser.add_argument('--service-lines', help="Also write the service lines kept by the filter to this file")
+    parser.add_argument('--threaded-decompression', action='store_true',
+                        help="Decompress .gz/.bz2/.xz NDJSON files on a background thread")
+    parser.add_argument('--json-decoder', choices=['auto', 'orjson', 'json'],
+                        help="Decode EOB lines to dicts with this decoder before extraction, instead of "
+                             "validating them as JSON directly (the default, faster)")
+    parser.add_argument('-m', '--model', dest='models', action='append',
+                        help=f"Model to score; repeat for several (default: {DEFAULT_MODEL})")
+    parser.add_argument('--year', type=int, default=2026, help="Year of the CMS filtering rules")
+    parser.add_argument('--no-filter', action='store_true', help="Keep every service line")
+    parser.add_argument('--member-id-field', default='member_id',
+                        help="Member id column of the demographics file; claims are matched on the patient id")
+    parser.add_argument('-w', '--workers', type=int, help="Worker processes (default: CPU count; 1 runs serially)")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Members per scoring task")
+    parser.add_argument('--eobs-per-task', type=int, default=1000, help="EOB lines per extraction task")
+    parser.add_argument('--max-memory', type=float,
+                        help="Memory budget in MB of the per-member diagnosis index; beyond it, the index "
+                             "is spilled to hash partitions on disk")
+    parser.add_argument('--partitions', type=int,
+                        help="Hash partitions of the spilled index, each scored on its own by a worker; raise it "
+                             "to bound the memory of a partition (default: 4 per worker, at least 16)")
+    parser.add_argument('--tmp-dir', help="Directory of the spill files (default: system temp dir)")
+    parser.add_argument('--progress-interval', type=float, default=5.0, help="Seconds between progress reports")
+    parser.add_argument('-q', '--quiet', action='store_true', help="No progress or summary on stderr")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='hccinfhir', description="HCC risk adjustment scoring")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    score = subparsers.add_parser(
+        'score', help="Score claim files in batch",
+        description="Score EOB NDJSON or X12 837 claim files, possibly compressed, for the members "
+                    "of a demographics file.")
+    score.add_argument('inputs', nargs='+',
+                       help="Claim files, directories or glob patterns (quote them; ** recurses)")
+    score.add_argument('-d', '--demographics', required=True,
+                       help="CSV or NDJSON file with a member id and the Demographics fields")
+    score.add_argument('--input-format', choices=['auto', 'fhir', '837'], default='auto',
+                       help="Format of the claim files (default: detected per file)")
+    _add_scoring_arguments(score)
+    score.set_defaults(func=score_command)
+
+    export = subparsers.add_parser(
+        'score-export', help="Score a FHIR Bulk Data $export",
+        description="Score the ExplanationOfBenefit files of a downloaded Bulk Data $export, for "
+                    "the members of its Patient and Coverage files or of a demographics file.")
+    export.add_argument('export', help="Export manifest, or directory of the export")
+    export.add_argument('-d', '--demographics',
+                        help="CSV or NDJSON file with a member id and the Demographics fields "
+                             "(default: from the Patient and Coverage files of the export)")
+    export.add_argument('--age-as-of',
+                        help="Date (YYYY-MM-DD) on which member ages are computed from Patient.birthDate "
+                             "(default: February 1 of --year)")
+    _add_scoring_arguments(export)
+    export.set_defaults(func=score_export_command)
+
+    person_diag = subparsers.add_parser(
+        'score-person-diag', help="Score CMS SAS software style PERSON and DIAG files",
+        description="Score the members of a PERSON file with the diagnoses of a DIAG file, as the CMS "
+                    "SAS software does, with one row per member and model and a 0/1 column per HCC. Both "
+                    "files are sorted by member on disk unless --presorted, then merge-joined.")
+    person_diag.add_argument('person', help="PERSON file (HICNO, SEX, DOB, OREC, ...)")
+    person_diag.add_argument('diag', help="DIAG file (HICNO, DIAG)")
+    person_diag.add_argument('-o', '--output', required=True, help="Output file (.csv, .ndjson or .parquet)")
+    person_diag.add_argument('--output-format', choices=['csv', 'ndjson', 'parquet'],
+                             help="Format of the output file; inferred from its extension by default")
+    person_diag.add_argument('-m', '--model', dest='models', action='append',
+                             help=f"Model to score; repeat for several (default: {DEFAULT_MODEL})")
+    person_diag.add_argument('--payment-year', type=int, default=2026,
+                             help="Payment year; ages are computed from DOB on February 1 of it")
+    person_diag.add_argument('--age-as-of', help="Date (YYYY-MM-DD) on which ages are computed instead")
+    person_diag.add_argument('--id-field', default='HICNO', help="Member id column of both files")
+    person_diag.add_argument('--diag-field', default='DIAG', help="Diagnosis column of the DIAG file")
+    person_diag.add_argument('--delimiter', default=',', help="Field delimiter of both files ('tab' for tabs)")
+    person_diag.add_argument('--presorted', action='store_true',
+                             help="Both files are sorted by member id: stream them without sorting")
+    person_diag.add_argument('--sort-buffer-rows', type=int, default=1_000_000,
+                             help="Rows sorted in memory at once; beyond, sorted runs are merged from disk")
+    person_diag.add_argument('--tmp-dir', help="Directory of the sorted runs (default: system temp dir)")
+    person_diag.add_argument('-w', '--workers', type=int,
+                             help="Worker processes (default: CPU count; 1 runs serially)")
+    person_diag.add_argument('--chunk-size', type=int, default=256, help="Members per scoring task")
+    person_diag.add_argument('-q', '--quiet', action='store_true', help="No summary on stderr")
+    person_diag.set_defaults(func=score_person_diag_command)
+
+    rebuild = subparsers.add_parser('rebuild-db', help="Rebuild the reference database from the bundled files")
+    rebuild.add_argument('-q', '--quiet', action='store_true')
+    rebuild.set_defaults(func=rebuild_db_command)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args, sys.stderr)
+    except (ValueError, OSError) as e:
+        sys.stderr.write(f"hccinfhir: {e}\n")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,80 @@
+"""
+SQLite reference database: ORM tables, engine and session handling, and the build
+from the bundled data.zip.
+
+This module imports SQLAlchemy, so the rest of the package only imports it inside
+the functions that load reference data; `import hccinfhir` stays cheap.
+"""
+
 import os
-import zipfile
-import tempfile
-import pandas as pd
+import threading
 from sqlalchemy import create_engine, Column, String, Float, Integer, text
 from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Dict, Tuple, Set
+from typing import Dict, Optional, Tuple
 import importlib.resources
+from hccinfhir.instrumentation import instrument_db_load
 
 Base = declarative_base()
 
 _engine = None
 _SessionLocal = None
-_db_path = os.path.join(os.path.dirname(importlib.resources.files('hccinfhir.data')), "hcc.sqlite")
+_db_path: Optional[str] = None
+
+# Guards the engine, the session factory and the database file. Reentrant because
+# rebuild_database runs while get_db_session holds it.
+_db_lock = threading.RLock()
+
+def get_db_path() -> str:
+    """Path of the SQLite database, next to the package's data directory."""
+    global _db_path
+    if _db_path is None:
+        _db_path = os.path.join(os.path.dirname(importlib.resources.files('hccinfhir.data')), "hcc.sqlite")
+    return _db_path
 
 def get_engine():
     global _engine
     if _engine is None:
-        _engine = create_engine(f'sqlite:///{_db_path}')
+        with _db_lock:
+            if _engine is None:
+                _engine = create_engine(f'sqlite:///{get_db_path()}')
     return _engine
 
 def get_db_session():
     """Returns a new database session."""
     global _SessionLocal
-    if not os.path.exists(_db_path):
-        rebuild_database()
+    session_factory = _SessionLocal
+    db_path = get_db_path()
+    if session_factory is None or not os.path.exists(db_path):
+        with _db_lock:
+            if not os.path.exists(db_path):
+                rebuild_database()
+            if _SessionLocal is None:
+                _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+            session_factory = _SessionLocal
+    return session_factory()
+
+def dispose_engine() -> None:
+    """Close the pooled connections; the next session opens a new engine."""
+    global _engine, _SessionLocal
+    with _db_lock:
+        _SessionLocal = None
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
 
-    if _SessionLocal is None:
-        engine = get_engine()
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return _SessionLocal()
+def _after_fork_in_child() -> None:
+    # The child must not use the parent's pooled SQLite connections: drop them
+    # without closing them (they still belong to the parent), and renew the lock in
+    # case another thread of the parent held it at fork time.
+    global _engine, _SessionLocal, _db_lock
+    _db_lock = threading.RLock()
+    _SessionLocal = None
+    if _engine is not None:
+        _engine.dispose(close=False)
+        _engine = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
 
 class HccIsChronic(Base):
     __tablename__ = 'hcc_is_chronic'
@@ -69,11 +115,31 @@ class RAHierarchies(Base):
     model_fullname = Column(String)
 
 def rebuild_database():
-    """Forces a rebuild of the data from the source zip file."""
-    if os.path.exists(_db_path):
-        os.remove(_db_path)
-    
-    engine = get_engine()
+    """
+    Forces a rebuild of the data from the source zip file.
+
+    The database is built in a temporary file that then replaces the current one, so
+    other threads or processes never open a partially built database.
+    """
+    with _db_lock:
+        db_path = get_db_path()
+        build_path = f"{db_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if os.path.exists(build_path):
+            os.remove(build_path)
+        engine = create_engine(f'sqlite:///{build_path}')
+        try:
+            _build_database(engine)
+        finally:
+            engine.dispose()
+        os.replace(build_path, db_path)
+        dispose_engine()
+
+def _build_database(engine) -> None:
+    # Only needed to build the database, which happens once per installation
+    import tempfile
+    import zipfile
+    import pandas as pd
+
     Base.metadata.create_all(engine)
     
     with importlib.resources.as_file(importlib.resources.files('hccinfhir.data').joinpath('data.zip')) as zip_path:
@@ -112,6 +178,7 @@ def rebuild_database():
         connection.execute(text('CREATE INDEX IF NOT EXISTS ix_ra_hierarchies_lookup ON ra_hierarchies (cc_parent, model_fullname);'))
         connection.execute(text('CREATE INDEX IF NOT EXISTS ix_ra_eligible_cpt_hcpcs_year ON ra_eligible_cpt_hcpcs (year);'))
 
+@instrument_db_load
 def load_is_chronic_from_db(model_name: str) -> Dict[Tuple[str, str], bool]:
     """Load is_chronic mapping from the database for a specific model."""
     db_session = get_db_session()
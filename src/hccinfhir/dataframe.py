@@ -0,0 +1,368 @@
+"""
+Columnar scoring of member and diagnosis tables (pandas, Polars or dicts of arrays).
+
+score_dataframe takes one table of members with their demographics and one table
+of diagnoses, in long format (one row per member and diagnosis code), and returns
+one row of scores per member with a 0/1 column per HCC of the model.
+
+The work proportional to the number of rows is done on numpy arrays:
+
+- diagnosis codes are normalized, and each distinct code is mapped to its CCs
+  with a binary search in the sorted mapping table of the model;
+- diagnoses are joined to members by member id with a sort and a binary search;
+- the CCs of each member are set as bits of a mask, one uint64 word per 64 CCs.
+
+What remains depends on the distinct values only: the hierarchies are applied
+once per distinct CC mask, the demographics are categorized once per distinct
+demographic profile, and interactions and coefficients are evaluated once per
+distinct (profile, HCC mask) pair, with the same functions as calculate_raf, so
+scores match it exactly. A population has far fewer distinct pairs than members,
+most members having few HCCs.
+
+numpy is needed, and comes with pandas or Polars; it is imported on first use.
+"""
+
+from math import fsum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from hccinfhir.datamodels import Demographics, ModelName
+from hccinfhir.model_calculate import _categorize_for_model
+from hccinfhir.model_coefficients import apply_coefficients_by_category, DEMOGRAPHIC, CHRONIC_HCC
+from hccinfhir.model_compiled import CompiledModel, compile_model
+from hccinfhir.model_hierarchies import apply_hierarchies
+from hccinfhir.model_interactions import apply_interactions
+from hccinfhir.person_diag import model_hccs
+
+# Optional demographics columns of the members table, with Demographics defaults
+# for missing columns and null values
+TEXT_FIELDS = ('dual_elgbl_cd', 'orec', 'crec')
+FLAG_FIELDS = ('new_enrollee', 'snp', 'low_income')
+
+# Text of the null values of pandas, Polars and numpy columns once converted to str
+NULL_STRINGS = ('', 'None', 'nan', 'NaN', '<NA>', 'NaT', 'null')
+TRUE_STRINGS = ('TRUE', 'T', 'Y', 'YES', '1')
+
+SCORE_COLUMNS = ('risk_score', 'risk_score_demographics', 'risk_score_chronic_only', 'risk_score_hcc')
+
+# Separates the fields of the profile keys; cannot occur in the values
+_SEPARATOR = '\x1f'
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("score_dataframe requires numpy, installed with pandas or polars: "
+                          "pip install 'hccinfhir[dataframe]'") from e
+    return numpy
+
+
+def _frame_columns(frame: Any) -> List[str]:
+    return list(frame.columns) if hasattr(frame, 'columns') else list(frame)
+
+
+def _column(frame: Any, name: str):
+    """A column of a pandas or Polars DataFrame, or of a dict of sequences, as a numpy array."""
+    np = _numpy()
+    if name not in _frame_columns(frame):
+        raise ValueError(f"Column {name!r} not found; columns are {_frame_columns(frame)}")
+    values = frame[name]
+    return values.to_numpy() if hasattr(values, 'to_numpy') else np.asarray(values)
+
+
+def _null_mask(text):
+    np = _numpy()
+    return np.isin(text, NULL_STRINGS)
+
+
+def _text_column(values, width: int = 0):
+    """
+    A column as stripped str, with '' for nulls. Numbers are written as integers,
+    zero padded to width, since float columns are how pandas reads codes with gaps.
+    """
+    np = _numpy()
+    if values.dtype.kind in 'iub':
+        text = values.astype(np.int64).astype(str)
+        return np.char.zfill(text, width) if width else text
+    if values.dtype.kind == 'f':
+        null = np.isnan(values)
+        text = np.where(null, 0, values).astype(np.int64).astype(str)
+        if width:
+            text = np.char.zfill(text, width)
+        return np.where(null, '', text)
+    text = np.char.strip(values.astype(str))
+    return np.where(_null_mask(text), '', text)
+
+
+def _number_column(values, name: str):
+    """A column as float64, with NaN for nulls."""
+    np = _numpy()
+    if values.dtype.kind in 'iufb':
+        return values.astype(np.float64)
+    text = np.char.strip(values.astype(str))
+    text = np.where(_null_mask(text), 'nan', text)
+    try:
+        return text.astype(np.float64)
+    except ValueError as e:
+        raise ValueError(f"Column {name!r} is not numeric: {e}") from e
+
+
+def _flag_column(values):
+    """A column of booleans, with False for nulls."""
+    np = _numpy()
+    if values.dtype.kind == 'b':
+        return values
+    if values.dtype.kind in 'iuf':
+        return np.nan_to_num(values.astype(np.float64)) != 0
+    return np.isin(np.char.upper(np.char.strip(values.astype(str))), TRUE_STRINGS)
+
+
+def _key_column(values):
+    """Member ids as str, so that ids read as numbers in one table and text in the other still join."""
+    np = _numpy()
+    if values.dtype.kind == 'f':
+        values = _text_column(values)
+    return np.char.strip(values.astype(str))
+
+
+def _mapping_table(model: CompiledModel, ccs: Sequence[str]):
+    """The (diagnosis code, CC index) pairs of the model, sorted by code."""
+    np = _numpy()
+    cc_index = {cc: i for i, cc in enumerate(ccs)}
+    pairs = sorted((dx, cc_index[cc]) for (dx, _), dx_ccs in model.dx_to_cc_mapping.items() for cc in dx_ccs)
+    return (np.array([dx for dx, _ in pairs], dtype=str),
+            np.array([cc for _, cc in pairs], dtype=np.int64))
+
+
+def _map_diagnoses(codes, dx_table, cc_table):
+    """
+    Map diagnosis codes to CC indexes.
+
+    Returns (rows, ccs): the index in codes of each mapped (code, CC) pair and
+    its CC index; a code mapping to several CCs appears once per CC.
+    """
+    np = _numpy()
+    if not len(codes):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = np.char.upper(np.char.replace(codes.astype(str), '.', ''))
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    first = np.searchsorted(dx_table, unique_codes, side='left')
+    counts = np.searchsorted(dx_table, unique_codes, side='right') - first
+
+    row_counts = counts[inverse]
+    rows = np.repeat(np.arange(len(codes)), row_counts)
+    # Position of each pair among the CCs of its code: 0, 1, ... within each row
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    return rows, cc_table[first[inverse][rows] + offsets]
+
+
+def _join_members(member_keys, diagnosis_keys):
+    """Index in member_keys of each diagnosis key, or -1 for unknown members."""
+    np = _numpy()
+    order = np.argsort(member_keys, kind='stable')
+    sorted_keys = member_keys[order]
+    duplicated = sorted_keys[1:] == sorted_keys[:-1]
+    if duplicated.any():
+        raise ValueError(f"Duplicate member id {sorted_keys[1:][duplicated][0]!r} in the members table")
+    if not len(sorted_keys):
+        return np.full(len(diagnosis_keys), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, diagnosis_keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == diagnosis_keys, order[positions], -1)
+
+
+def _cc_masks(members, ccs, n_members: int, n_ccs: int):
+    """Bit masks of shape (n_members, words) with bit c of a row set when the member has CC c."""
+    np = _numpy()
+    n_words = max(1, (n_ccs + 63) // 64)
+    masks = np.zeros((n_words, n_members), dtype=np.uint64)
+    bits = np.left_shift(np.uint64(1), (ccs % 64).astype(np.uint64))
+    words = ccs // 64
+    for word in range(n_words):
+        selected = words == word
+        np.bitwise_or.at(masks[word], members[selected], bits[selected])
+    return np.ascontiguousarray(masks.T)
+
+
+def _mask_ccs(mask, ccs: Sequence[str]) -> set:
+    """CC codes of one mask row."""
+    cc_set = set()
+    for word, value in enumerate(mask.tolist()):
+        while value:
+            low = value & -value
+            cc_set.add(ccs[word * 64 + low.bit_length() - 1])
+            value ^= low
+    return cc_set
+
+
+def _set_mask(cc_set: set, cc_index: Dict[str, int], n_words: int) -> List[int]:
+    words = [0] * n_words
+    for cc in cc_set:
+        i = cc_index[cc]
+        words[i // 64] |= 1 << (i % 64)
+    return words
+
+
+def _apply_hierarchies(masks, ccs: Sequence[str], model: CompiledModel):
+    """Masks after the hierarchies of the model, applied once per distinct mask."""
+    np = _numpy()
+    unique_masks, inverse = np.unique(masks, axis=0, return_inverse=True)
+    cc_index = {cc: i for i, cc in enumerate(ccs)}
+    hcc_masks = np.array([_set_mask(apply_hierarchies(_mask_ccs(mask, ccs), model.model_name, model.hierarchies),
+                                    cc_index, masks.shape[1]) for mask in unique_masks],
+                         dtype=np.uint64).reshape(unique_masks.shape)
+    return hcc_masks[inverse.reshape(-1)]
+
+
+def _demographic_profiles(members_df: Any, n_members: int, age_column: str, sex_column: str):
+    """
+    Distinct demographic profiles of the members.
+
+    Returns (profiles, inverse): the demographics fields of each profile, and the
+    profile index of each member. Nulls and missing columns are left out of the
+    fields, so Demographics applies its defaults or reports them.
+    """
+    np = _numpy()
+    columns = _frame_columns(members_df)
+    age = _number_column(_column(members_df, age_column), age_column)
+    fields = [('age', np.where(np.isnan(age), '', age.astype(str))),
+              ('sex', _text_column(_column(members_df, sex_column)))]
+    for name in TEXT_FIELDS:
+        if name in columns:
+            fields.append((name, _text_column(_column(members_df, name), 2 if name == 'dual_elgbl_cd' else 0)))
+    for name in FLAG_FIELDS:
+        if name in columns:
+            fields.append((name, np.where(_flag_column(_column(members_df, name)), '1', '')))
+    if 'graft_months' in columns:
+        graft_months = _number_column(_column(members_df, 'graft_months'), 'graft_months')
+        fields.append(('graft_months', np.where(np.isnan(graft_months), '',
+                                                np.nan_to_num(graft_months).astype(np.int64).astype(str))))
+
+    keys = fields[0][1].astype(str)
+    for _, values in fields[1:]:
+        keys = np.char.add(np.char.add(keys, _SEPARATOR), values.astype(str))
+    unique_keys, inverse = np.unique(keys, return_inverse=True) if n_members else (keys, keys.astype(np.int64))
+
+    profiles = []
+    for key in unique_keys:
+        profile: Dict[str, Any] = {}
+        for (name, _), value in zip(fields, str(key).split(_SEPARATOR)):
+            if not value:
+                continue
+            if name == 'age':
+                age_value = float(value)
+                profile[name] = int(age_value) if age_value.is_integer() else age_value
+            elif name in FLAG_FIELDS:
+                profile[name] = True
+            elif name == 'graft_months':
+                profile[name] = int(value)
+            else:
+                profile[name] = value
+        profiles.append(profile)
+    return profiles, inverse.reshape(-1)
+
+
+def _categorize(profile: Dict[str, Any], model: CompiledModel) -> Tuple[Optional[Demographics], Optional[str]]:
+    try:
+        return _categorize_for_model(profile, model), None
+    except ValueError as e:
+        return None, str(e)
+
+
+def _score(demographics: Demographics, hcc_set: set, model: CompiledModel) -> Tuple[float, float, float, float]:
+    """The scores of one (profile, HCC set) pair, decomposed as in calculate_raf."""
+    interactions = apply_interactions(demographics, hcc_set, model.model_name)
+    coefficients, categories = apply_coefficients_by_category(demographics, hcc_set, interactions,
+                                                              model.model_name, model.coefficients,
+                                                              model.chronic_hccs)
+    risk_score = fsum(coefficients.values())
+    risk_score_demographics = fsum(value for key, value in coefficients.items()
+                                   if categories[key] == DEMOGRAPHIC)
+    risk_score_chronic_only = fsum(value for key, value in coefficients.items()
+                                   if categories[key] == CHRONIC_HCC)
+    return risk_score, risk_score_demographics, risk_score_chronic_only, risk_score - risk_score_demographics
+
+
+def _to_frame(columns: Dict[str, Any], like: Any) -> Any:
+    """columns as a DataFrame of the library of like, or as is for other inputs."""
+    library = type(like).__module__.split('.')[0]
+    if library == 'pandas':
+        import pandas
+        return pandas.DataFrame(columns)
+    if library == 'polars':
+        import polars
+        return polars.DataFrame(columns)
+    return columns
+
+
+def score_dataframe(members_df: Any,
+                    diagnoses_df: Any,
+                    model_name: ModelName = "CMS-HCC Model V28",
+                    member_id_column: str = 'member_id',
+                    diagnosis_column: str = 'diagnosis_code',
+                    age_column: str = 'age',
+                    sex_column: str = 'sex',
+                    hcc_columns: bool = True) -> Any:
+    """
+    Score a table of members against a table of their diagnosis codes.
+
+    Args:
+        members_df: One row per member, with the member id, age and sex columns,
+            and optionally dual_elgbl_cd, orec, crec, new_enrollee, snp,
+            low_income and graft_months. A pandas or Polars DataFrame, or a dict
+            of column sequences.
+        diagnoses_df: One row per member and diagnosis code, with the member id
+            and diagnosis code columns. Codes may have dots and any case;
+            diagnoses of members missing from members_df are ignored.
+        model_name: HCC model name to use
+        member_id_column: Member id column of both tables
+        diagnosis_column: Diagnosis code column of diagnoses_df
+        age_column: Age column of members_df
+        sex_column: Sex column of members_df
+        hcc_columns: Whether to add a 0/1 HCC<n> column per HCC of the model
+            (after hierarchies)
+
+    Returns:
+        A frame of the type of members_df (a dict of numpy arrays for dict input),
+        with one row per member in the order of members_df: member_id,
+        risk_score, risk_score_demographics, risk_score_chronic_only,
+        risk_score_hcc, error and the HCC columns. Members with invalid
+        demographics have NaN scores and the error message.
+
+    Raises:
+        ValueError: If a column is missing or a member id is duplicated
+    """
+    np = _numpy()
+    model = compile_model(model_name)
+    ccs = model_hccs([model_name])
+
+    member_ids = _column(members_df, member_id_column)
+    n_members = len(member_ids)
+    members = _join_members(_key_column(member_ids), _key_column(_column(diagnoses_df, member_id_column)))
+    known = members >= 0
+    rows, cc_indexes = _map_diagnoses(_column(diagnoses_df, diagnosis_column)[known], *_mapping_table(model, ccs))
+    hcc_masks = _apply_hierarchies(_cc_masks(members[known][rows], cc_indexes, n_members, len(ccs)), ccs, model)
+
+    profiles, profile_index = _demographic_profiles(members_df, n_members, age_column, sex_column)
+    categorized = [_categorize(profile, model) for profile in profiles]
+
+    # Score each distinct (profile, HCC mask) pair once
+    pairs = np.column_stack([profile_index.astype(np.uint64), hcc_masks])
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    scores = np.full((len(unique_pairs), len(SCORE_COLUMNS)), np.nan)
+    pair_errors = np.full(len(unique_pairs), None, dtype=object)
+    for i, pair in enumerate(unique_pairs):
+        demographics, error = categorized[int(pair[0])]
+        if demographics is None:
+            pair_errors[i] = error
+        else:
+            scores[i] = _score(demographics, _mask_ccs(pair[1:], ccs), model)
+    inverse = inverse.reshape(-1)
+
+    columns: Dict[str, Any] = {'member_id': member_ids}
+    for i, name in enumerate(SCORE_COLUMNS):
+        columns[name] = scores[inverse, i]
+    columns['error'] = pair_errors[inverse]
+    if hcc_columns:
+        for i, cc in enumerate(ccs):
+            bits = np.right_shift(hcc_masks[:, i // 64], np.uint64(i % 64)) & np.uint64(1)
+            columns[f"HCC{cc}"] = bits.astype(np.int8)
+    return _to_frame(columns, members_df)
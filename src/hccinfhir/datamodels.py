@@ -105,4 +105,14 @@ class RAFResult(BaseModel):
     diagnosis_codes: List[str] = Field(default_factory=list, description="Input diagnosis codes")
     service_level_data: Optional[List[ServiceLevelData]] = Field(default=None, description="Processed service records")
     
-    model_config = {"extra": "forbid", "validate_assignment": True}
\ No newline at end of file
+    model_config = {"extra": "forbid", "validate_assignment": True}
+
+class MultiModelRAFResult(BaseModel):
+    """Risk adjustment results for several models scored in a single pass"""
+    results: Dict[ModelName, RAFResult] = Field(default_factory=dict, description="RAF result per model")
+    blend_weights: Dict[ModelName, float] = Field(default_factory=dict, description="Blend weight per model")
+    blended_risk_score: Optional[float] = Field(default=None, description="Weighted sum of the model risk scores; None if no blend weights")
+    diagnosis_codes: List[str] = Field(default_factory=list, description="Input diagnosis codes")
+    service_level_data: Optional[List[ServiceLevelData]] = Field(default=None, description="Processed service records")
+
+    model_config = {"extra": "forbid", "validate_assignment": True}
@@ -0,0 +1,78 @@
+"""
+JSON decoding for bulk EOB ingestion.
+
+The bulk readers (hccinfhir.readers, score_population, the batch command) decode
+NDJSON lines through get_decoder: orjson when it is installed, the standard
+library otherwise, or any callable taking a str or bytes document.
+
+Lines are decoded in batches (decode_lines). Decoding allocates many small
+containers, which triggers the cyclic garbage collector over and over, and each
+of its collections scans the EOBs decoded so far. Decoded JSON holds no reference
+cycles, so the collector is paused while a batch is decoded. On EOB NDJSON this
+roughly halves the decoding time, whichever decoder is used.
+"""
+
+import gc
+import json
+from typing import Any, Callable, Iterable, List, Literal, Union, get_args
+
+Decoder = Callable[[Union[str, bytes]], Any]
+DecoderName = Literal["auto", "orjson", "json"]
+
+DECODERS = get_args(DecoderName)
+
+
+def get_decoder(decoder: Union[DecoderName, Decoder, None] = None) -> Decoder:
+    """
+    Resolve a JSON decoder.
+
+    Args:
+        decoder: "orjson", "json" (standard library), "auto" or None for the fastest
+            installed one, or a callable that is returned as is
+
+    Returns:
+        A function decoding one JSON document from str or bytes
+    """
+    if callable(decoder):
+        return decoder
+    if decoder in (None, "auto"):
+        try:
+            import orjson
+        except ImportError:
+            return json.loads
+        return orjson.loads
+    if decoder == "orjson":
+        try:
+            import orjson
+        except ImportError as e:
+            raise ImportError("The orjson decoder requires orjson: pip install orjson") from e
+        return orjson.loads
+    if decoder == "json":
+        return json.loads
+    raise ValueError(f"decoder must be one of {list(DECODERS)} or a callable, got {decoder!r}")
+
+
+def decoder_name(decoder: Union[DecoderName, Decoder, None] = None) -> str:
+    """Name of the decoder get_decoder resolves to, e.g. for reports."""
+    resolved = get_decoder(decoder)
+    if resolved is json.loads:
+        return "json"
+    module = getattr(resolved, '__module__', None) or ''
+    return "orjson" if module.startswith('orjson') else getattr(resolved, '__qualname__', repr(resolved))
+
+
+def decode_lines(lines: Iterable[Union[str, bytes]],
+                 decoder: Union[DecoderName, Decoder, None] = None) -> List[Any]:
+    """
+    Decode a batch of JSON documents (e.g. NDJSON lines) with the garbage collector
+    paused; see the module docstring. Errors are raised as by the decoder.
+    """
+    loads = get_decoder(decoder)
+    paused = gc.isenabled()
+    if paused:
+        gc.disable()
+    try:
+        return [loads(line) for line in lines]
+    finally:
+        if paused:
+            gc.enable()
@@ -1,18 +1,27 @@
-from typing import Union, List, Literal
+from typing import Iterable, Union, List, Literal, Optional
 from hccinfhir.datamodels import ServiceLevelData
+from hccinfhir.filter import CompiledFilter
+from hccinfhir.issues import IssueCollector, INVALID_TYPE, INVALID_VALUE, logger
 from hccinfhir.extractor_837 import extract_sld_837
-from hccinfhir.extractor_fhir import extract_sld_fhir
+from hccinfhir.extractor_fhir import extract_sld_fhir, extract_sld_fhir_json, iter_bundle_resources
 
 def extract_sld(
-    data: Union[str, dict], 
-    format: Literal["837", "fhir"] = "fhir"
+    data: Union[str, bytes, dict], 
+    format: Literal["837", "fhir"] = "fhir",
+    claim_filter: Optional[CompiledFilter] = None,
+    issues: Optional[IssueCollector] = None
 ) -> List[ServiceLevelData]:
     """
     Unified entry point for SLD extraction with explicit format specification
     
     Args:
-        data: Input data - string for 837, dict for FHIR
+        data: Input data - string for 837; dict for FHIR, or the resource as JSON
+            (str or bytes, e.g. an NDJSON line), which is scanned without decoding
+            the members the extractor does not read. A FHIR Bundle dict yields the
+            service lines of its ExplanationOfBenefit entries.
         format: Data format - either "837" or "fhir"
+        claim_filter: Optional compiled filter; lines failing it are never materialized
+        issues: Optional collector for the ST/SE issues found in 837 files
         
     Returns:
         List of ServiceLevelData
@@ -27,25 +36,62 @@ def extract_sld(
     if format == "837":
         if not isinstance(data, str) or data == "":
             raise TypeError(f"837 format requires string input, got {type(data)}")
-        return extract_sld_837(data)
+        return extract_sld_837(data, claim_filter, issues)
     elif format == "fhir":
+        if isinstance(data, (str, bytes)) and data.strip():
+            return extract_sld_fhir_json(data, claim_filter)
         if not isinstance(data, dict) or data == {}:
-            raise TypeError(f"FHIR format requires dict input, got {type(data)}")   
-        return extract_sld_fhir(data)
+            raise TypeError(f"FHIR format requires dict or JSON input, got {type(data)}")
+        if data.get('resourceType') == 'Bundle':
+            return [sld for eob in iter_bundle_resources(data) for sld in extract_sld_fhir(eob, claim_filter)]
+        return extract_sld_fhir(data, claim_filter)
     else:
         raise ValueError(f'Format must be either "837" or "fhir", got {format}')
 
 
-def extract_sld_list(data: Union[List[str], List[dict]], 
-                     format: Literal["837", "fhir"] = "fhir") -> List[ServiceLevelData]:
-    """Extract SLDs from a list of FHIR EOBs"""
+def extract_sld_list(data: Iterable[Union[str, bytes, dict]], 
+                     format: Literal["837", "fhir"] = "fhir",
+                     claim_filter: Optional[CompiledFilter] = None,
+                     issues: Optional[IssueCollector] = None) -> List[ServiceLevelData]:
+    """
+    Extract SLDs from FHIR EOBs (dicts or JSON lines) or 837 strings, optionally
+    filtering while parsing. data can be any iterable, consumed once.
+
+    FHIR Bundles (dicts) are expanded to their ExplanationOfBenefit entries, so a
+    generator of searchset pages is processed one page at a time.
+
+    Invalid items are skipped and reported to `issues` with their index and claim id;
+    the entries of a Bundle are reported with the index of the Bundle.
+    Without a collector, the issues go to the 'hccinfhir' logger, rate-limited per reason.
+    """
+    report_summary = issues is None
+    if issues is None:
+        issues = IssueCollector(max_records=0, logger=logger)
+
     output = []
-    for item in data:
-        try:
-            output.extend(extract_sld(item, format))
-        except TypeError as e:
-            print(f"Warning: Skipping invalid types: {str(e)}")
-        except ValueError as e:
-            print(f"Warning: Skipping invalid values: {str(e)}")
+    for index, item in enumerate(data):
+        if format == "fhir" and isinstance(item, dict) and item.get('resourceType') == 'Bundle':
+            for eob in iter_bundle_resources(item):
+                _extract_item(eob, index, format, claim_filter, issues, output)
+        else:
+            _extract_item(item, index, format, claim_filter, issues, output)
+
+    if report_summary:
+        issues.log_summary()
     return output
 
+
+def _extract_item(item, index: int, format: Literal["837", "fhir"],
+                  claim_filter: Optional[CompiledFilter], issues: IssueCollector,
+                  output: List[ServiceLevelData]) -> None:
+    try:
+        output.extend(extract_sld(item, format, claim_filter, issues))
+    except TypeError as e:
+        issues.add(INVALID_TYPE, index, _claim_id(item), e)
+    except ValueError as e:
+        issues.add(INVALID_VALUE, index, _claim_id(item), e)
+
+
+def _claim_id(item) -> Optional[str]:
+    return item.get('id') if isinstance(item, dict) else None
+
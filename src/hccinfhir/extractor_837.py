@@ -1,6 +1,8 @@
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from hccinfhir.datamodels import ServiceLevelData
+from hccinfhir.filter import CompiledFilter
+from hccinfhir.issues import IssueCollector, ST_SE_MISMATCH, UNCLOSED_TRANSACTION, logger
 
 CLAIM_TYPES = {
     "005010X222A1": "837P",     # Professional
@@ -83,11 +85,16 @@ def process_service_line(segments: List[List[str]], start_index: int) -> tuple[O
             
     return ndc, service_date
 
-def split_into_claims(segments: List[List[str]]) -> List[List[List[str]]]:
+def split_into_claims(segments: List[List[str]],
+                      issues: Optional[IssueCollector] = None) -> List[List[List[str]]]:
     """Split segments into individual claims based on ST/SE boundaries.
     
     Each ST...SE block represents one complete claim.
     Returns a list of claim segment lists.
+
+    ST/SE control number mismatches and unclosed transactions are reported to
+    `issues` (index = transaction index, claim_id = ST control number), or to the
+    'hccinfhir' logger if no collector is given.
     """
     claims = []
     current_claim = []
@@ -116,7 +123,10 @@ def split_into_claims(segments: List[List[str]]) -> List[List[List[str]]]:
                 # Validate control numbers match (ST02 == SE02)
                 se_control_number = segment[2] if len(segment) > 2 else None
                 if st_control_number != se_control_number:
-                    print(f"Warning: ST/SE control numbers don't match: {st_control_number} != {se_control_number}")
+                    if issues is None:
+                        issues = IssueCollector(max_records=0, logger=logger)
+                    issues.add(ST_SE_MISMATCH, len(claims), st_control_number,
+                               (st_control_number, se_control_number))
                 
                 claims.append(current_claim)
                 current_claim = []
@@ -129,14 +139,21 @@ def split_into_claims(segments: List[List[str]]) -> List[List[List[str]]]:
     
     # Handle case where file doesn't end with SE (malformed)
     if current_claim:
-        print("Warning: Unclosed transaction found (missing SE)")
+        if issues is None:
+            issues = IssueCollector(max_records=0, logger=logger)
+        issues.add(UNCLOSED_TRANSACTION, len(claims), st_control_number, "missing SE")
         claims.append(current_claim)
     
     return claims
 
-def parse_837_claim_to_sld(segments: List[List[str]], claim_type: str) -> List[ServiceLevelData]:
+def parse_837_claim_to_sld(segments: List[List[str]], 
+                           claim_type: str,
+                           claim_filter: Optional[CompiledFilter] = None) -> List[ServiceLevelData]:
     """Extract service level data from 837 Professional or Institutional claims
 
+    If a compiled claim_filter is given, service lines failing the filtering rules
+    are skipped before their NDC/date lookups and before any ServiceLevelData is built.
+
     Structure:
     Billing Provider (2000A)
     └── Subscriber (2000B)
@@ -251,6 +268,11 @@ def parse_837_claim_to_sld(segments: List[List[str]], claim_type: str) -> List[S
                 place_of_service = None  # Not applicable for institutional
                 # linked diagnoses are not supported for SV2
                 
+            if (claim_filter is not None and 
+                    not claim_filter.is_eligible(current_data.facility_type, 
+                                                 current_data.service_type, 
+                                                 procedure_code)):
+                continue
             
             # Get service line details
             ndc, service_date = process_service_line(segments, i)
@@ -280,8 +302,16 @@ def parse_837_claim_to_sld(segments: List[List[str]], claim_type: str) -> List[S
     return slds
 
 
-def extract_sld_837(content: str) -> List[ServiceLevelData]:
-   
+def extract_sld_837(content: str, 
+                    claim_filter: Optional[CompiledFilter] = None,
+                    issues: Optional[IssueCollector] = None) -> List[ServiceLevelData]:
+    """Extract service level data from X12 837P/837I content.
+
+    Args:
+        content: Raw X12 837 string
+        claim_filter: Optional compiled filter applied while the service lines are parsed
+        issues: Optional collector for ST/SE issues, see split_into_claims
+    """
     if not content:
         raise ValueError("Input X12 data cannot be empty")
     
@@ -299,10 +329,10 @@ def extract_sld_837(content: str) -> List[ServiceLevelData]:
     if not claim_type:
         raise ValueError("Invalid or unsupported 837 format")
     
-    split_segments = split_into_claims(segments)
+    split_segments = split_into_claims(segments, issues)
     slds = []
     for claim_segments in split_segments:
-        slds.extend(parse_837_claim_to_sld(claim_segments, claim_type))
+        slds.extend(parse_837_claim_to_sld(claim_segments, claim_type, claim_filter))
     
     return slds
     
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, ConfigDict, Field, AliasChoices
-from typing import List, Optional, Literal, Dict
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Literal, Dict, Union
 from datetime import date
 from hccinfhir.datamodels import ServiceLevelData
+from hccinfhir.filter import CompiledFilter
 
 SYSTEMS = {
     'diagnosis': {
@@ -124,9 +125,106 @@ class ExplanationOfBenefit(ExtensionMixin):
             if i.get('system') == SYSTEMS['identifiers']['npi']
         ), None)
 
-def extract_sld_fhir(eob_data: dict) -> List[ServiceLevelData]:
+def iter_bundle_resources(bundles: Union[dict, str, bytes, Iterable[Union[dict, str, bytes]]],
+                          resource_type: Optional[str] = "ExplanationOfBenefit") -> Iterator[dict]:
+    """
+    Yield the resources of FHIR Bundles one at a time, e.g. the EOBs of the pages of a
+    searchset.
+
+    Pages are consumed as a stream: pass a generator of pages (see iter_bundle_pages)
+    and only the current page is held in memory. Entries of another resource type
+    are skipped on their resourceType alone, without being validated. Bundles nested
+    in entries are expanded, and resources given outside of a Bundle are yielded as
+    they are.
+
+    Args:
+        bundles: A Bundle, or an iterable of Bundles, as dicts or JSON (str or bytes)
+        resource_type: Type of the resources to yield; None yields every resource
+    """
+    if isinstance(bundles, (dict, str, bytes)):
+        bundles = (bundles,)
+    loads = None
+    for page in bundles:
+        if isinstance(page, (str, bytes)):
+            if loads is None:
+                from hccinfhir.decoders import get_decoder
+                loads = get_decoder()
+            page = loads(page)
+        if page.get('resourceType') != 'Bundle':
+            if resource_type is None or page.get('resourceType') == resource_type:
+                yield page
+            continue
+        for entry in page.get('entry') or ():
+            resource = entry.get('resource')
+            if not resource:
+                continue
+            if resource.get('resourceType') == 'Bundle':
+                yield from iter_bundle_resources(resource, resource_type)
+            elif resource_type is None or resource.get('resourceType') == resource_type:
+                yield resource
+
+def bundle_next_url(bundle: dict) -> Optional[str]:
+    """URL of the next page of a paged Bundle (its link with relation "next"), or None."""
+    return next((link.get('url') for link in bundle.get('link') or ()
+                 if link.get('relation') == 'next'), None)
+
+def iter_bundle_pages(bundle: dict, fetch: Callable[[str], Any]) -> Iterator[dict]:
+    """
+    Yield a Bundle and the pages that follow it, fetching each next page only once
+    the previous one has been consumed.
+
+    Args:
+        bundle: First page
+        fetch: Returns the Bundle at a URL (as a dict or JSON), e.g.
+            `lambda url: session.get(url).json()`
+    """
+    while bundle is not None:
+        if isinstance(bundle, (str, bytes)):
+            from hccinfhir.decoders import get_decoder
+            bundle = get_decoder()(bundle)
+        url = bundle_next_url(bundle)
+        yield bundle
+        bundle = fetch(url) if url else None
+
+def extract_sld_fhir(eob_data: dict,
+                     claim_filter: Optional[CompiledFilter] = None) -> List[ServiceLevelData]:
+    """
+    Extract service level data from a FHIR ExplanationOfBenefit resource.
+
+    Args:
+        eob_data: ExplanationOfBenefit resource as a dict
+        claim_filter: Optional compiled filter. If provided, service lines that fail
+            the filtering rules are dropped before they are materialized.
+
+    Returns:
+        List of ServiceLevelData
+    """
     try:
         eob = ExplanationOfBenefit.model_validate(eob_data)
+    except ValueError as e:
+        raise ValueError(f"Error processing EOB: {str(e)}")
+    return _extract_sld_from_eob(eob, claim_filter)
+
+def extract_sld_fhir_json(eob_json: Union[str, bytes],
+                          claim_filter: Optional[CompiledFilter] = None) -> List[ServiceLevelData]:
+    """
+    Extract service level data from an ExplanationOfBenefit resource given as JSON,
+    e.g. an NDJSON line, without decoding it to a dict first.
+
+    The JSON is validated straight into the ExplanationOfBenefit model by pydantic's
+    parser, which skips the members the model does not read (payment, insurance,
+    supportingInfo, total, ...) without creating Python objects for them. Results
+    are the same as extract_sld_fhir(json.loads(eob_json)).
+    """
+    try:
+        eob = ExplanationOfBenefit.model_validate_json(eob_json)
+    except ValueError as e:
+        raise ValueError(f"Error processing EOB: {str(e)}")
+    return _extract_sld_from_eob(eob, claim_filter)
+
+def _extract_sld_from_eob(eob: ExplanationOfBenefit,
+                          claim_filter: Optional[CompiledFilter]) -> List[ServiceLevelData]:
+    try:
         dx_lookup = eob.get_diagnosis_codes()
         rendering_provider = eob.get_rendering_provider()
         
@@ -144,17 +242,30 @@ def extract_sld_fhir(eob_data: dict) -> List[ServiceLevelData]:
                            eob.type.get_code(SYSTEMS['context']['service']) if eob.type else None),
             'billing_provider_npi': eob.get_billing_npi()
         }
+        facility_type = common_data['facility_type']
+        service_type = common_data['service_type']
 
         results = []
+        has_service_lines = False
         for item in eob.item or []:
             if not item.productOrService:
                 continue
 
+            procedure_code = item.productOrService.get_code(SYSTEMS['procedures']['hcpcs'])
+            ndc = (item.productOrService.get_code(SYSTEMS['identifiers']['ndc']) or
+                   item.productOrService.get_extension_code(SYSTEMS['identifiers']['ndc']))
+            if not (procedure_code or ndc):
+                continue
+            has_service_lines = True
+
+            if (claim_filter is not None and
+                    not claim_filter.is_eligible(facility_type, service_type, procedure_code)):
+                continue
+
             service_data = {
                 **common_data,
-                'procedure_code': item.productOrService.get_code(SYSTEMS['procedures']['hcpcs']),
-                'ndc': (item.productOrService.get_code(SYSTEMS['identifiers']['ndc']) or
-                       item.productOrService.get_extension_code(SYSTEMS['identifiers']['ndc'])),
+                'procedure_code': procedure_code,
+                'ndc': ndc,
                 'quantity': item.quantity.get('value') if item.quantity else None,
                 'linked_diagnosis_codes': [dx_lookup[seq] for seq in (item.diagnosisSequence or []) if seq in dx_lookup],
                 'claim_diagnosis_codes': list(dx_lookup.values()),
@@ -169,11 +280,11 @@ def extract_sld_fhir(eob_data: dict) -> List[ServiceLevelData]:
                                       if any(c.get('code') == 'eligible'
                                            for c in adj.get('category', {}).get('coding', []))), None)
             }
+            results.append(service_data)
 
-            if service_data['procedure_code'] or service_data['ndc']:
-                results.append(service_data)
-
-        if not results:
+        # Claims without any service line are kept as a single claim-level record
+        if not has_service_lines and (claim_filter is None or
+                                      claim_filter.is_eligible(facility_type, service_type, None)):
             results.append({
                 **common_data,
                 'linked_diagnosis_codes': [],
@@ -1,9 +1,18 @@
-from typing import List, Set, Optional
+from functools import lru_cache
+from itertools import compress
+from types import MappingProxyType
+from typing import FrozenSet, Iterable, List, Mapping, Set, Optional, Tuple
 from hccinfhir.datamodels import ServiceLevelData
-from hccinfhir.database import get_db_session, RAEligibleCptHcpcs
+from hccinfhir.cache import load_once
+from hccinfhir.instrumentation import instrument_db_load, record_cache_lookup, record_cache_miss
 
+INPATIENT_TOB = frozenset({'11X', '41X'})
+OUTPATIENT_TOB = frozenset({'12X', '13X', '43X', '71X', '73X', '76X', '77X', '85X', '87X'})
+
+@instrument_db_load
 def load_proc_filtering_from_db(year: int) -> Set[str]:
     """Load professional CPT/HCPCS codes from the database for a specific year."""
+    from hccinfhir.database import get_db_session, RAEligibleCptHcpcs
     db_session = get_db_session()
     try:
         query = db_session.query(RAEligibleCptHcpcs.cpt_hcpcs_code).filter(RAEligibleCptHcpcs.year == year)
@@ -11,10 +20,121 @@ def load_proc_filtering_from_db(year: int) -> Set[str]:
     finally:
         db_session.close()
 
+@load_once
+def get_eligible_cpt_hcpcs(year: int) -> FrozenSet[str]:
+    """Return the eligible CPT/HCPCS codes for a year, loading them from the DB only once."""
+    record_cache_miss()
+    return frozenset(load_proc_filtering_from_db(year))
+
+@lru_cache(maxsize=32)
+def compile_tob_rules(inpatient_tob: FrozenSet[str],
+                      outpatient_tob: FrozenSet[str]) -> Mapping[Tuple[str, str], bool]:
+    """
+    Compile Type of Bill sets into a lookup keyed on (facility_type, service_type).
+
+    The value tells whether the TOB additionally requires an eligible CPT/HCPCS code
+    (True for outpatient) or is accepted as is (False for inpatient). TOBs that are
+    not in the lookup are not eligible. The lookup is shared, hence read-only.
+    """
+    rules = {}
+    for tob_set, requires_cpt in ((outpatient_tob, True), (inpatient_tob, False)):
+        for tob in tob_set:
+            if not tob.endswith('X'):
+                continue
+            # A TOB is facility_type + service_type + 'X'; register every split so that
+            # the lookup matches exactly what string concatenation would have matched
+            prefix = tob[:-1]
+            for i in range(len(prefix) + 1):
+                rules[(prefix[:i], prefix[i:])] = requires_cpt
+    return MappingProxyType(rules)
+
+
+class CompiledFilter:
+    """
+    Precompiled CMS filtering rules that can be evaluated line by line or column-wise.
+
+    Attributes:
+        professional_cpt: Eligible CPT/HCPCS codes
+        tob_rules: (facility_type, service_type) -> whether an eligible CPT/HCPCS is required
+    """
+    __slots__ = ('professional_cpt', 'tob_rules')
+
+    def __init__(self, professional_cpt: FrozenSet[str], tob_rules: Mapping[Tuple[str, str], bool]):
+        self.professional_cpt = professional_cpt
+        self.tob_rules = tob_rules
+
+    def is_eligible(self,
+                    facility_type: Optional[str],
+                    service_type: Optional[str],
+                    procedure_code: Optional[str]) -> bool:
+        """Evaluate the filter for a single service line."""
+        if facility_type is None or service_type is None: # professional claims
+            return procedure_code in self.professional_cpt
+        requires_cpt = self.tob_rules.get((facility_type, service_type))
+        if requires_cpt is None:
+            return False
+        return not requires_cpt or procedure_code in self.professional_cpt
+
+    def mask_columns(self,
+                     facility_types: Iterable[Optional[str]],
+                     service_types: Iterable[Optional[str]],
+                     procedure_codes: Iterable[Optional[str]]) -> List[bool]:
+        """Evaluate the filter over whole columns at once and return a boolean mask."""
+        return list(map(self.is_eligible, facility_types, service_types, procedure_codes))
+
+    def mask(self, data: List[ServiceLevelData]) -> List[bool]:
+        """Evaluate the filter over a list of ServiceLevelData and return a boolean mask."""
+        return self.mask_columns([item.facility_type for item in data],
+                                 [item.service_type for item in data],
+                                 [item.procedure_code for item in data])
+
+
+def compile_filter(
+    inpatient_tob: Set[str] = INPATIENT_TOB,
+    outpatient_tob: Set[str] = OUTPATIENT_TOB,
+    professional_cpt: Optional[Set[str]] = None,
+    year: int = 2025
+) -> CompiledFilter:
+    """
+    Build a CompiledFilter; eligible codes and TOB lookups are cached across calls.
+
+    Args:
+        inpatient_tob: Inpatient Type of Bill codes (e.g., '11X')
+        outpatient_tob: Outpatient Type of Bill codes, also subject to the CPT/HCPCS check
+        professional_cpt: Optional eligible CPT/HCPCS codes. If not provided, the cached
+            codes for `year` are used.
+        year: Year of the eligible CPT/HCPCS list
+
+    Returns:
+        CompiledFilter
+    """
+    if professional_cpt is None:
+        record_cache_lookup()
+        professional_cpt = get_eligible_cpt_hcpcs(year)
+    elif not isinstance(professional_cpt, frozenset):
+        professional_cpt = frozenset(professional_cpt)
+    tob_rules = compile_tob_rules(frozenset(inpatient_tob), frozenset(outpatient_tob))
+    return CompiledFilter(professional_cpt, tob_rules)
+
+def filter_mask(
+    data: List[ServiceLevelData],
+    inpatient_tob: Set[str] = INPATIENT_TOB,
+    outpatient_tob: Set[str] = OUTPATIENT_TOB,
+    professional_cpt: Optional[Set[str]] = None,
+    year: int = 2025
+) -> List[bool]:
+    """
+    Evaluate the filtering rules and return a boolean mask aligned with `data`.
+
+    Use this instead of apply_filter when you only need to know which lines survive,
+    e.g. `itertools.compress(data, mask)`.
+    """
+    return compile_filter(inpatient_tob, outpatient_tob, professional_cpt, year).mask(data)
+
 def apply_filter(
-    data: List[ServiceLevelData], 
-    inpatient_tob: Set[str] = {'11X', '41X'},
-    outpatient_tob: Set[str] = {'12X', '13X', '43X', '71X', '73X', '76X', '77X', '85X', '87X'},
+    data: List[ServiceLevelData],
+    inpatient_tob: Set[str] = INPATIENT_TOB,
+    outpatient_tob: Set[str] = OUTPATIENT_TOB,
     professional_cpt: Optional[Set[str]] = None,
     year: int = 2025
 ) -> List[ServiceLevelData]:
@@ -26,23 +146,5 @@ def apply_filter(
     # NOTE: The original CMS logic is for the "record" level, not the service level.
     #  Thus, when preparing the service level data, put all diagnosis codes into the diagnosis field.
 
-    if professional_cpt is None:
-        professional_cpt = load_proc_filtering_from_db(year)
-
-    filtered_data = []
-    for item in data:
-        item_tob = '?' if item.facility_type is None else item.facility_type 
-        item_tob += '?' if item.service_type is None else item.service_type 
-        item_tob += 'X'
-
-        if '?' in item_tob: # professional claims
-            if item.procedure_code in professional_cpt:
-                filtered_data.append(item)
-        else:
-            if item_tob in inpatient_tob:
-                filtered_data.append(item)
-            elif item_tob in outpatient_tob:
-                if item.procedure_code in professional_cpt:
-                    filtered_data.append(item)
-            
-    return filtered_data
+    mask = filter_mask(data, inpatient_tob, outpatient_tob, professional_cpt, year)
+    return list(compress(data, mask))
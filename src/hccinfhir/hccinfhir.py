@@ -1,16 +1,21 @@
-import os
-from typing import List, Dict, Any, Union
+import threading
+from concurrent.futures import Executor
+from itertools import compress
+from typing import List, Dict, Any, Union, Optional, Iterable, Tuple
 from hccinfhir.extractor import extract_sld_list
-from hccinfhir.filter import apply_filter
-from hccinfhir.model_calculate import calculate_raf
-from hccinfhir.datamodels import Demographics, ServiceLevelData, RAFResult, ModelName, ProcFilteringFilename, DxCCMappingFilename
-from hccinfhir.database import rebuild_database as rb
+from hccinfhir.extractor_fhir import iter_bundle_resources
+from hccinfhir.filter import compile_filter, get_eligible_cpt_hcpcs, CompiledFilter
+from hccinfhir.model_calculate import calculate_raf, calculate_raf_multi, calculate_raf_from_hccs
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.datamodels import Demographics, ServiceLevelData, RAFResult, MultiModelRAFResult, ModelName, ProcFilteringFilename, DxCCMappingFilename
+from hccinfhir.issues import IssueCollector
+from hccinfhir.instrumentation import Metrics, EOBS_PARSED, SLDS_PRODUCED, SLDS_FILTERED_OUT, STAGE_EXTRACT, STAGE_FILTER
 def rebuild_database():
     """Forces a rebuild of the data from the source zip file."""
-    db_path = os.path.join(os.path.dirname(__file__), "data", "hcc.sqlite")
-    if os.path.exists(db_path):
-        os.remove(db_path)
+    from hccinfhir.database import rebuild_database as rb
     rb()
+    get_eligible_cpt_hcpcs.cache_clear()
+    compile_model.cache_clear()
 
 
 class HCCInFHIR:
@@ -26,7 +31,10 @@ class HCCInFHIR:
                  model_name: ModelName = "CMS-HCC Model V28",
                  proc_filtering_filename: ProcFilteringFilename = "ra_eligible_cpt_hcpcs_2026.csv",
                  dx_cc_mapping_filename: DxCCMappingFilename = "ra_dx_to_cc_2026.csv",
-                 rebuild_db: bool = False):
+                 rebuild_db: bool = False,
+                 metrics: Optional[Metrics] = None,
+                 issues: Optional[IssueCollector] = None,
+                 executor: Optional[Executor] = None):
         """
         Initialize the HCCInFHIR processor.
         
@@ -35,14 +43,62 @@ class HCCInFHIR:
             model_name: The name of the model to use for the calculation. Default is "CMS-HCC Model V28".
             proc_filtering_filename: The filename of the professional cpt filtering file. Default is "ra_eligible_cpt_hcpcs_2026.csv".
             dx_cc_mapping_filename: The filename of the dx to cc mapping file. Default is "ra_dx_to_cc_2026.csv".
+            metrics: Optional Metrics receiving per-stage timings and counts of every run.
+                When set, extraction and filtering run as separate stages. Default is None.
+            issues: Optional IssueCollector receiving the invalid EOBs skipped by run.
+                Default is None (issues are logged to the 'hccinfhir' logger).
+            executor: Executor running the extraction and scoring of the async methods
+                (arun, arun_many). Default is None (the event loop's default executor).
         """
         self.filter_claims = filter_claims
         self.model_name = model_name
         self.proc_filtering_filename = proc_filtering_filename
         self.dx_cc_mapping_filename = dx_cc_mapping_filename
+        self.metrics = metrics
+        self.issues = issues
+        self.executor = executor
+        self._claim_filter = None
+        self._warm_up_lock = threading.Lock()
+        self._warmed = False
+        self._warm_up_task = None  # asyncio.Future shared by the callers of await_warm_up
         if rebuild_db:
             rebuild_database()
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pickled when the async methods run on a ProcessPoolExecutor. The compiled
+        # filter is rebuilt from the per-process cache and the async state is local.
+        # metrics and issues are left out: updates made in another process would be
+        # lost on a copy anyway, and they hold locks, which cannot be pickled.
+        state = self.__dict__.copy()
+        state.update(_claim_filter=None, _warm_up_lock=None, _warmed=False, _warm_up_task=None,
+                     executor=None, metrics=None, issues=None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._warm_up_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """Load the reference data of the model and the claim filter ahead of the first run."""
+        with self._warm_up_lock:
+            if self._warmed:
+                return
+            compile_model(self.model_name)
+            if self.filter_claims:
+                self._get_claim_filter()
+            self._warmed = True
+
+    def _get_claim_filter(self) -> CompiledFilter:
+        """Compile the claim filter for the configured year once and reuse it across runs."""
+        if self._claim_filter is None:
+            year = int(self.proc_filtering_filename.split('_')[-1].split('.')[0])
+            self._claim_filter = compile_filter(year=year)
+        return self._claim_filter
+
+    def _apply_claim_filter(self, sld_list: List[ServiceLevelData]) -> List[ServiceLevelData]:
+        """Keep only the service level data that pass the CMS filtering rules."""
+        return list(compress(sld_list, self._get_claim_filter().mask(sld_list)))
+
     def _ensure_demographics(self, demographics: Union[Demographics, Dict[str, Any]]) -> Demographics:
         """Convert demographics dict to Demographics object if needed."""
         if not isinstance(demographics, Demographics):
@@ -63,13 +119,90 @@ class HCCInFHIR:
             new_enrollee=demographics.new_enrollee,
             snp=demographics.snp,
             low_income=demographics.low_income,
-            graft_months=demographics.graft_months
+            graft_months=demographics.graft_months,
+            metrics=self.metrics
+        )
+
+    def _calculate_raf_multi_from_demographics(self, diagnosis_codes: List[str],
+                                              demographics: Demographics,
+                                              model_names: Optional[List[ModelName]],
+                                              blend_weights: Optional[Dict[ModelName, float]]) -> MultiModelRAFResult:
+        """Calculate RAF scores for several models using demographics data."""
+        return calculate_raf_multi(
+            diagnosis_codes=diagnosis_codes,
+            model_names=model_names or [self.model_name],
+            age=demographics.age,
+            sex=demographics.sex,
+            dual_elgbl_cd=demographics.dual_elgbl_cd,
+            orec=demographics.orec,
+            crec=demographics.crec,
+            new_enrollee=demographics.new_enrollee,
+            snp=demographics.snp,
+            low_income=demographics.low_income,
+            graft_months=demographics.graft_months,
+            blend_weights=blend_weights,
+            metrics=self.metrics
         )
 
     def _get_unique_diagnosis_codes(self, service_data: List[ServiceLevelData]) -> List[str]:
         """Extract unique diagnosis codes from service level data."""
         return list({code for sld in service_data for code in sld.claim_diagnosis_codes})
 
+    def _extract_service_data(self, eob_list: List[Dict[str, Any]]) -> List[ServiceLevelData]:
+        """Extract service level data from EOBs; the filter is evaluated while parsing."""
+        metrics = self.metrics
+        if metrics is None:
+            claim_filter = self._get_claim_filter() if self.filter_claims else None
+            return extract_sld_list(eob_list, claim_filter=claim_filter, issues=self.issues)
+
+        # Instrumented: extract then filter, so that both stages can be timed and counted
+        if not isinstance(eob_list, list):
+            eob_list = list(eob_list)
+        with metrics.activate():
+            with metrics.stage(STAGE_EXTRACT):
+                sld_list = extract_sld_list(eob_list, issues=self.issues)
+            metrics.incr(EOBS_PARSED, len(eob_list))
+            metrics.incr(SLDS_PRODUCED, len(sld_list))
+            if self.filter_claims:
+                sld_list = self._filter_instrumented(sld_list, metrics)
+        return sld_list
+
+    def _filter_instrumented(self, sld_list: List[ServiceLevelData], metrics: Metrics) -> List[ServiceLevelData]:
+        with metrics.stage(STAGE_FILTER):
+            filtered = self._apply_claim_filter(sld_list)
+        metrics.incr(SLDS_FILTERED_OUT, len(sld_list) - len(filtered))
+        return filtered
+
+    def _standardize_service_data(self, service_data: List[Union[ServiceLevelData, Dict[str, Any]]]) -> List[ServiceLevelData]:
+        """Validate service records and apply the claim filter."""
+        if not isinstance(service_data, list):
+            raise ValueError("Service data must be a list of service records")
+                
+        # Standardize service data with better error handling
+        standardized_data = []
+        for idx, item in enumerate(service_data):
+            try:
+                if isinstance(item, dict):
+                    standardized_data.append(ServiceLevelData(**item))
+                elif isinstance(item, ServiceLevelData):
+                    standardized_data.append(item)
+                else:
+                    raise TypeError(f"Service data item must be a dictionary or ServiceLevelData object")
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(
+                    f"Invalid service data at index {idx}: {str(e)}. "
+                    "Required fields: claim_type, claim_diagnosis_codes, procedure_code, service_date"
+                )
+        
+        if self.filter_claims:
+            if self.metrics is not None:
+                with self.metrics.activate():
+                    standardized_data = self._filter_instrumented(standardized_data, self.metrics)
+            else:
+                standardized_data = self._apply_claim_filter(standardized_data)
+
+        return standardized_data
+
     def run(self, eob_list: List[Dict[str, Any]], 
             demographics: Union[Demographics, Dict[str, Any]]) -> RAFResult:
         """Process EOB resources and calculate RAF scores.
@@ -85,13 +218,7 @@ class HCCInFHIR:
             raise ValueError("eob_list must be a list; if no eob, pass empty list")
         
         demographics = self._ensure_demographics(demographics)
-        
-        # Extract and filter service level data
-        sld_list = extract_sld_list(eob_list)
-
-        if self.filter_claims:
-            year = int(self.proc_filtering_filename.split('_')[-1].split('.')[0])
-            sld_list = apply_filter(sld_list, year=year)
+        sld_list = self._extract_service_data(eob_list)
             
         # Calculate RAF score
         unique_dx_codes = self._get_unique_diagnosis_codes(sld_list)
@@ -100,33 +227,30 @@ class HCCInFHIR:
         # Create new result with service data included
         return raf_result.model_copy(update={'service_level_data': sld_list})
     
+    def run_from_bundles(self, bundles: Union[Dict[str, Any], Iterable[Any]],
+                         demographics: Union[Demographics, Dict[str, Any]]) -> RAFResult:
+        """Process the EOB entries of FHIR Bundles and calculate RAF scores.
+
+        Args:
+            bundles: A Bundle, or an iterable of Bundles such as the pages of a
+                searchset, as dicts or JSON. A generator is consumed one page at a
+                time (see iter_bundle_pages); entries other than EOBs are skipped.
+            demographics: Demographics information
+
+        Returns:
+            RAFResult object containing calculated scores and processed data
+        """
+        demographics = self._ensure_demographics(demographics)
+        sld_list = self._extract_service_data(iter_bundle_resources(bundles))
+
+        unique_dx_codes = self._get_unique_diagnosis_codes(sld_list)
+        raf_result = self._calculate_raf_from_demographics(unique_dx_codes, demographics)
+        return raf_result.model_copy(update={'service_level_data': sld_list})
+
     def run_from_service_data(self, service_data: List[Union[ServiceLevelData, Dict[str, Any]]], 
                              demographics: Union[Demographics, Dict[str, Any]]) -> RAFResult:
         demographics = self._ensure_demographics(demographics)
-        
-        if not isinstance(service_data, list):
-            raise ValueError("Service data must be a list of service records")
-                
-        # Standardize service data with better error handling
-        standardized_data = []
-        for idx, item in enumerate(service_data):
-            try:
-                if isinstance(item, dict):
-                    standardized_data.append(ServiceLevelData(**item))
-                elif isinstance(item, ServiceLevelData):
-                    standardized_data.append(item)
-                else:
-                    raise TypeError(f"Service data item must be a dictionary or ServiceLevelData object")
-            except (KeyError, TypeError, ValueError) as e:
-                raise ValueError(
-                    f"Invalid service data at index {idx}: {str(e)}. "
-                    "Required fields: claim_type, claim_diagnosis_codes, procedure_code, service_date"
-                )
-        
-        if self.filter_claims:
-            year = int(self.proc_filtering_filename.split('_')[-1].split('.')[0])
-            standardized_data = apply_filter(standardized_data, year=year)
-
+        standardized_data = self._standardize_service_data(service_data)
         
         # Calculate RAF score
         unique_dx_codes = self._get_unique_diagnosis_codes(standardized_data)
@@ -135,6 +259,49 @@ class HCCInFHIR:
         # Create new result with service data included
         return raf_result.model_copy(update={'service_level_data': standardized_data})
         
+    def run_multi(self, eob_list: List[Dict[str, Any]],
+                  demographics: Union[Demographics, Dict[str, Any]],
+                  model_names: Optional[List[ModelName]] = None,
+                  blend_weights: Optional[Dict[ModelName, float]] = None) -> MultiModelRAFResult:
+        """Process EOB resources once and score them under several models.
+
+        Extraction, filtering and diagnosis normalization run once; each model only
+        runs its own scoring stages.
+
+        Args:
+            eob_list: List of EOB resources
+            demographics: Demographics information
+            model_names: Models to score. Default is the processor's model_name.
+            blend_weights: Optional weights per model for blended_risk_score,
+                e.g. {"CMS-HCC Model V24": 0.33, "CMS-HCC Model V28": 0.67}
+
+        Returns:
+            MultiModelRAFResult with one RAFResult per model
+        """
+        if not isinstance(eob_list, list):
+            raise ValueError("eob_list must be a list; if no eob, pass empty list")
+        
+        demographics = self._ensure_demographics(demographics)
+        sld_list = self._extract_service_data(eob_list)
+
+        unique_dx_codes = self._get_unique_diagnosis_codes(sld_list)
+        multi_result = self._calculate_raf_multi_from_demographics(unique_dx_codes, demographics,
+                                                                  model_names, blend_weights)
+        return multi_result.model_copy(update={'service_level_data': sld_list})
+
+    def run_from_service_data_multi(self, service_data: List[Union[ServiceLevelData, Dict[str, Any]]],
+                                    demographics: Union[Demographics, Dict[str, Any]],
+                                    model_names: Optional[List[ModelName]] = None,
+                                    blend_weights: Optional[Dict[ModelName, float]] = None) -> MultiModelRAFResult:
+        """Process service level data once and score it under several models (see run_multi)."""
+        demographics = self._ensure_demographics(demographics)
+        standardized_data = self._standardize_service_data(service_data)
+
+        unique_dx_codes = self._get_unique_diagnosis_codes(standardized_data)
+        multi_result = self._calculate_raf_multi_from_demographics(unique_dx_codes, demographics,
+                                                                  model_names, blend_weights)
+        return multi_result.model_copy(update={'service_level_data': standardized_data})
+        
     def calculate_from_diagnosis(self, diagnosis_codes: List[str],
                                demographics: Union[Demographics, Dict[str, Any]]) -> RAFResult:
         """Calculate RAF scores from a list of diagnosis codes.
@@ -153,4 +320,120 @@ class HCCInFHIR:
         
         demographics = self._ensure_demographics(demographics)
         raf_result = self._calculate_raf_from_demographics(diagnosis_codes, demographics)
-        return raf_result
\ No newline at end of file
+        return raf_result
+
+    def calculate_from_hccs(self, hcc_codes: List[str],
+                            demographics: Union[Demographics, Dict[str, Any]],
+                            hierarchies_applied: bool = False) -> RAFResult:
+        """Calculate RAF scores from precomputed CCs/HCCs, skipping the diagnosis mapping.
+        
+        Args:
+            hcc_codes: List of CC or HCC codes, e.g. ['19', 'HCC85']
+            demographics: Demographics information
+            hierarchies_applied: True if hcc_codes are already post-hierarchy HCCs
+            
+        Raises:
+            ValueError: If hcc_codes is not a list
+        """
+        if not isinstance(hcc_codes, list):
+            raise ValueError("hcc_codes must be a list")
+        
+        demographics = self._ensure_demographics(demographics)
+        return calculate_raf_from_hccs(
+            hcc_codes=hcc_codes,
+            model_name=self.model_name,
+            age=demographics.age,
+            sex=demographics.sex,
+            dual_elgbl_cd=demographics.dual_elgbl_cd,
+            orec=demographics.orec,
+            crec=demographics.crec,
+            new_enrollee=demographics.new_enrollee,
+            snp=demographics.snp,
+            low_income=demographics.low_income,
+            graft_months=demographics.graft_months,
+            hierarchies_applied=hierarchies_applied
+        )
+
+    async def _offload(self, func, *args):
+        """Run func on the executor so that the event loop is not blocked."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def await_warm_up(self) -> None:
+        """Run warm_up on the executor once; concurrent callers await the same warm-up."""
+        if self._warmed:
+            return
+        import asyncio
+        loop = asyncio.get_running_loop()
+        task = self._warm_up_task
+        if task is None or task.get_loop() is not loop:
+            task = self._warm_up_task = asyncio.ensure_future(self._offload(self.warm_up))
+        try:
+            # Shielded: a cancelled caller must not cancel the warm-up of the others
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._warm_up_task is task:
+                self._warm_up_task = None  # the next caller retries
+            raise
+        self._warmed = True
+
+    async def arun(self, eob_list: List[Dict[str, Any]],
+                   demographics: Union[Demographics, Dict[str, Any]]) -> RAFResult:
+        """Async version of run.
+
+        The reference data is loaded once on the first call, then the extraction and
+        scoring run on the executor. Cancelling the call discards its result; work
+        already started on the executor still completes in the background.
+
+        Args:
+            eob_list: List of EOB resources
+            demographics: Demographics information
+
+        Returns:
+            RAFResult object containing calculated scores and processed data
+        """
+        await self.await_warm_up()
+        return await self._offload(self.run, eob_list, demographics)
+
+    async def arun_many(self, requests: Iterable[Tuple[List[Dict[str, Any]], Union[Demographics, Dict[str, Any]]]],
+                        max_concurrency: int = 8,
+                        return_exceptions: bool = False) -> List[Union[RAFResult, Exception]]:
+        """Run several (eob_list, demographics) requests with at most max_concurrency in flight.
+
+        Args:
+            requests: Iterable of (eob_list, demographics) pairs; consumed lazily
+            max_concurrency: Maximum number of requests submitted to the executor at once
+            return_exceptions: Return the exception of a failed request in its place
+                instead of raising it and cancelling the remaining requests
+
+        Returns:
+            Results in the order of requests
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        import asyncio
+        await self.await_warm_up()
+
+        pending = enumerate(requests)  # shared by the workers below
+        results: Dict[int, Union[RAFResult, Exception]] = {}
+
+        async def worker() -> None:
+            for index, (eob_list, demographics) in pending:
+                try:
+                    results[index] = await self._offload(self.run, eob_list, demographics)
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results[index] = e
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max_concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            # On error or cancellation, stop the requests that are still running
+            for task in workers:
+                task.cancel()
+        return [results[index] for index in range(len(results))]
@@ -0,0 +1,173 @@
+"""
+Opt-in instrumentation for HCCInFHIR and calculate_raf.
+
+Pass a Metrics instance to HCCInFHIR(metrics=...) or calculate_raf(metrics=...) to
+record the wall time of every stage and counts of the work done. Without a Metrics
+instance the code paths only pay for `if metrics is not None` checks.
+
+Deep calls that are not given the Metrics instance directly (DB loads, cache misses)
+report to the instance activated for the current thread or asyncio task, see
+Metrics.activate.
+"""
+
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Counter names
+EOBS_PARSED = 'eobs_parsed'
+SLDS_PRODUCED = 'slds_produced'
+SLDS_FILTERED_OUT = 'slds_filtered_out'
+DX_CODES_UNMAPPED = 'dx_codes_unmapped'
+CACHE_LOOKUPS = 'cache_lookups'
+CACHE_MISSES = 'cache_misses'
+CACHE_HITS = 'cache_hits'  # derived: cache_lookups - cache_misses
+DB_LOADS = 'db_loads'
+
+# Stage names
+STAGE_EXTRACT = 'extract'
+STAGE_FILTER = 'filter'
+STAGE_DB_LOAD = 'db_load'
+STAGE_DEMOGRAPHICS = 'demographics'
+STAGE_MAPPING = 'mapping'
+STAGE_HIERARCHIES = 'hierarchies'
+STAGE_INTERACTIONS = 'interactions'
+STAGE_COEFFICIENTS = 'coefficients'
+
+# Hook signature: hook(kind, name, value) with kind 'time' (seconds) or 'count'
+MetricsHook = Callable[[str, str, float], None]
+
+_active_metrics: ContextVar[Optional['Metrics']] = ContextVar('hccinfhir_metrics', default=None)
+
+
+class Metrics:
+    """
+    Registry of per-stage wall times and counters.
+
+    Safe to share between threads. An optional hook receives every measurement as it
+    is recorded, e.g. to forward it to StatsD or Prometheus.
+
+    Example:
+        >>> metrics = Metrics()
+        >>> processor = HCCInFHIR(metrics=metrics)
+        >>> processor.run(eob_list, demographics)
+        >>> metrics.snapshot()
+        {'timings': {'extract': 0.012, 'filter': 0.0004, ...},
+         'calls': {'extract': 1, ...},
+         'counters': {'eobs_parsed': 200, 'slds_produced': 512, ...}}
+    """
+
+    def __init__(self, hook: Optional[MetricsHook] = None):
+        self.hook = hook
+        self.timings: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """Record `seconds` of wall time spent in `stage`."""
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+        if self.hook is not None:
+            self.hook('time', stage, seconds)
+
+    def lap(self, stage: str, start: float) -> float:
+        """Record the time elapsed since `start` for `stage` and return the current time."""
+        now = perf_counter()
+        self.add_time(stage, now - start)
+        return now
+
+    def incr(self, counter: str, value: int = 1) -> None:
+        """Increase `counter` by `value`."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+        if self.hook is not None:
+            self.hook('count', counter, value)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Context manager recording the wall time of the enclosed block."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, perf_counter() - start)
+
+    @contextmanager
+    def activate(self) -> Iterator['Metrics']:
+        """Make this instance receive the DB load and cache measurements of the current context."""
+        token = _active_metrics.set(self)
+        try:
+            yield self
+        finally:
+            _active_metrics.reset(token)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of the recorded timings, stage call counts and counters."""
+        with self._lock:
+            counters = dict(self.counters)
+            snapshot = {'timings': dict(self.timings), 'calls': dict(self.calls), 'counters': counters}
+        if CACHE_LOOKUPS in counters:
+            counters[CACHE_HITS] = counters[CACHE_LOOKUPS] - counters.get(CACHE_MISSES, 0)
+        return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self.timings.clear()
+            self.calls.clear()
+            self.counters.clear()
+
+    def merge(self, other: 'Metrics') -> 'Metrics':
+        """Add the measurements of another instance (e.g. from another worker) to this one."""
+        snapshot = other.snapshot()
+        with self._lock:
+            for stage, seconds in snapshot['timings'].items():
+                self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+            for stage, calls in snapshot['calls'].items():
+                self.calls[stage] = self.calls.get(stage, 0) + calls
+            for counter, value in snapshot['counters'].items():
+                if counter != CACHE_HITS:
+                    self.counters[counter] = self.counters.get(counter, 0) + value
+        return self
+
+    def __repr__(self) -> str:
+        return f"Metrics(timings={self.timings!r}, counters={self.counters!r})"
+
+
+def current_metrics() -> Optional[Metrics]:
+    """Return the Metrics instance activated for the current context, if any."""
+    return _active_metrics.get()
+
+
+def record_cache_miss() -> None:
+    """Count a cache miss; called from the body of cached loaders, which only runs on a miss."""
+    metrics = _active_metrics.get()
+    if metrics is not None:
+        metrics.incr(CACHE_MISSES)
+
+
+def record_cache_lookup() -> None:
+    """Count a lookup of an instrumented cache."""
+    metrics = _active_metrics.get()
+    if metrics is not None:
+        metrics.incr(CACHE_LOOKUPS)
+
+
+def instrument_db_load(func: Callable) -> Callable:
+    """Decorator counting the calls of a DB loader and timing them under the db_load stage."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = _active_metrics.get()
+        if metrics is None:
+            return func(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.lap(STAGE_DB_LOAD, start)
+            metrics.incr(DB_LOADS)
+    return wrapper
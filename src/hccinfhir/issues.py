@@ -0,0 +1,153 @@
+"""
+Structured collection of the data quality issues found while extracting claims.
+
+Extractors report invalid inputs (e.g. an EOB that fails validation, an 837
+transaction whose ST/SE control numbers do not match) to an IssueCollector instead
+of printing them. The collector keeps a bounded number of records, counts every
+issue by reason, and can forward a rate-limited number of them to `logging`.
+Messages are only formatted when a record is logged or read.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger('hccinfhir')
+
+# Issue reasons
+INVALID_TYPE = 'invalid_type'
+INVALID_VALUE = 'invalid_value'
+ST_SE_MISMATCH = 'st_se_control_number_mismatch'
+UNCLOSED_TRANSACTION = 'unclosed_transaction'
+
+
+class ExtractionIssue(NamedTuple):
+    """
+    One issue found while extracting claims.
+
+    Attributes:
+        reason: Machine readable reason, e.g. 'invalid_value'
+        index: Position of the input in the list passed to extract_sld_list, or of the
+            transaction within an 837 file for ST/SE issues
+        claim_id: Claim (EOB id or ST control number) if known
+        detail: The exception or the values behind the issue; formatted lazily
+    """
+    reason: str
+    index: Optional[int] = None
+    claim_id: Optional[str] = None
+    detail: Any = None
+
+    @property
+    def message(self) -> str:
+        location = f"index {self.index}" if self.index is not None else "unknown index"
+        if self.claim_id is not None:
+            location += f", claim {self.claim_id}"
+        return f"{self.reason} at {location}: {self.detail}"
+
+
+class IssueCollector:
+    """
+    Bounded, aggregated collection of ExtractionIssue records; safe to share across threads.
+
+    Args:
+        max_records: Maximum number of records kept; further issues are only counted
+        logger: Optional logger receiving the issues as they are found
+        log_level: Level of the log records
+        log_limit: Maximum number of log records per reason; the remaining issues of
+            a reason are reported by log_summary
+
+    Example:
+        >>> issues = IssueCollector()
+        >>> slds = extract_sld_list(eobs, issues=issues)
+        >>> issues.counts
+        {'invalid_value': 3}
+        >>> [issue.index for issue in issues]
+        [17, 42, 980]
+    """
+
+    def __init__(self,
+                 max_records: int = 1000,
+                 logger: Optional[logging.Logger] = None,
+                 log_level: int = logging.WARNING,
+                 log_limit: int = 10):
+        self.max_records = max_records
+        self.logger = logger
+        self.log_level = log_level
+        self.log_limit = log_limit
+        self.records: List[ExtractionIssue] = []
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, reason: str, index: Optional[int] = None,
+            claim_id: Optional[str] = None, detail: Any = None) -> None:
+        """Record an issue; only counted once max_records records are kept."""
+        issue = ExtractionIssue(reason, index, claim_id, detail)
+        with self._lock:
+            count = self.counts.get(reason, 0) + 1
+            self.counts[reason] = count
+            if len(self.records) < self.max_records:
+                self.records.append(issue)
+        if self.logger is not None and count <= self.log_limit:
+            # Arguments are only formatted if the logger is enabled for the level
+            self.logger.log(self.log_level, "Skipping input: %s", _LazyMessage(issue))
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def dropped(self) -> int:
+        """Number of issues counted but not kept as records."""
+        return self.total - len(self.records)
+
+    def summary(self) -> Dict[str, int]:
+        """Return the number of issues per reason."""
+        return dict(self.counts)
+
+    def log_summary(self, logger: Optional[logging.Logger] = None) -> None:
+        """Log one aggregated record per reason whose issues exceeded log_limit."""
+        target = logger or self.logger
+        if target is None:
+            return
+        for reason, count in self.counts.items():
+            if count > self.log_limit:
+                target.log(self.log_level, "%d more issues with reason %s were not logged",
+                           count - self.log_limit, reason)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+            self.counts.clear()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The lock cannot be pickled; a copy gets its own
+        with self._lock:
+            state = self.__dict__.copy()
+            state['records'] = list(self.records)
+            state['counts'] = dict(self.counts)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __iter__(self) -> Iterator[ExtractionIssue]:
+        return iter(self.records)
+
+    def __repr__(self) -> str:
+        return f"IssueCollector(counts={self.counts!r}, records={len(self.records)})"
+
+
+class _LazyMessage:
+    """Defers ExtractionIssue.message until a log handler formats the record."""
+    __slots__ = ('issue',)
+
+    def __init__(self, issue: ExtractionIssue):
+        self.issue = issue
+
+    def __str__(self) -> str:
+        return self.issue.message
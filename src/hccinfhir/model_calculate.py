@@ -1,23 +1,141 @@
-from typing import List, Union, Dict, Tuple, Set, Optional
-from hccinfhir.datamodels import ModelName, RAFResult
+from math import fsum
+from time import perf_counter
+from typing import Any, Iterable, List, Union, Dict, Tuple, Set, Optional
+from hccinfhir.datamodels import ModelName, RAFResult, MultiModelRAFResult, Demographics
 from hccinfhir.model_demographics import categorize_demographics
-from hccinfhir.model_dx_to_cc import apply_mapping
+from hccinfhir.model_dx_to_cc import normalize_diagnosis_codes, map_normalized_diagnoses
 from hccinfhir.model_hierarchies import apply_hierarchies
-from hccinfhir.model_coefficients import apply_coefficients
+from hccinfhir.model_coefficients import apply_coefficients_by_category, DEMOGRAPHIC, CHRONIC_HCC
 from hccinfhir.model_interactions import apply_interactions
-from hccinfhir.database import load_is_chronic_from_db
+from hccinfhir.model_compiled import CompiledModel, compile_model
+from hccinfhir.instrumentation import (Metrics, CACHE_LOOKUPS, DX_CODES_UNMAPPED, STAGE_DEMOGRAPHICS,
+                                       STAGE_MAPPING, STAGE_HIERARCHIES, STAGE_INTERACTIONS,
+                                       STAGE_COEFFICIENTS)
+
+def _validate_demographic_inputs(age: Union[int, float], sex: str) -> None:
+    """Validate the demographic inputs shared by all calculate_* functions."""
+    if not isinstance(age, (int, float)) or age < 0:
+        raise ValueError("Age must be a non-negative number")
+
+    if sex not in ['M', 'F', '1', '2']:
+        raise ValueError("Sex must be 'M' or 'F' or '1' or '2'")
+
+def _score_compiled_ccs(cc_set: Set[str],
+                        demographics: Demographics,
+                        model: CompiledModel,
+                        cc_to_dx: Dict[str, Set[str]],
+                        diagnosis_codes: List[str],
+                        hierarchies_applied: bool = False,
+                        metrics: Optional[Metrics] = None) -> RAFResult:
+    """Score a set of CCs (or HCCs if hierarchies_applied) against a compiled model."""
+    model_name = model.model_name
+    if metrics is not None:
+        start = perf_counter()
+
+    if hierarchies_applied:
+        hcc_set = cc_set
+    else:
+        hcc_set = apply_hierarchies(cc_set, model_name, model.hierarchies)
+        if metrics is not None:
+            start = metrics.lap(STAGE_HIERARCHIES, start)
+    interactions = apply_interactions(demographics, hcc_set, model_name)
+    if metrics is not None:
+        start = metrics.lap(STAGE_INTERACTIONS, start)
+    coefficients, categories = apply_coefficients_by_category(demographics,
+                                                              hcc_set,
+                                                              interactions,
+                                                              model_name,
+                                                              model.coefficients,
+                                                              model.chronic_hccs)
+
+    # Decompose the risk score using the category of each applied coefficient.
+    # fsum is exact, so the scores do not depend on the iteration order of the sets.
+    risk_score = fsum(coefficients.values())
+    risk_score_demographics = fsum(value for key, value in coefficients.items()
+                                   if categories[key] == DEMOGRAPHIC)
+    risk_score_chronic_only = fsum(value for key, value in coefficients.items()
+                                   if categories[key] == CHRONIC_HCC)
+    risk_score_hcc = risk_score - risk_score_demographics
+    if metrics is not None:
+        metrics.lap(STAGE_COEFFICIENTS, start)
+
+    return RAFResult(
+        risk_score=risk_score,
+        risk_score_demographics=risk_score_demographics,
+        risk_score_chronic_only=risk_score_chronic_only,
+        risk_score_hcc=risk_score_hcc,
+        hcc_list=list(hcc_set),
+        cc_to_dx=cc_to_dx,
+        coefficients=coefficients,
+        interactions=interactions,
+        demographics=demographics,
+        model_name=model_name,
+        version=model.version,
+        diagnosis_codes=diagnosis_codes,
+    )
+
+def _score_compiled_model(dx_codes: Set[str],
+                          demographics: Demographics,
+                          model: CompiledModel,
+                          diagnosis_codes: List[str],
+                          metrics: Optional[Metrics] = None) -> RAFResult:
+    """Score normalized diagnosis codes against a compiled model."""
+    if metrics is not None:
+        start = perf_counter()
+    cc_to_dx = map_normalized_diagnoses(dx_codes, model.model_name, model.dx_to_cc_mapping)
+    if metrics is not None:
+        metrics.lap(STAGE_MAPPING, start)
+        mapped = set().union(*cc_to_dx.values())
+        metrics.incr(DX_CODES_UNMAPPED, len(dx_codes - mapped))
+    return _score_compiled_ccs(set(cc_to_dx.keys()), demographics, model, cc_to_dx, diagnosis_codes,
+                               metrics=metrics)
+
+def normalize_hcc_codes(hcc_codes: Iterable[Union[str, int]]) -> Set[str]:
+    """
+    Normalize CC/HCC codes to the bare numbers used by the models.
+
+    Accepts values like 19, '19', 'HCC19', 'hcc19', 'CC19' or 'RXHCC45'.
+    """
+    normalized = set()
+    for code in hcc_codes:
+        code = str(code).strip().upper()
+        for prefix in ('RXHCC', 'HCC', 'CC'):
+            if code.startswith(prefix):
+                code = code[len(prefix):]
+                break
+        if code:
+            normalized.add(code)
+    return normalized
+
+def _categorize_for_model(demographics: Union[Demographics, Dict[str, Any]], 
+                          model: CompiledModel) -> Demographics:
+    """Re-derive the demographic categories of a Demographics (or dict) for a model."""
+    if not isinstance(demographics, Demographics):
+        demographics = Demographics(**demographics)
+    _validate_demographic_inputs(demographics.age, demographics.sex)
+    return categorize_demographics(demographics.age,
+                                   demographics.sex,
+                                   demographics.dual_elgbl_cd,
+                                   demographics.orec,
+                                   demographics.crec,
+                                   model.version,
+                                   demographics.new_enrollee,
+                                   demographics.snp,
+                                   demographics.low_income,
+                                   demographics.graft_months)
 
 def calculate_raf(diagnosis_codes: List[str],
                   model_name: ModelName = "CMS-HCC Model V28",
-                  age: Union[int, float] = 65, 
-                  sex: str = 'F', 
+                  age: Union[int, float] = 65,
+                  sex: str = 'F',
                   dual_elgbl_cd: str = 'NA',
-                  orec: str = '0', 
+                  orec: str = '0',
                   crec: str = '0',
-                  new_enrollee: bool = False,   
+                  new_enrollee: bool = False,
                   snp: bool = False,
                   low_income: bool = False,
-                  graft_months: Optional[int] =  None) -> RAFResult:
+                  graft_months: Optional[int] =  None,
+                  metrics: Optional[Metrics] = None) -> RAFResult:
     """
     Calculate Risk Adjustment Factor (RAF) based on diagnosis codes and demographic information.
 
@@ -33,6 +151,7 @@ def calculate_raf(diagnosis_codes: List[str],
         snp: Special Needs Plan indicator
         low_income: Low income subsidy indicator
         graft_months: Number of months since transplant
+        metrics: Optional Metrics receiving the per-stage timings and counts
 
     Returns:
         Dictionary containing RAF score and coefficients used in calculation
@@ -40,79 +159,190 @@ def calculate_raf(diagnosis_codes: List[str],
     Raises:
         ValueError: If input parameters are invalid
     """
-    # Input validation
-    if not isinstance(age, (int, float)) or age < 0:
-        raise ValueError("Age must be a non-negative number")
-    
-    if sex not in ['M', 'F', '1', '2']:
-        raise ValueError("Sex must be 'M' or 'F' or '1' or '2'")
+    _validate_demographic_inputs(age, sex)
+
+    if metrics is not None:
+        with metrics.activate():
+            metrics.incr(CACHE_LOOKUPS)
+            model = compile_model(model_name)
+            with metrics.stage(STAGE_DEMOGRAPHICS):
+                demographics = categorize_demographics(age, sex, dual_elgbl_cd, orec, crec,
+                                                       model.version, new_enrollee, snp,
+                                                       low_income, graft_months)
+            return _score_compiled_model(normalize_diagnosis_codes(diagnosis_codes),
+                                         demographics, model, diagnosis_codes, metrics)
 
-    version = 'V2'
-    if 'RxHCC' in model_name:
-        version = 'V4'
-    elif 'HHS-HCC' in model_name: # not implemented yet
-        version = 'V6'
-    
-    demographics = categorize_demographics(age, 
-                                           sex, 
-                                           dual_elgbl_cd, 
-                                           orec, 
-                                           crec, 
-                                           version, 
-                                           new_enrollee, 
-                                           snp, 
-                                           low_income, 
+    model = compile_model(model_name)
+    demographics = categorize_demographics(age,
+                                           sex,
+                                           dual_elgbl_cd,
+                                           orec,
+                                           crec,
+                                           model.version,
+                                           new_enrollee,
+                                           snp,
+                                           low_income,
                                            graft_months)
-    
-    cc_to_dx = apply_mapping(diagnosis_codes, model_name)
-    hcc_set = set(cc_to_dx.keys())
-    hcc_set = apply_hierarchies(hcc_set, model_name)
-    interactions = apply_interactions(demographics, hcc_set, model_name)
-    coefficients = apply_coefficients(demographics, hcc_set, interactions, model_name)
-
-    is_chronic_mapping = load_is_chronic_from_db(model_name)
-    hcc_chronic = set()
-    for hcc in hcc_set:
-        if is_chronic_mapping.get((f"HCC{hcc}", model_name), False):
-            hcc_chronic.add(hcc)
-
-    demographic_interactions = {}
-    for key, value in interactions.items():
-        if key.startswith('NMCAID_'):
-            demographic_interactions[key] = value
-        elif key.startswith('MCAID_'):
-            demographic_interactions[key] = value
-        elif key.startswith('LTI_'):
-            demographic_interactions[key] = value
-        elif key.startswith('OriginallyDisabled_'):
-            demographic_interactions[key] = value
-
-    coefficients_demographics = apply_coefficients(demographics, 
-                                                   set(), 
-                                                   demographic_interactions, 
-                                                   model_name)
-    coefficients_chronic_only = apply_coefficients(demographics, 
-                                                   hcc_chronic, 
-                                                   demographic_interactions, 
-                                                   model_name)
-    
-    # Calculate risk scores
-    risk_score = sum(coefficients.values())
-    risk_score_demographics = sum(coefficients_demographics.values())
-    risk_score_chronic_only = sum(coefficients_chronic_only.values()) - risk_score_demographics
-    risk_score_hcc = risk_score - risk_score_demographics
 
-    return RAFResult(
-        risk_score=risk_score,
-        risk_score_demographics=risk_score_demographics,
-        risk_score_chronic_only=risk_score_chronic_only,
-        risk_score_hcc=risk_score_hcc,
-        hcc_list=list(hcc_set),
-        cc_to_dx=cc_to_dx,
-        coefficients=coefficients,
-        interactions=interactions,
-        demographics=demographics,
-        model_name=model_name,
-        version=version,
+    return _score_compiled_model(normalize_diagnosis_codes(diagnosis_codes),
+                                 demographics,
+                                 model,
+                                 diagnosis_codes)
+
+def calculate_raf_multi(diagnosis_codes: List[str],
+                        model_names: List[ModelName],
+                        age: Union[int, float] = 65,
+                        sex: str = 'F',
+                        dual_elgbl_cd: str = 'NA',
+                        orec: str = '0',
+                        crec: str = '0',
+                        new_enrollee: bool = False,
+                        snp: bool = False,
+                        low_income: bool = False,
+                        graft_months: Optional[int] = None,
+                        blend_weights: Optional[Dict[ModelName, float]] = None,
+                        metrics: Optional[Metrics] = None) -> MultiModelRAFResult:
+    """
+    Calculate RAF scores for several models in one pass.
+
+    Diagnosis codes are normalized once and demographics are categorized once per
+    categorization version; each model then only runs its own mapping, hierarchy,
+    interaction and coefficient stages.
+
+    Args:
+        diagnosis_codes: List of ICD-10 diagnosis codes
+        model_names: Names of the HCC models to score, e.g. ["CMS-HCC Model V24", "CMS-HCC Model V28"]
+        age, sex, dual_elgbl_cd, orec, crec, new_enrollee, snp, low_income, graft_months:
+            Demographic inputs, see calculate_raf
+        blend_weights: Optional weights per model, e.g. {"CMS-HCC Model V24": 0.33,
+            "CMS-HCC Model V28": 0.67}. If provided, blended_risk_score is the weighted
+            sum of the risk scores of those models.
+        metrics: Optional Metrics receiving the per-stage timings and counts
+
+    Returns:
+        MultiModelRAFResult with one RAFResult per model
+
+    Raises:
+        ValueError: If input parameters are invalid or a blend weight refers to a model
+            that is not scored
+    """
+    _validate_demographic_inputs(age, sex)
+
+    if not model_names:
+        raise ValueError("model_names cannot be empty")
+    model_names = list(dict.fromkeys(model_names))
+    if blend_weights:
+        unknown = set(blend_weights) - set(model_names)
+        if unknown:
+            raise ValueError(f"Blend weights given for models that are not scored: {sorted(unknown)}")
+
+    dx_codes = normalize_diagnosis_codes(diagnosis_codes)
+    demographics_by_version: Dict[str, Demographics] = {}
+    results: Dict[ModelName, RAFResult] = {}
+
+    for model_name in model_names:
+        if metrics is not None:
+            metrics.incr(CACHE_LOOKUPS)
+            with metrics.activate():
+                model = compile_model(model_name)
+        else:
+            model = compile_model(model_name)
+        demographics = demographics_by_version.get(model.version)
+        if demographics is None:
+            demographics = categorize_demographics(age,
+                                                   sex,
+                                                   dual_elgbl_cd,
+                                                   orec,
+                                                   crec,
+                                                   model.version,
+                                                   new_enrollee,
+                                                   snp,
+                                                   low_income,
+                                                   graft_months)
+            demographics_by_version[model.version] = demographics
+        results[model_name] = _score_compiled_model(dx_codes, demographics, model, diagnosis_codes, metrics)
+
+    blended_risk_score = None
+    if blend_weights:
+        blended_risk_score = sum(weight * results[model_name].risk_score
+                                 for model_name, weight in blend_weights.items())
+
+    return MultiModelRAFResult(
+        results=results,
+        blend_weights=blend_weights or {},
+        blended_risk_score=blended_risk_score,
         diagnosis_codes=diagnosis_codes,
-    )
\ No newline at end of file
+    )
+
+
+def calculate_raf_from_hccs(hcc_codes: Iterable[Union[str, int]],
+                            model_name: ModelName = "CMS-HCC Model V28",
+                            age: Union[int, float] = 65,
+                            sex: str = 'F',
+                            dual_elgbl_cd: str = 'NA',
+                            orec: str = '0',
+                            crec: str = '0',
+                            new_enrollee: bool = False,
+                            snp: bool = False,
+                            low_income: bool = False,
+                            graft_months: Optional[int] = None,
+                            hierarchies_applied: bool = False) -> RAFResult:
+    """
+    Calculate RAF from precomputed CCs/HCCs, skipping the diagnosis mapping stage.
+
+    Args:
+        hcc_codes: CC or HCC codes, e.g. ['19', 'HCC85']
+        model_name: Name of the HCC model to use
+        age, sex, dual_elgbl_cd, orec, crec, new_enrollee, snp, low_income, graft_months:
+            Demographic inputs, see calculate_raf
+        hierarchies_applied: False if hcc_codes are CCs before hierarchies (hierarchies
+            are applied), True if they are final HCCs (hierarchies are skipped)
+
+    Returns:
+        RAFResult; cc_to_dx and diagnosis_codes are empty
+
+    Raises:
+        ValueError: If input parameters are invalid
+    """
+    _validate_demographic_inputs(age, sex)
+
+    model = compile_model(model_name)
+    demographics = categorize_demographics(age,
+                                           sex,
+                                           dual_elgbl_cd,
+                                           orec,
+                                           crec,
+                                           model.version,
+                                           new_enrollee,
+                                           snp,
+                                           low_income,
+                                           graft_months)
+
+    return _score_compiled_ccs(normalize_hcc_codes(hcc_codes), demographics, model,
+                               {}, [], hierarchies_applied)
+
+def calculate_raf_from_hccs_batch(members: Iterable[Tuple[Iterable[Union[str, int]], Union[Demographics, Dict[str, Any]]]],
+                                  model_name: ModelName = "CMS-HCC Model V28",
+                                  hierarchies_applied: bool = False) -> List[RAFResult]:
+    """
+    Calculate RAF for many members from precomputed CCs/HCCs.
+
+    Only the hierarchy (unless hierarchies_applied) and coefficient stages run, which
+    makes re-scoring a population after a coefficient update cheap.
+
+    Args:
+        members: Iterable of (hcc_codes, demographics) pairs; demographics can be a
+            Demographics object or a dict with at least age and sex
+        model_name: Name of the HCC model to use
+        hierarchies_applied: See calculate_raf_from_hccs
+
+    Returns:
+        List of RAFResult, in input order
+    """
+    model = compile_model(model_name)
+    return [
+        _score_compiled_ccs(normalize_hcc_codes(hcc_codes), 
+                            _categorize_for_model(demographics, model), 
+                            model, {}, [], hierarchies_applied)
+        for hcc_codes, demographics in members
+    ]
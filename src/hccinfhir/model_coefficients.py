@@ -1,9 +1,11 @@
-from typing import Dict, Tuple, Optional
+from typing import Dict, FrozenSet, Tuple, Optional
 from hccinfhir.datamodels import ModelName, Demographics
-from hccinfhir.database import get_db_session, RACoefficients
+from hccinfhir.instrumentation import instrument_db_load
 
+@instrument_db_load
 def load_coefficients_from_db(model_name: ModelName) -> Dict[Tuple[str, ModelName], float]:
     """Load coefficients from the database for a specific model."""
+    from hccinfhir.database import get_db_session, RACoefficients
     db_session = get_db_session()
     try:
         model_domain, model_version_str = model_name.split(" Model ")
@@ -85,16 +87,22 @@ def get_coefficent_prefix(demographics: Demographics,
     return prefix + '_'
 
 
-def apply_coefficients(demographics: Demographics, 
-                      hcc_set: set[str], 
-                      interactions: dict,
-                      model_name: ModelName = "CMS-HCC Model V28",
-                      coefficients: Optional[Dict[Tuple[str, ModelName], float]] = None) -> dict:
-    """Apply risk adjustment coefficients to HCCs and interactions.
+# Categories used to decompose a risk score
+DEMOGRAPHIC = 'demographic'
+CHRONIC_HCC = 'chronic_hcc'
+NON_CHRONIC_HCC = 'non_chronic_hcc'
+INTERACTION = 'interaction'
 
-    This function takes demographic information, HCC codes, and interaction variables and returns
-    a dictionary mapping each variable to its corresponding coefficient value based on the 
-    specified model.
+# Interactions that only depend on demographics
+DEMOGRAPHIC_INTERACTION_PREFIXES = ('NMCAID_', 'MCAID_', 'LTI_', 'OriginallyDisabled_')
+
+def apply_coefficients_by_category(demographics: Demographics, 
+                                   hcc_set: set[str], 
+                                   interactions: dict,
+                                   model_name: ModelName = "CMS-HCC Model V28",
+                                   coefficients: Optional[Dict[Tuple[str, ModelName], float]] = None,
+                                   chronic_hccs: Optional[FrozenSet[str]] = None) -> Tuple[dict, Dict[str, str]]:
+    """Apply coefficients in a single pass and tag each applied variable with its category.
 
     Args:
         demographics: Demographics object containing patient characteristics
@@ -103,30 +111,37 @@ def apply_coefficients(demographics: Demographics,
         model_name: Name of the risk adjustment model to use (default: "CMS-HCC Model V28")
         coefficients: Optional dictionary mapping (variable, model) tuples to coefficient values.
             If not provided, it will be loaded from the DB.
+        chronic_hccs: Optional set of chronic HCCs (see CompiledModel.chronic_hccs).
+            HCCs not in this set are tagged as non-chronic.
 
     Returns:
-        Dictionary mapping HCC codes and interaction variables to their coefficient values
-        for variables that are present (HCC in hcc_set or interaction value = 1)
+        Tuple of (coefficients, categories): the same dictionary apply_coefficients returns,
+        and a dictionary mapping each of its keys to DEMOGRAPHIC, CHRONIC_HCC,
+        NON_CHRONIC_HCC or INTERACTION
     """
     if coefficients is None:
         coefficients = load_coefficients_from_db(model_name)
+    if chronic_hccs is None:
+        chronic_hccs = frozenset()
 
     # Get the coefficient prefix
     prefix = get_coefficent_prefix(demographics, model_name)
     
     output = {}
+    categories = {}
 
     demographics_key = (f"{prefix}{demographics.category}".lower(), model_name)
     if demographics_key in coefficients:
         output[demographics.category] = coefficients[demographics_key]
+        categories[demographics.category] = DEMOGRAPHIC
 
     # Apply the coefficients
     for hcc in hcc_set:
         key = (f"{prefix}HCC{hcc}".lower(), model_name)
 
         if key in coefficients:
-            value = coefficients[key]
-            output[hcc] = value
+            output[hcc] = coefficients[key]
+            categories[hcc] = CHRONIC_HCC if hcc in chronic_hccs else NON_CHRONIC_HCC
 
     # Add interactions
     for interaction_key, interaction_value in interactions.items():
@@ -135,8 +150,36 @@ def apply_coefficients(demographics: Demographics,
 
         key = (f"{prefix}{interaction_key}".lower(), model_name)
         if key in coefficients:
-            value = coefficients[key]
-            output[interaction_key] = value
+            output[interaction_key] = coefficients[key]
+            categories[interaction_key] = (DEMOGRAPHIC 
+                                           if interaction_key.startswith(DEMOGRAPHIC_INTERACTION_PREFIXES) 
+                                           else INTERACTION)
 
+    return output, categories
 
-    return output
\ No newline at end of file
+def apply_coefficients(demographics: Demographics, 
+                      hcc_set: set[str], 
+                      interactions: dict,
+                      model_name: ModelName = "CMS-HCC Model V28",
+                      coefficients: Optional[Dict[Tuple[str, ModelName], float]] = None) -> dict:
+    """Apply risk adjustment coefficients to HCCs and interactions.
+
+    This function takes demographic information, HCC codes, and interaction variables and returns
+    a dictionary mapping each variable to its corresponding coefficient value based on the 
+    specified model.
+
+    Args:
+        demographics: Demographics object containing patient characteristics
+        hcc_set: Set of HCC codes present for the patient
+        interactions: Dictionary of interaction variables and their values (0 or 1)
+        model_name: Name of the risk adjustment model to use (default: "CMS-HCC Model V28")
+        coefficients: Optional dictionary mapping (variable, model) tuples to coefficient values.
+            If not provided, it will be loaded from the DB.
+
+    Returns:
+        Dictionary mapping HCC codes and interaction variables to their coefficient values
+        for variables that are present (HCC in hcc_set or interaction value = 1)
+    """
+    output, _ = apply_coefficients_by_category(demographics, hcc_set, interactions, 
+                                               model_name, coefficients)
+    return output
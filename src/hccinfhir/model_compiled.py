@@ -0,0 +1,79 @@
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Mapping, Set, Tuple
+from hccinfhir.datamodels import ModelName
+from hccinfhir.model_dx_to_cc import load_dx_to_cc_mapping_from_db
+from hccinfhir.model_hierarchies import load_hierarchies_from_db
+from hccinfhir.model_coefficients import load_coefficients_from_db
+from hccinfhir.cache import load_once
+from hccinfhir.instrumentation import record_cache_miss
+
+def get_model_version(model_name: ModelName) -> str:
+    """Return the demographic categorization version ('V2', 'V4', 'V6') used by a model."""
+    if 'RxHCC' in model_name:
+        return 'V4'
+    elif 'HHS-HCC' in model_name: # not implemented yet
+        return 'V6'
+    return 'V2'
+
+
+class CompiledModel:
+    """
+    All reference tables needed to score one model, loaded from the DB once.
+
+    The tables keep the same shapes as the corresponding load_*_from_db functions,
+    so they can be passed directly to apply_mapping, apply_hierarchies and
+    apply_coefficients. chronic_hccs holds the HCCs tagged as chronic, used to
+    decompose the risk score (see apply_coefficients_by_category).
+
+    Compiled models are shared by every thread of the process, so the tables are
+    read-only: mappings are MappingProxyType and sets are frozensets.
+    """
+    __slots__ = ('model_name', 'version', 'dx_to_cc_mapping', 'hierarchies',
+                 'coefficients', 'is_chronic_mapping', 'chronic_hccs')
+
+    def __init__(self,
+                 model_name: ModelName,
+                 dx_to_cc_mapping: Dict[Tuple[str, ModelName], Set[str]],
+                 hierarchies: Dict[Tuple[str, ModelName], Set[str]],
+                 coefficients: Dict[Tuple[str, ModelName], float],
+                 is_chronic_mapping: Dict[Tuple[str, str], bool]):
+        self.model_name = model_name
+        self.version = get_model_version(model_name)
+        self.dx_to_cc_mapping = _freeze(dx_to_cc_mapping)
+        self.hierarchies = _freeze(hierarchies)
+        self.coefficients = MappingProxyType(dict(coefficients))
+        self.is_chronic_mapping = MappingProxyType(dict(is_chronic_mapping))
+        self.chronic_hccs: FrozenSet[str] = frozenset(
+            hcc[len('HCC'):] for (hcc, _), is_chronic in is_chronic_mapping.items()
+            if is_chronic and hcc.startswith('HCC')
+        )
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f"CompiledModel.{name} is read-only")
+        object.__setattr__(self, name, value)
+
+    def __repr__(self) -> str:
+        return f"CompiledModel({self.model_name!r})"
+
+    def __reduce__(self):
+        # Pickle by name; the receiving process compiles (or reuses) its own tables
+        return (compile_model, (self.model_name,))
+
+
+def _freeze(mapping: Dict[Tuple[str, ModelName], Set[str]]) -> Mapping[Tuple[str, ModelName], FrozenSet[str]]:
+    return MappingProxyType({key: frozenset(values) for key, values in mapping.items()})
+
+
+@load_once
+def compile_model(model_name: ModelName) -> CompiledModel:
+    """Load and cache the reference tables of a model; concurrent first calls load once."""
+    from hccinfhir.database import load_is_chronic_from_db
+    record_cache_miss()
+    return CompiledModel(
+        model_name=model_name,
+        dx_to_cc_mapping=load_dx_to_cc_mapping_from_db(model_name),
+        hierarchies=load_hierarchies_from_db(model_name),
+        coefficients=load_coefficients_from_db(model_name),
+        is_chronic_mapping=load_is_chronic_from_db(model_name)
+    )
@@ -1,9 +1,11 @@
-from typing import List, Dict, Set, Tuple, Optional
+from typing import Iterable, List, Dict, Set, Tuple, Optional
 from hccinfhir.datamodels import ModelName
-from hccinfhir.database import get_db_session, RADxToCC
+from hccinfhir.instrumentation import instrument_db_load
 
+@instrument_db_load
 def load_dx_to_cc_mapping_from_db(model_name: ModelName) -> Dict[Tuple[str, ModelName], Set[str]]:
     """Load dx_to_cc mapping from the database for a specific model."""
+    from hccinfhir.database import get_db_session, RADxToCC
     db_session = get_db_session()
     try:
         query = db_session.query(RADxToCC.diagnosis_code, RADxToCC.cc).filter(RADxToCC.model_name == model_name)
@@ -38,34 +40,59 @@ def get_cc(
 
     return dx_to_cc_mapping.get((diagnosis_code, model_name))
 
-def apply_mapping(
-    diagnoses: List[str],
-    model_name: ModelName = "CMS-HCC Model V28", 
+def normalize_diagnosis_codes(diagnoses: Iterable[str]) -> Set[str]:
+    """
+    Deduplicate and normalize ICD-10 diagnosis codes (upper case, no dots).
+
+    The result can be shared across models, see map_normalized_diagnoses.
+    """
+    return {dx.upper().replace('.', '') for dx in set(diagnoses)}
+
+def map_normalized_diagnoses(
+    dx_codes: Set[str],
+    model_name: ModelName = "CMS-HCC Model V28",
     dx_to_cc_mapping: Optional[Dict[Tuple[str, ModelName], Set[str]]] = None
 ) -> Dict[str, Set[str]]:
     """
-    Apply ICD-10 to CC mapping for a list of diagnosis codes.
-    
+    Apply ICD-10 to CC mapping for diagnosis codes already normalized with normalize_diagnosis_codes.
+
     Args:
-        diagnoses: List of ICD-10 diagnosis codes
+        dx_codes: Set of normalized ICD-10 diagnosis codes
         model_name: HCC model name to use for mapping
         dx_to_cc_mapping: Optional custom mapping dictionary. If not provided, it will be loaded from the DB.
-        
+
     Returns:
-        Dictionary mapping CCs to lists of diagnosis codes that map to them
+        Dictionary mapping CCs to sets of diagnosis codes that map to them
     """
     if dx_to_cc_mapping is None:
         dx_to_cc_mapping = load_dx_to_cc_mapping_from_db(model_name)
 
     cc_to_dx: Dict[str, Set[str]] = {}
-    
-    for dx in set(diagnoses):
-        dx = dx.upper().replace('.', '')
-        ccs = get_cc(dx, model_name, dx_to_cc_mapping)
+
+    for dx in dx_codes:
+        ccs = dx_to_cc_mapping.get((dx, model_name))
         if ccs is not None:
             for cc in ccs:
                 if cc not in cc_to_dx:
                     cc_to_dx[cc] = set()
                 cc_to_dx[cc].add(dx)
-                
-    return cc_to_dx
\ No newline at end of file
+
+    return cc_to_dx
+
+def apply_mapping(
+    diagnoses: List[str],
+    model_name: ModelName = "CMS-HCC Model V28", 
+    dx_to_cc_mapping: Optional[Dict[Tuple[str, ModelName], Set[str]]] = None
+) -> Dict[str, Set[str]]:
+    """
+    Apply ICD-10 to CC mapping for a list of diagnosis codes.
+    
+    Args:
+        diagnoses: List of ICD-10 diagnosis codes
+        model_name: HCC model name to use for mapping
+        dx_to_cc_mapping: Optional custom mapping dictionary. If not provided, it will be loaded from the DB.
+        
+    Returns:
+        Dictionary mapping CCs to lists of diagnosis codes that map to them
+    """
+    return map_normalized_diagnoses(normalize_diagnosis_codes(diagnoses), model_name, dx_to_cc_mapping)
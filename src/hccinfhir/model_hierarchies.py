@@ -1,9 +1,11 @@
 from typing import Dict, Set, Tuple, Optional
 from hccinfhir.datamodels import ModelName
-from hccinfhir.database import get_db_session, RAHierarchies
+from hccinfhir.instrumentation import instrument_db_load
 
+@instrument_db_load
 def load_hierarchies_from_db(model_name: ModelName) -> Dict[Tuple[str, ModelName], Set[str]]:
     """Load hierarchies from the database for a specific model."""
+    from hccinfhir.database import get_db_session, RAHierarchies
     db_session = get_db_session()
     try:
         query = db_session.query(RAHierarchies.cc_parent, RAHierarchies.cc_child).filter(RAHierarchies.model_fullname == model_name)
@@ -31,29 +33,31 @@ def apply_hierarchies(
         hierarchies: Optional custom hierarchy dictionary. If not provided, it will be loaded from the DB.
         
     Returns:
-        Set of CCs after applying hierarchies
+        Set of CCs after applying hierarchies; cc_set itself is not modified
     """
     if hierarchies is None:
         hierarchies = load_hierarchies_from_db(model_name)
 
-    # Track CCs that should be zeroed out
-    to_remove = set()
-    
+    # CCs removed by the model specific rules below; they do not act as parents.
+    # cc_set itself is left untouched, since callers may share it.
+    excluded = ()
+
     # For V28, if none of 221, 222, 224, 225, 226 are present, remove 223
     if model_name == "CMS-HCC Model V28":
         if ("223" in cc_set and 
             not any(cc in cc_set for cc in ["221", "222", "224", "225", "226"])):
-            cc_set.remove("223")
+            excluded = ("223",)
     elif model_name == "CMS-HCC ESRD Model V21":
         if "134" in cc_set:
-            cc_set.remove("134")
+            excluded = ("134",)
     elif model_name == "CMS-HCC ESRD Model V24":
-        for cc in ["134", "135", "136", "137"]:
-            if cc in cc_set:
-                cc_set.remove(cc)
+        excluded = tuple(cc for cc in ["134", "135", "136", "137"] if cc in cc_set)
+
+    # Track CCs that should be zeroed out
+    to_remove = set(excluded)
 
     # Apply hierarchies
-    for cc in cc_set:
+    for cc in (cc_set.difference(excluded) if excluded else cc_set):
         hierarchy_key = (cc, model_name)
         if hierarchy_key in hierarchies:
             # If parent CC exists, remove all child CCs
@@ -0,0 +1,346 @@
+"""
+Scoring of CMS-HCC SAS software style PERSON and DIAG files.
+
+The CMS SAS software reads two files keyed by member: PERSON, one row per member
+(HICNO, SEX, DOB, OREC, MCAID, NEMCAID...), and DIAG, one row per diagnosis (HICNO,
+DIAG). score_person_diag reads both as streams, sorted by member id or sorted
+externally on disk first (external_sort), merge-joins them (merge_join) and scores
+each member through the compiled model. Apart from the sort buffers, only the
+diagnosis codes of the current member are in memory, whatever the size of the
+files.
+
+Both files are CSV (or any delimiter), possibly compressed (see
+hccinfhir.readers.open_input), with a header row; column names are matched
+without regard to case. PERSON columns map to Demographics as follows:
+
+- SEX ('1'/'2' or 'M'/'F'), OREC and CREC are passed as they are
+- AGE, or else the age on the age_as_of date computed from DOB (YYYYMMDD,
+  YYYY-MM-DD, MM/DD/YYYY, or a SAS date: days since 1960-01-01)
+- DUAL_ELGBL_CD, or else FBDUAL / PBDUAL flags ('02' full benefit, '01' partial,
+  '00' neither), or else the MCAID flag of the older software (and NEMCAID for new
+  enrollees), read as full benefit ('02')
+- NEW_ENROLLEE (or NE), SNP and LOW_INCOME flags ('1', 'Y', 'TRUE')
+
+LTIMCAID is not read: the institutional segment is not modeled by this library.
+"""
+
+import csv
+import heapq
+import io
+import os
+import pickle
+import tempfile
+from datetime import date, timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from hccinfhir.datamodels import ModelName
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.readers import open_input
+from hccinfhir.writers import OutputFormat, Schema, open_table_writer
+
+SAS_EPOCH = date(1960, 1, 1)
+TRUE_VALUES = frozenset(['1', 'Y', 'YES', 'T', 'TRUE'])
+DEFAULT_SORT_BUFFER_ROWS = 1_000_000
+# Rows per pickled block of a sorted run
+RUN_BLOCK_ROWS = 4096
+NO_PERSON_ERROR = "No PERSON row for this member"
+
+
+def parse_dob(value: str) -> date:
+    """Date of birth in the formats of the PERSON file, see the module docstring."""
+    value = value.strip()
+    try:
+        if len(value) == 8 and value.isdigit():
+            return date(int(value[:4]), int(value[4:6]), int(value[6:]))
+        if value.lstrip('-').isdigit():
+            return SAS_EPOCH + timedelta(days=int(value))
+        if '/' in value:
+            month, day, year = value.split('/')
+            return date(int(year), int(month), int(day))
+        return date.fromisoformat(value[:10])
+    except (ValueError, OverflowError) as e:
+        raise ValueError(f"Invalid DOB {value!r}: {e}") from e
+
+
+def _is_true(value: Optional[str]) -> bool:
+    return value is not None and value.strip().upper() in TRUE_VALUES
+
+
+def person_demographics(row: Dict[str, str], age_as_of: date) -> Dict[str, Any]:
+    """
+    Demographics fields of a PERSON row with upper case column names; see the module
+    docstring. Fields that are missing are left out, so that Demographics reports
+    them or applies its defaults.
+    """
+    demographics: Dict[str, Any] = {}
+    if row.get('SEX'):
+        demographics['sex'] = row['SEX'].strip()
+    if row.get('AGE'):
+        try:
+            demographics['age'] = float(row['AGE'])
+        except ValueError as e:
+            raise ValueError(f"Invalid AGE {row['AGE']!r}") from e
+    elif row.get('DOB'):
+        dob = parse_dob(row['DOB'])
+        demographics['age'] = age_as_of.year - dob.year - ((age_as_of.month, age_as_of.day) < (dob.month, dob.day))
+    for column in ('OREC', 'CREC'):
+        if row.get(column):
+            demographics[column.lower()] = row[column].strip()
+
+    new_enrollee = _is_true(row.get('NEW_ENROLLEE', row.get('NE')))
+    if row.get('DUAL_ELGBL_CD'):
+        demographics['dual_elgbl_cd'] = row['DUAL_ELGBL_CD'].strip().zfill(2)
+    elif row.get('FBDUAL') or row.get('PBDUAL'):
+        demographics['dual_elgbl_cd'] = ('02' if _is_true(row.get('FBDUAL')) else
+                                         '01' if _is_true(row.get('PBDUAL')) else '00')
+    elif row.get('NEMCAID' if new_enrollee else 'MCAID'):
+        demographics['dual_elgbl_cd'] = '02' if _is_true(row.get('NEMCAID' if new_enrollee else 'MCAID')) else '00'
+    if new_enrollee:
+        demographics['new_enrollee'] = True
+    for column in ('SNP', 'LOW_INCOME'):
+        if _is_true(row.get(column)):
+            demographics[column.lower()] = True
+    return demographics
+
+
+def _read_rows(path: str, delimiter: str) -> Iterator[Dict[str, str]]:
+    with io.TextIOWrapper(open_input(path), encoding='utf-8', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [name.strip().upper() for name in header]
+        for values in reader:
+            if values:
+                yield dict(zip(columns, values))
+
+
+def _column(path: str, columns: Dict[str, str], name: str) -> str:
+    if name not in columns:
+        raise ValueError(f"{path} has no {name} column")
+    return columns[name]
+
+
+def read_person(path: str, age_as_of: date, id_field: str = 'HICNO',
+                delimiter: str = ',') -> Iterator[Tuple[str, Union[Dict[str, Any], str]]]:
+    """
+    Yield (member_id, demographics) for the rows of a PERSON file. The demographics
+    of a row that cannot be read, e.g. with an invalid DOB, are the error message
+    instead, so that the member gets an error row and the others are still scored.
+    """
+    id_field = id_field.upper()
+    for row in _read_rows(path, delimiter):
+        member_id = _column(path, row, id_field).strip()
+        try:
+            demographics: Union[Dict[str, Any], str] = person_demographics(row, age_as_of)
+        except ValueError as e:
+            demographics = f"{type(e).__name__}: {e}"
+        yield member_id, demographics
+
+
+def read_diag(path: str, id_field: str = 'HICNO', diag_field: str = 'DIAG',
+              delimiter: str = ',') -> Iterator[Tuple[str, str]]:
+    """
+    Yield (member_id, diagnosis_code) for the rows of a DIAG file; codes are upper
+    cased and their dots removed ("E11.9" is "E119"), and empty ones skipped.
+    """
+    id_field, diag_field = id_field.upper(), diag_field.upper()
+    for row in _read_rows(path, delimiter):
+        code = _column(path, row, diag_field).strip().replace('.', '').upper()
+        if code:
+            yield _column(path, row, id_field).strip(), code
+
+
+def _write_run(rows: List[Tuple], directory: str, index: int) -> str:
+    path = os.path.join(directory, f"run-{index:05d}.pickle")
+    with open(path, 'wb') as f:
+        for start in range(0, len(rows), RUN_BLOCK_ROWS):
+            pickle.dump(rows[start:start + RUN_BLOCK_ROWS], f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Tuple]:
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def external_sort(rows: Iterable[Tuple], buffer_rows: int = DEFAULT_SORT_BUFFER_ROWS,
+                  tmp_dir: Optional[str] = None) -> Iterator[Tuple]:
+    """
+    Sort picklable tuples on their first item with at most buffer_rows of them in
+    memory. Input that fits in one buffer is sorted in memory; otherwise each buffer
+    is sorted and written to a run file, and the runs are merged as they are read.
+    The run files are removed when the iterator is exhausted or closed.
+    """
+    if buffer_rows < 1:
+        raise ValueError("buffer_rows must be at least 1")
+    key = itemgetter(0)
+    iterator = iter(rows)
+    buffer = list(islice(iterator, buffer_rows))
+    buffer.sort(key=key)
+    following = next(iterator, None)
+    if following is None:
+        yield from buffer
+        return
+
+    with tempfile.TemporaryDirectory(prefix='hccinfhir-sort-', dir=tmp_dir) as directory:
+        runs = [_write_run(buffer, directory, 0)]
+        buffer = [following]
+        buffer.extend(islice(iterator, buffer_rows - 1))
+        while buffer:
+            buffer.sort(key=key)
+            runs.append(_write_run(buffer, directory, len(runs)))
+            buffer = list(islice(iterator, buffer_rows))
+        yield from heapq.merge(*(_read_run(path) for path in runs), key=key)
+
+
+def _check_sorted(rows: Iterable[Tuple], name: str) -> Iterator[Tuple]:
+    previous = None
+    for row in rows:
+        if previous is not None and row[0] < previous:
+            raise ValueError(f"{name} is not sorted by member id: {row[0]!r} follows {previous!r}; "
+                             f"let it be sorted externally")
+        previous = row[0]
+        yield row
+
+
+def merge_join(persons: Iterable[Tuple[str, Any]],
+               diagnoses: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, Any, List[str]]]:
+    """
+    Merge-join members and diagnoses, both sorted by member id, into (member_id,
+    demographics, sorted unique codes) in member id order; the demographics are
+    passed through as they are. Diagnosis members without a person are yielded
+    where they fall, with None demographics, so nothing is held for them.
+
+    Raises:
+        ValueError: If an input is out of order, or a member id is repeated in persons
+    """
+    groups = groupby(_check_sorted(diagnoses, "DIAG"), key=itemgetter(0))
+    current = next(groups, None)
+    previous = None
+    for member_id, demographics in _check_sorted(persons, "PERSON"):
+        if member_id == previous:
+            raise ValueError(f"PERSON has several rows for member {member_id!r}")
+        previous = member_id
+        while current is not None and current[0] < member_id:
+            yield current[0], None, sorted({code for _, code in current[1]})
+            current = next(groups, None)
+        codes: List[str] = []
+        if current is not None and current[0] == member_id:
+            codes = sorted({code for _, code in current[1]})
+            current = next(groups, None)
+        yield member_id, demographics, codes
+    while current is not None:
+        yield current[0], None, sorted({code for _, code in current[1]})
+        current = next(groups, None)
+
+
+def model_hccs(model_names: Sequence[ModelName]) -> List[str]:
+    """HCCs of the models, in numeric order, e.g. the flag columns of score_person_diag."""
+    hccs = {cc for model_name in model_names for ccs in compile_model(model_name).dx_to_cc_mapping.values()
+            for cc in ccs}
+    return sorted(hccs, key=lambda hcc: (int(hcc) if hcc.isdigit() else float('inf'), hcc))
+
+
+def person_diag_schema(hccs: Sequence[str]) -> Schema:
+    """Output schema: one row per member and model, with a 0/1 column per HCC."""
+    return [('member_id', 'string'), ('model_name', 'string'), ('risk_score', 'float'),
+            ('risk_score_demographics', 'float'), ('risk_score_chronic_only', 'float'),
+            ('risk_score_hcc', 'float'), ('error', 'string')] + [(f"HCC{hcc}", 'int') for hcc in hccs]
+
+
+def score_person_diag(person_path: str,
+                      diag_path: str,
+                      output: str,
+                      model_names: Sequence[ModelName] = ("CMS-HCC Model V28",),
+                      age_as_of: Optional[date] = None,
+                      id_field: str = 'HICNO',
+                      diag_field: str = 'DIAG',
+                      delimiter: str = ',',
+                      presorted: bool = False,
+                      sort_buffer_rows: int = DEFAULT_SORT_BUFFER_ROWS,
+                      tmp_dir: Optional[str] = None,
+                      output_format: Optional[OutputFormat] = None,
+                      max_workers: int = 1,
+                      chunk_size: int = 256) -> Dict[str, int]:
+    """
+    Score the members of a PERSON file with the diagnoses of a DIAG file, writing one
+    row per member and model with the scores and a 0/1 flag per HCC of the models.
+    Rows follow member id order, except that error rows are written as the join
+    reaches them, possibly ahead of members still being scored by the workers.
+
+    Args:
+        person_path: PERSON file
+        diag_path: DIAG file
+        output: Output file (.csv, .ndjson or .parquet)
+        model_names: Models to score
+        age_as_of: Date on which ages are computed from DOB; CMS uses February 1
+            of the payment year. Default: February 1 of the current year.
+        id_field: Member id column of both files
+        diag_field: Diagnosis column of the DIAG file
+        delimiter: Field delimiter of both files
+        presorted: The files are already sorted by member id, so they are streamed
+            without being sorted first; a ValueError is raised if they are not
+        sort_buffer_rows: Rows of each file sorted in memory at once; beyond that,
+            sorted runs are written under tmp_dir and merged
+        tmp_dir: Directory of the sorted runs (default: the system temp dir)
+        output_format: Format of the output; inferred from its extension by default
+        max_workers: Worker processes scoring the members; 1 scores them in this
+            process, one member at a time
+        chunk_size: Members per scoring task with several workers
+
+    Returns:
+        Counts: 'members' scored, 'errors' (members that could not be scored, e.g.
+        with invalid demographics) and 'unmatched' (DIAG members not in PERSON)
+    """
+    from hccinfhir.population import score_population
+
+    models = list(model_names)
+    age_as_of = age_as_of or date(date.today().year, 2, 1)
+    hccs = model_hccs(models)
+    persons: Iterable[Tuple[str, Union[Dict[str, Any], str]]] = read_person(person_path, age_as_of, id_field, delimiter)
+    diagnoses: Iterable[Tuple[str, str]] = read_diag(diag_path, id_field, diag_field, delimiter)
+    if not presorted:
+        persons = external_sort(persons, sort_buffer_rows, tmp_dir)
+        diagnoses = external_sort(diagnoses, sort_buffer_rows, tmp_dir)
+
+    counts = {'members': 0, 'errors': 0, 'unmatched': 0}
+    empty_flags = (0,) * len(hccs)
+    flag_index = {hcc: i for i, hcc in enumerate(hccs)}
+    with open_table_writer(output, person_diag_schema(hccs), output_format) as writer:
+        def readable(joined):
+            # DIAG members without a PERSON row, and members whose PERSON row could
+            # not be read, get their error row as soon as the join reaches them
+            for member_id, demographics, codes in joined:
+                if demographics is None:
+                    counts['unmatched'] += 1
+                    writer.write_values((member_id, None, None, None, None, None, NO_PERSON_ERROR) + empty_flags)
+                elif isinstance(demographics, str):
+                    counts['errors'] += 1
+                    writer.write_values((member_id, None, None, None, None, None, demographics) + empty_flags)
+                else:
+                    yield member_id, demographics, codes
+
+        results = score_population(readable(merge_join(persons, diagnoses)), model_name=models[0],
+                                   model_names=models if len(models) > 1 else None, input_format='diagnosis',
+                                   backend='serial' if max_workers == 1 else 'process',
+                                   max_workers=max_workers, chunk_size=chunk_size, ordered=True)
+        for member_id, result, error in results:
+            if result is None:
+                counts['errors'] += 1
+                writer.write_values((member_id, None, None, None, None, None, error) + empty_flags)
+                continue
+            counts['members'] += 1
+            for r in ([result.results[model] for model in models] if len(models) > 1 else [result]):
+                flags = list(empty_flags)
+                for hcc in r.hcc_list:
+                    flags[flag_index[hcc]] = 1
+                writer.write_values((member_id, r.model_name, r.risk_score, r.risk_score_demographics,
+                                     r.risk_score_chronic_only, r.risk_score_hcc, None, *flags))
+    return counts
@@ -0,0 +1,413 @@
+"""
+Population scoring across processes or threads.
+
+score_population splits a stream of members into chunks and scores the chunks on a
+pool of workers. Each worker builds its HCCInFHIR processor and compiles the
+reference tables of the requested models once, then scores every chunk it
+receives. Results are streamed back member by member, in input order or as soon
+as their chunk completes.
+
+score_partitions scores members whose diagnosis codes were spilled to hash
+partitions on disk (see hccinfhir.readers.MemberDiagnoses): each worker reads,
+joins and scores whole partitions, so members are never sent through the calling
+process.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, NamedTuple, Optional, Sequence, Tuple, Union
+from hccinfhir.datamodels import Demographics, ModelName, ProcFilteringFilename, RAFResult, MultiModelRAFResult
+from hccinfhir.decoders import Decoder, DecoderName, decode_lines, get_decoder
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.hccinfhir import HCCInFHIR
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.readers import Partition, join_partition
+
+Backend = Literal["process", "thread", "serial"]
+InputFormat = Literal["fhir", "837", "sld", "diagnosis"]
+
+
+class PopulationMember(NamedTuple):
+    """
+    One member to score.
+
+    Attributes:
+        member_id: Member identifier, returned with the result
+        demographics: Demographics object or dict
+        data: EOB resources ("fhir"), 837 strings ("837"), service level data ("sld")
+            or diagnosis codes ("diagnosis"), see score_population's input_format.
+            EOB resources can also be given as raw JSON strings or bytes (e.g. NDJSON
+            lines); they are then only decoded in the worker.
+    """
+    member_id: str
+    demographics: Union[Demographics, Dict[str, Any]]
+    data: Sequence[Any]
+
+
+class MemberResult(NamedTuple):
+    """
+    Result of one member.
+
+    Attributes:
+        member_id: Member identifier
+        result: RAFResult, or MultiModelRAFResult when several models are scored;
+            None if the member could not be scored
+        error: Error message if the member could not be scored
+    """
+    member_id: str
+    result: Optional[Union[RAFResult, MultiModelRAFResult]]
+    error: Optional[str] = None
+
+
+class PartitionResult(NamedTuple):
+    """
+    Results of one partition, see score_partitions.
+
+    Attributes:
+        index: Partition index
+        results: MemberResult of each member of the partition's demographics, or
+            what transform returned for it
+        unmatched: Ids of the members with diagnosis codes but no demographics
+    """
+    index: int
+    results: List[Any]
+    unmatched: List[str]
+
+
+class _PopulationScorer:
+    """Scores members with one processor; built once per worker."""
+
+    def __init__(self,
+                 model_name: ModelName,
+                 model_names: Optional[List[ModelName]],
+                 blend_weights: Optional[Dict[ModelName, float]],
+                 input_format: InputFormat,
+                 filter_claims: bool,
+                 proc_filtering_filename: ProcFilteringFilename,
+                 include_service_data: bool,
+                 raise_errors: bool,
+                 json_decoder: Union[DecoderName, Decoder, None] = None):
+        self.processor = HCCInFHIR(filter_claims=filter_claims,
+                                   model_name=model_name,
+                                   proc_filtering_filename=proc_filtering_filename)
+        self.model_names = model_names
+        self.blend_weights = blend_weights
+        self.input_format = input_format
+        self.include_service_data = include_service_data
+        self.raise_errors = raise_errors
+        # Raw EOB lines are scanned as JSON by the extractor unless a decoder is given
+        self.scan_json = json_decoder is None
+        self.loads = get_decoder(json_decoder)
+
+    def warm_up(self) -> None:
+        """Compile the reference tables and the claim filter before the first member."""
+        for model_name in self.model_names or [self.processor.model_name]:
+            compile_model(model_name)
+        if self.processor.filter_claims and self.input_format != "diagnosis":
+            self.processor._get_claim_filter()
+
+    def score_member(self, member: PopulationMember) -> MemberResult:
+        member_id, demographics, data = member
+        processor = self.processor
+        try:
+            demographics = processor._ensure_demographics(demographics)
+            service_data = None
+            if self.input_format == "diagnosis":
+                diagnosis_codes = list(data)
+            else:
+                if self.input_format == "fhir":
+                    if data and all(isinstance(eob, (str, bytes)) for eob in data):
+                        eobs = list(data) if self.scan_json else decode_lines(data, self.loads)
+                    else:
+                        eobs = [self.loads(eob) if isinstance(eob, (str, bytes)) else eob for eob in data]
+                    service_data = processor._extract_service_data(eobs)
+                elif self.input_format == "837":
+                    claim_filter = processor._get_claim_filter() if processor.filter_claims else None
+                    service_data = extract_sld_list(list(data), "837", claim_filter=claim_filter,
+                                                    issues=processor.issues)
+                else:
+                    service_data = processor._standardize_service_data(list(data))
+                diagnosis_codes = processor._get_unique_diagnosis_codes(service_data)
+
+            if self.model_names:
+                result = processor._calculate_raf_multi_from_demographics(diagnosis_codes, demographics,
+                                                                         self.model_names, self.blend_weights)
+            else:
+                result = processor._calculate_raf_from_demographics(diagnosis_codes, demographics)
+            if self.include_service_data and service_data is not None:
+                result = result.model_copy(update={'service_level_data': service_data})
+            return MemberResult(member_id, result)
+        except (TypeError, ValueError) as e:
+            if self.raise_errors:
+                raise
+            return MemberResult(member_id, None, f"{type(e).__name__}: {e}")
+
+    def score_chunk(self, chunk: List[PopulationMember]) -> List[MemberResult]:
+        return [self.score_member(member) for member in chunk]
+
+    def score_partition(self, task: Tuple[Partition, Optional[Callable[[MemberResult], Any]]]
+                        ) -> List[PartitionResult]:
+        partition, transform = task
+        unmatched: List[str] = []
+        results = []
+        for member in join_partition(partition, unmatched):
+            result = self.score_member(PopulationMember(*member))
+            results.append(result if transform is None else transform(result))
+        return [PartitionResult(partition.index, results, unmatched)]
+
+
+# Scorer of the current worker process, set by _init_worker
+_worker_scorer: Optional[_PopulationScorer] = None
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    global _worker_scorer
+    _worker_scorer = _PopulationScorer(**config)
+    _worker_scorer.warm_up()
+
+
+def _score_chunk_in_worker(chunk: List[PopulationMember]) -> List[MemberResult]:
+    return _worker_scorer.score_chunk(chunk)
+
+
+def _score_partition_in_worker(task: Tuple[Partition, Optional[Callable[[MemberResult], Any]]]
+                               ) -> List[PartitionResult]:
+    return _worker_scorer.score_partition(task)
+
+
+def _chunked(members: Iterable[PopulationMember], chunk_size: int) -> Iterator[List[PopulationMember]]:
+    iterator = iter(members)
+    while True:
+        chunk = [PopulationMember(*member) for member in islice(iterator, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def _stream(executor: Executor,
+            score_chunk: Callable[[Any], Iterable[Any]],
+            chunks: Iterable[Any],
+            max_in_flight: int,
+            ordered: bool) -> Iterator[Any]:
+    """
+    Keep at most max_in_flight chunks submitted, so the input is consumed lazily, and
+    yield the items returned for each chunk.
+    """
+    pending: deque = deque()
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(score_chunk, chunk))
+            while len(pending) >= max_in_flight:
+                yield from _next_results(pending, ordered)
+        while pending:
+            yield from _next_results(pending, ordered)
+    finally:
+        # Closing the generator early cancels the chunks that did not start
+        for future in pending:
+            future.cancel()
+
+
+def _next_results(pending: deque, ordered: bool) -> Iterator[Any]:
+    if ordered:
+        future = pending.popleft()
+    else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        future = next(f for f in pending if f in done)
+        pending.remove(future)
+    return iter(future.result())
+
+
+def score_population(members: Iterable[Union[PopulationMember, tuple]],
+                     model_name: ModelName = "CMS-HCC Model V28",
+                     model_names: Optional[List[ModelName]] = None,
+                     blend_weights: Optional[Dict[ModelName, float]] = None,
+                     input_format: InputFormat = "fhir",
+                     backend: Backend = "process",
+                     max_workers: Optional[int] = None,
+                     chunk_size: int = 256,
+                     ordered: bool = True,
+                     filter_claims: bool = True,
+                     proc_filtering_filename: ProcFilteringFilename = "ra_eligible_cpt_hcpcs_2026.csv",
+                     include_service_data: bool = False,
+                     raise_errors: bool = False,
+                     mp_context: Optional[str] = None,
+                     json_decoder: Union[DecoderName, Decoder, None] = None) -> Iterator[MemberResult]:
+    """
+    Score a population of members in parallel and stream the results.
+
+    Members are consumed lazily in chunks of chunk_size; at most two chunks per
+    worker are in flight, so memory stays bounded for arbitrarily large inputs.
+
+    With the process backend, everything sent to the workers is pickled by the
+    calling process, which becomes the bottleneck for large payloads. Pass EOBs as
+    raw JSON lines rather than dicts: pickling a string is a copy, while pickling a
+    decoded EOB costs about as much as scoring it.
+
+    Args:
+        members: Iterable of PopulationMember or (member_id, demographics, data) tuples
+        model_name: Model to score
+        model_names: Optional list of models to score instead of model_name; results
+            are then MultiModelRAFResult
+        blend_weights: Optional blend weights, see calculate_raf_multi
+        input_format: What the data of each member holds: "fhir" EOB resources, "837"
+            strings, "sld" service level data, or "diagnosis" codes
+        backend: "process" (default), "thread", or "serial" for debugging
+        max_workers: Number of workers. Default is os.cpu_count().
+        chunk_size: Number of members sent to a worker at once
+        ordered: Yield results in input order (True) or as chunks complete (False)
+        filter_claims: Whether to apply the CMS filtering rules
+        proc_filtering_filename: Eligible CPT/HCPCS file, which selects the filter year
+        include_service_data: Whether results keep their service level data; off by
+            default to keep the results small
+        raise_errors: Raise invalid member errors instead of returning them in
+            MemberResult.error
+        mp_context: Multiprocessing start method for the process backend
+            ("fork", "spawn", "forkserver"). Default is the platform default.
+        json_decoder: By default, raw EOB lines are validated as JSON without being
+            decoded to dicts (see extract_sld_fhir_json). Pass "auto", "orjson",
+            "json" or a callable (see hccinfhir.decoders) to decode them first; a
+            callable must be picklable for the process backend.
+
+    Returns:
+        Iterator of MemberResult
+
+    Example:
+        >>> # eob_lines_by_member: {member_id: [raw NDJSON line, ...]}
+        >>> members = ((m_id, demographics[m_id], lines) for m_id, lines in eob_lines_by_member.items())
+        >>> for member_id, result, error in score_population(members, max_workers=32, ordered=False):
+        ...     write(member_id, result.risk_score)
+    """
+    if backend not in ("process", "thread", "serial"):
+        raise ValueError(f"backend must be 'process', 'thread' or 'serial', got {backend}")
+    if input_format not in ("fhir", "837", "sld", "diagnosis"):
+        raise ValueError(f"input_format must be 'fhir', '837', 'sld' or 'diagnosis', got {input_format}")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    config = {
+        'model_name': model_name,
+        'model_names': list(model_names) if model_names else None,
+        'blend_weights': blend_weights,
+        'input_format': input_format,
+        'filter_claims': filter_claims,
+        'proc_filtering_filename': proc_filtering_filename,
+        'include_service_data': include_service_data,
+        'raise_errors': raise_errors,
+        'json_decoder': json_decoder,
+    }
+    return _score_population(members, config, backend, max_workers or os.cpu_count() or 1,
+                             chunk_size, ordered, mp_context)
+
+
+def _pool(config: Dict[str, Any], backend: Backend, max_workers: int,
+          mp_context: Optional[str]) -> Tuple[Optional[Executor], Optional[_PopulationScorer]]:
+    """
+    The executor of a backend (None for serial), and the scorer of this process for
+    the serial and thread backends (None for process, whose workers build theirs).
+    """
+    if backend == "process":
+        context = multiprocessing.get_context(mp_context)
+        if context.get_start_method() == "fork":
+            # Forked workers inherit the tables compiled here instead of each loading them
+            _PopulationScorer(**config).warm_up()
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(config,)), None
+    # Serial and thread backends share one scorer, compiled once in this process
+    scorer = _PopulationScorer(**config)
+    scorer.warm_up()
+    if backend == "serial":
+        return None, scorer
+    return ThreadPoolExecutor(max_workers=max_workers), scorer
+
+
+def _score_population(members: Iterable[Union[PopulationMember, tuple]],
+                      config: Dict[str, Any],
+                      backend: Backend,
+                      max_workers: int,
+                      chunk_size: int,
+                      ordered: bool,
+                      mp_context: Optional[str]) -> Iterator[MemberResult]:
+    chunks = _chunked(members, chunk_size)
+    executor, scorer = _pool(config, backend, max_workers, mp_context)
+    if executor is None:
+        for chunk in chunks:
+            yield from scorer.score_chunk(chunk)
+        return
+
+    score_chunk = _score_chunk_in_worker if scorer is None else scorer.score_chunk
+    with executor:
+        yield from _stream(executor, score_chunk, chunks, 2 * max_workers, ordered)
+
+
+def score_partitions(partitions: Iterable[Partition],
+                     model_name: ModelName = "CMS-HCC Model V28",
+                     model_names: Optional[List[ModelName]] = None,
+                     blend_weights: Optional[Dict[ModelName, float]] = None,
+                     backend: Backend = "process",
+                     max_workers: Optional[int] = None,
+                     transform: Optional[Callable[[MemberResult], Any]] = None,
+                     raise_errors: bool = False,
+                     mp_context: Optional[str] = None) -> Iterator[PartitionResult]:
+    """
+    Score the hash partitions of a spilled MemberDiagnoses in parallel, one
+    partition per task, and yield their results as they complete.
+
+    Each worker reads the codes and demographics files of a partition, merges the
+    codes of each member, scores the members and removes the files (see
+    join_partition). The calling process only receives the results, and at most
+    one partition per worker is in flight, so memory is bounded by the partition
+    size rather than the population.
+
+    Args:
+        partitions: Partitions, from MemberDiagnoses.partitions
+        model_name, model_names, blend_weights, backend, max_workers, raise_errors,
+            mp_context: See score_population
+        transform: Function applied in the worker to the MemberResult of each
+            member, e.g. to send back compact output rows (see
+            hccinfhir.writers.member_rows); must be picklable for the process backend
+
+    Returns:
+        Iterator of PartitionResult
+
+    Example:
+        >>> with MemberDiagnoses(max_bytes=2 << 30, n_partitions=256) as store:
+        ...     store.update(diagnoses)  # spilled beyond 2 GB
+        ...     for partition in score_partitions(store.partitions(read_demographics("members.csv"))):
+        ...         for member_id, result, error in partition.results:
+        ...             write(member_id, result, error)
+    """
+    if backend not in ("process", "thread", "serial"):
+        raise ValueError(f"backend must be 'process', 'thread' or 'serial', got {backend}")
+    config = {
+        'model_name': model_name,
+        'model_names': list(model_names) if model_names else None,
+        'blend_weights': blend_weights,
+        'input_format': "diagnosis",
+        'filter_claims': False,
+        'proc_filtering_filename': "ra_eligible_cpt_hcpcs_2026.csv",
+        'include_service_data': False,
+        'raise_errors': raise_errors,
+    }
+    return _score_partitions(partitions, config, backend, max_workers or os.cpu_count() or 1,
+                             transform, mp_context)
+
+
+def _score_partitions(partitions: Iterable[Partition],
+                      config: Dict[str, Any],
+                      backend: Backend,
+                      max_workers: int,
+                      transform: Optional[Callable[[MemberResult], Any]],
+                      mp_context: Optional[str]) -> Iterator[PartitionResult]:
+    tasks = ((partition, transform) for partition in partitions)
+    executor, scorer = _pool(config, backend, max_workers, mp_context)
+    if executor is None:
+        for task in tasks:
+            yield from scorer.score_partition(task)
+        return
+
+    score_partition = _score_partition_in_worker if scorer is None else scorer.score_partition
+    with executor:
+        yield from _stream(executor, score_partition, tasks, max_workers, ordered=False)
@@ -0,0 +1,575 @@
+"""
+Batch input readers: claim file discovery, demographics files and per-member
+diagnosis grouping.
+
+Every file reader goes through open_input, which decompresses gzip, bz2 and xz
+files on the fly, detected from their magic bytes, so archives do not need to be
+decompressed to disk first.
+
+Claims of a member can be spread over many files, so batch scoring first reduces
+every claim to the diagnosis codes of its patient (extract_member_diagnoses), then
+scores each member once. MemberDiagnoses holds those codes and spills them to
+hash partitions on disk beyond a memory budget.
+"""
+
+import csv
+import glob
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import weakref
+import zlib
+from itertools import islice
+from typing import (Any, BinaryIO, Dict, Iterable, Iterator, List, Literal, NamedTuple, Optional, Set, TextIO,
+                    Tuple, Union)
+from hccinfhir.decoders import Decoder, DecoderName, decode_lines, get_decoder
+
+ClaimFormat = Literal["fhir", "837"]
+
+FHIR_EXTENSIONS = ('.ndjson', '.jsonl', '.json')
+X12_EXTENSIONS = ('.837', '.x12', '.edi', '.txt')
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+# Magic bytes of the compressed formats read transparently
+COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+
+# Read size of the input files, and of the decompressed chunks
+READ_BUFFER_SIZE = 1 << 20
+
+
+def _base_name(path: str) -> str:
+    """Lowercase path without its compression extension: claims.ndjson.gz -> claims.ndjson."""
+    name = path.lower()
+    for extension in COMPRESSED_EXTENSIONS:
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """Return "gzip", "bz2" or "xz" from the magic bytes of a file, or None if uncompressed."""
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+class _CompressedInput(io.BufferedReader):
+    """Buffered reader over a decompressor that also closes the compressed file."""
+
+    def __init__(self, stream: io.RawIOBase, file: BinaryIO, buffer_size: int):
+        super().__init__(stream, buffer_size)
+        self._file = file
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._file.close()
+
+
+class _ThreadedReader(io.RawIOBase):
+    """
+    Reads a stream on a background thread, max_chunks chunks ahead.
+
+    The stdlib decompressors release the GIL, so decompression overlaps with the
+    parsing done by the consumer.
+    """
+
+    def __init__(self, stream: BinaryIO, chunk_size: int = READ_BUFFER_SIZE, max_chunks: int = 4):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._queue: queue.Queue = queue.Queue(max_chunks)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._produce, name='hccinfhir-decompress', daemon=True)
+        self._thread.start()
+
+    def readable(self) -> bool:
+        return True
+
+    def _produce(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                chunk = self._stream.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item: Any) -> None:
+        # Gives up once the consumer closed the reader, which may never read again
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readinto(self, buffer: Any) -> int:
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._pending = memoryview(item)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stopped.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+def open_input(path: str, threaded: bool = False, buffer_size: int = READ_BUFFER_SIZE) -> BinaryIO:
+    """
+    Open a file for binary reading, decompressing gzip, bz2 and xz files on the fly.
+
+    The compression is detected from the magic bytes, whatever the file extension.
+
+    Args:
+        path: File to read
+        threaded: Decompress on a background thread, so that decompression overlaps
+            with parsing; ignored for uncompressed files
+        buffer_size: Size of the reads from the file and of the decompressed chunks
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb', buffering=buffer_size)
+
+    file = open(path, 'rb', buffering=buffer_size)
+    try:
+        if compression == 'gzip':
+            import gzip
+            stream = gzip.GzipFile(fileobj=file, mode='rb')
+        elif compression == 'bz2':
+            import bz2
+            stream = bz2.BZ2File(file, mode='rb')
+        else:
+            import lzma
+            stream = lzma.LZMAFile(file, mode='rb')
+        if threaded:
+            stream = _ThreadedReader(stream, buffer_size)
+        return _CompressedInput(stream, file, buffer_size)
+    except BaseException:
+        file.close()
+        raise
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """
+    Resolve files, directories and glob patterns (including `**`) to a sorted list of
+    files. Directories contribute the files with a known claim extension, compressed
+    or not.
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, filenames in os.walk(pattern):
+                paths.update(os.path.join(root, name) for name in filenames
+                             if _base_name(name).endswith(FHIR_EXTENSIONS + X12_EXTENSIONS))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def detect_format(path: str) -> ClaimFormat:
+    """Guess whether a file holds FHIR EOB NDJSON or X12 837, by extension then content."""
+    name = _base_name(path)
+    if name.endswith(FHIR_EXTENSIONS):
+        return "fhir"
+    if name.endswith(('.837', '.x12', '.edi')):
+        return "837"
+    with open_input(path) as f:
+        head = f.read(512).lstrip()
+    if head.startswith(b'{'):
+        return "fhir"
+    if head.startswith(b'ISA'):
+        return "837"
+    raise ValueError(f"Cannot detect the format of {path}; pass it explicitly")
+
+
+def iter_ndjson_lines(path: str, threaded: bool = False) -> Iterator[bytes]:
+    """Yield the non-empty lines of an NDJSON file, undecoded; see open_input for threaded."""
+    with open_input(path, threaded) as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def read_claims(path: str, claim_format: Optional[ClaimFormat] = None,
+                threaded: bool = False,
+                decoder: Union[DecoderName, Decoder, None] = None,
+                batch_size: int = 1000) -> Iterator[Any]:
+    """
+    Yield the claims of a file in the input format of extract_sld_list: the decoded
+    EOBs of an NDJSON file, or the content of an 837 file. Compressed files are
+    read transparently (see open_input).
+
+    EOBs are decoded batch_size lines at a time with decoder (see
+    hccinfhir.decoders; default: the fastest installed).
+
+    Example:
+        >>> slds = extract_sld_list(read_claims("eobs.ndjson.gz"), format="fhir")
+    """
+    claim_format = claim_format or detect_format(path)
+    if claim_format == "837":
+        with open_input(path) as f:
+            yield f.read().decode('utf-8')
+        return
+    loads = get_decoder(decoder)
+    lines = iter_ndjson_lines(path, threaded)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return
+        yield from decode_lines(batch, loads)
+
+
+def read_demographics(path: str, member_id_field: str = "member_id") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield (member_id, demographics) from a CSV or NDJSON file.
+
+    Columns other than member_id_field are passed to Demographics as is; empty CSV
+    cells are left out so that the Demographics defaults apply.
+    """
+    if _base_name(path).endswith(FHIR_EXTENSIONS):
+        for line in iter_ndjson_lines(path):
+            row = json.loads(line)
+            member_id = row.pop(member_id_field)
+            yield str(member_id), row
+        return
+
+    with io.TextIOWrapper(open_input(path), encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None or member_id_field not in reader.fieldnames:
+            raise ValueError(f"{path} has no {member_id_field!r} column")
+        for row in reader:
+            member_id = row.pop(member_id_field)
+            yield member_id, {key: value for key, value in row.items() if value not in ('', None)}
+
+
+class Extraction(NamedTuple):
+    """
+    Claims reduced by extract_member_diagnoses.
+
+    Attributes:
+        diagnoses: Sorted diagnosis codes per patient id
+        counts: 'records' (EOBs or 837 files read), 'service_lines' kept by the
+            filter, 'issues' (invalid inputs) and 'no_patient_id' (service lines
+            without a patient id, dropped)
+        service_lines: The kept service lines as columns of SERVICE_LINE_SCHEMA
+            (see hccinfhir.writers), if requested
+    """
+    diagnoses: Dict[str, List[str]]
+    counts: Dict[str, int]
+    service_lines: Optional[Dict[str, List[Any]]] = None
+
+
+def extract_member_diagnoses(claim_format: ClaimFormat,
+                             payload: Any,
+                             year: Optional[int] = 2026,
+                             service_lines: bool = False,
+                             decoder: Union[DecoderName, Decoder, None] = None) -> Extraction:
+    """
+    Reduce claims to the diagnosis codes of each patient.
+
+    Args:
+        claim_format: "fhir" or "837"
+        payload: For "fhir", a list of EOB NDJSON lines; for "837", a file path
+        year: Year of the CMS filtering rules, or None to keep every service line
+        service_lines: Also return the kept service lines, as columns
+        decoder: By default, EOB lines are given to the extractor as JSON and
+            validated without being decoded to dicts (see extract_sld_fhir_json).
+            With a decoder ("auto", "orjson", "json" or a callable, see
+            hccinfhir.decoders), they are decoded first.
+
+    Returns:
+        Extraction
+    """
+    from hccinfhir.extractor import extract_sld_list
+    from hccinfhir.filter import compile_filter
+    from hccinfhir.issues import IssueCollector
+
+    claim_filter = compile_filter(year=year) if year is not None else None
+    issues = IssueCollector(max_records=0)
+    if claim_format == "fhir":
+        items = list(payload) if decoder is None else decode_lines(payload, decoder)
+    else:
+        items = list(read_claims(payload, "837"))
+    slds = extract_sld_list(items, claim_format, claim_filter=claim_filter, issues=issues)
+
+    diagnoses: Dict[str, Set[str]] = {}
+    no_patient_id = 0
+    for sld in slds:
+        if not sld.patient_id:
+            no_patient_id += 1
+            continue
+        codes = diagnoses.get(sld.patient_id)
+        if codes is None:
+            codes = diagnoses[sld.patient_id] = set()
+        codes.update(sld.claim_diagnosis_codes)
+    counts = {'records': len(items), 'service_lines': len(slds),
+              'issues': issues.total, 'no_patient_id': no_patient_id}
+
+    columns = None
+    if service_lines:
+        from hccinfhir.writers import SERVICE_LINE_COLUMNS, service_line_rows
+        rows = list(service_line_rows(None, slds))
+        columns = {name: [row[i] for row in rows] for i, name in enumerate(SERVICE_LINE_COLUMNS)}
+    return Extraction({member_id: sorted(codes) for member_id, codes in diagnoses.items()}, counts, columns)
+
+
+def _write_entry(f: TextIO, member_id: str, codes: Iterable[str]) -> None:
+    """
+    Write a (member_id, codes) entry of a partition file: "member_id<TAB>code,code".
+    Values that would break the format (tabs, line breaks or commas in a code, a
+    leading "[") are written as a JSON array instead.
+    """
+    codes = sorted(codes)
+    joined = ','.join(codes)
+    if ('\t' in member_id or '\n' in member_id or '\r' in member_id or member_id.startswith('[')
+            or '\t' in joined or '\n' in joined or joined.count(',') != max(len(codes) - 1, 0)):
+        f.write(json.dumps([member_id, codes]))
+    else:
+        f.write(member_id)
+        f.write('\t')
+        f.write(joined)
+    f.write('\n')
+
+
+def _read_entries(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """Yield the (member_id, codes) entries of a partition file; see _write_entry."""
+    with open(path, encoding='utf-8', newline='\n') as f:
+        for line in f:
+            if line.startswith('['):
+                member_id, codes = json.loads(line)
+                yield member_id, codes
+                continue
+            member_id, _, codes = line[:-1].partition('\t')
+            yield member_id, codes.split(',') if codes else []
+
+
+class Partition(NamedTuple):
+    """Files of one hash partition of a spilled MemberDiagnoses; either can be None."""
+    index: int
+    codes_path: Optional[str]
+    demographics_path: Optional[str]
+
+
+def join_partition(partition: Partition,
+                   unmatched: List[str]) -> Iterator[Tuple[str, Dict[str, Any], List[str]]]:
+    """
+    Yield (member_id, demographics, codes) for the members of the demographics of
+    one partition, as MemberDiagnoses.join does, and append the member ids with
+    codes but without demographics to unmatched. The files are removed once read,
+    so partitions can be joined independently, e.g. in different processes.
+    """
+    merged: Dict[str, Set[str]] = {}
+    if partition.codes_path is not None:
+        for member_id, codes in _read_entries(partition.codes_path):
+            current = merged.get(member_id)
+            if current is None:
+                merged[member_id] = set(codes)
+            else:
+                current.update(codes)
+        os.remove(partition.codes_path)
+    if partition.demographics_path is not None:
+        with open(partition.demographics_path, encoding='utf-8') as f:
+            for line in f:
+                member_id, member_demographics = json.loads(line)
+                yield member_id, member_demographics, sorted(merged.pop(member_id, ()))
+        os.remove(partition.demographics_path)
+    unmatched.extend(merged)
+
+
+class MemberDiagnoses:
+    """
+    Diagnosis codes per member, bounded in memory.
+
+    Codes are merged in memory until their estimated size exceeds max_bytes. The
+    index is then appended to n_partitions files on disk, partitioned by a hash of
+    the member id, and emptied. A member always lands in the same partition, so
+    every partition can be merged and scored on its own (iter_partitions,
+    partitions and join_partition), in any order and in parallel.
+
+    Partition files hold one compact "member_id<TAB>code,code" line per member and
+    spill. They are removed by close, or when the object is garbage collected or
+    the interpreter exits if close was not called.
+
+    Args:
+        max_bytes: Memory budget of the in-memory index; None for no limit
+        n_partitions: Number of partitions once spilled
+        tmp_dir: Directory of the partition files (default: the system temp dir)
+    """
+
+    # Rough per-object sizes of the in-memory index, used for the budget
+    MEMBER_OVERHEAD = 300
+    CODE_OVERHEAD = 70
+
+    def __init__(self, max_bytes: Optional[int] = None, n_partitions: int = 16,
+                 tmp_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.n_partitions = n_partitions
+        self.tmp_dir = tmp_dir
+        self.codes: Dict[str, Set[str]] = {}
+        self.estimated_bytes = 0
+        self.spill_dir: Optional[str] = None
+        self.spills = 0
+        self._cleanup: Optional[weakref.finalize] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_dir is not None
+
+    def partition_of(self, member_id: str) -> int:
+        return zlib.crc32(member_id.encode('utf-8')) % self.n_partitions
+
+    def add(self, member_id: str, codes: Iterable[str]) -> None:
+        current = self.codes.get(member_id)
+        if current is None:
+            current = self.codes[member_id] = set()
+            self.estimated_bytes += self.MEMBER_OVERHEAD + len(member_id)
+        before = len(current)
+        current.update(codes)
+        self.estimated_bytes += (len(current) - before) * self.CODE_OVERHEAD
+        if self.max_bytes is not None and self.estimated_bytes > self.max_bytes:
+            self.spill()
+
+    def update(self, diagnoses: Dict[str, Iterable[str]]) -> None:
+        for member_id, codes in diagnoses.items():
+            self.add(member_id, codes)
+
+    def _partition_path(self, partition: int) -> str:
+        return os.path.join(self.spill_dir, f"part-{partition:04d}.tsv")
+
+    def spill(self) -> None:
+        """Append the in-memory index to the partition files and empty it."""
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='hccinfhir-', dir=self.tmp_dir)
+            self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+        files = {}
+        try:
+            for member_id, codes in self.codes.items():
+                partition = self.partition_of(member_id)
+                f = files.get(partition)
+                if f is None:
+                    f = files[partition] = open(self._partition_path(partition), 'a', encoding='utf-8',
+                                                newline='\n')
+                _write_entry(f, member_id, codes)
+        finally:
+            for f in files.values():
+                f.close()
+        self.codes = {}
+        self.estimated_bytes = 0
+        self.spills += 1
+
+    def iter_partitions(self) -> Iterator[Tuple[Optional[int], Dict[str, Set[str]]]]:
+        """
+        Yield (partition, {member_id: codes}) with the codes of each member merged.
+
+        Without a spill, a single (None, index) is yielded. Once spilled, the
+        remaining index is spilled too and each partition is loaded in turn.
+        """
+        if not self.spilled:
+            yield None, self.codes
+            return
+        if self.codes:
+            self.spill()
+        for partition in range(self.n_partitions):
+            path = self._partition_path(partition)
+            merged: Dict[str, Set[str]] = {}
+            if os.path.exists(path):
+                for member_id, codes in _read_entries(path):
+                    merged.setdefault(member_id, set()).update(codes)
+            yield partition, merged
+
+    def join(self, demographics: Iterable[Tuple[str, Dict[str, Any]]],
+             unmatched: List[str]) -> Iterator[Tuple[str, Dict[str, Any], List[str]]]:
+        """
+        Yield (member_id, demographics, codes) for every member of demographics; codes
+        are empty for members without claims. Member ids with codes but without
+        demographics are appended to unmatched. Consumes the index.
+
+        Once spilled, demographics are partitioned on disk like the codes, so only
+        one partition of each is in memory at a time.
+        """
+        if not self.spilled:
+            codes = self.codes
+            for member_id, member_demographics in demographics:
+                yield member_id, member_demographics, sorted(codes.pop(member_id, ()))
+            unmatched.extend(codes)
+            self.codes = {}
+            return
+
+        for partition in self.partitions(demographics):
+            yield from join_partition(partition, unmatched)
+
+    def partitions(self, demographics: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Partition]:
+        """
+        Spill what is left of the index, partition demographics on disk like the
+        codes, and return the partitions, to be joined with join_partition. Only
+        for a spilled index; consumes it.
+        """
+        if not self.spilled:
+            raise ValueError("Only a spilled index is partitioned; use join")
+        if self.codes:
+            self.spill()
+        files = {}
+        try:
+            for member_id, member_demographics in demographics:
+                partition = self.partition_of(member_id)
+                f = files.get(partition)
+                if f is None:
+                    f = files[partition] = open(self._demographics_path(partition), 'w', encoding='utf-8')
+                f.write(json.dumps([member_id, member_demographics]))
+                f.write('\n')
+        finally:
+            for f in files.values():
+                f.close()
+
+        partitions = []
+        for index in range(self.n_partitions):
+            codes_path, demographics_path = self._partition_path(index), self._demographics_path(index)
+            partition = Partition(index, codes_path if os.path.exists(codes_path) else None,
+                                  demographics_path if os.path.exists(demographics_path) else None)
+            if partition.codes_path or partition.demographics_path:
+                partitions.append(partition)
+        return partitions
+
+    def _demographics_path(self, partition: int) -> str:
+        return os.path.join(self.spill_dir, f"demographics-{partition:04d}.ndjson")
+
+    def close(self) -> None:
+        """Remove the partition files."""
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+            self.spill_dir = None
+        self.codes = {}
+
+    def __enter__(self) -> 'MemberDiagnoses':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,459 @@
+"""
+Synthetic Claims Module for HCCInFHIR
+
+Seeded generator of realistic-looking claims for benchmarks and load tests. The same
+population can be rendered as FHIR ExplanationOfBenefit resources (NDJSON) and as
+X12 837P/837I files. Diagnosis codes are drawn from the shipped dx to CC mapping
+tables and procedure codes from the eligible CPT/HCPCS list, mixed with unmapped and
+ineligible codes so that the filtering and mapping stages do real work.
+"""
+
+import json
+import os
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from hccinfhir.datamodels import ModelName
+from hccinfhir.filter import INPATIENT_TOB, OUTPATIENT_TOB, get_eligible_cpt_hcpcs
+from hccinfhir.model_compiled import compile_model
+
+BB = "https://bluebutton.cms.gov/resources"
+
+# Common codes that do not map to any CC, used as noise
+UNMAPPED_DX_CODES = ('Z0000', 'Z0001', 'I10', 'R05', 'J069', 'M545', 'E785', 'R079', 'Z23',
+                     'K219', 'N390', 'R51', 'Z1231', 'R0602', 'M1990', 'H5213', 'L570', 'Z79899')
+INELIGIBLE_PROCEDURE_CODES = ('36415', '85025', '80053', 'A0428', 'E0601', 'J1100', '71045',
+                              '93000', '81001', 'G0008', '90471', '84443')
+# Type of Bill prefixes that are never eligible (e.g. 18X swing bed, 22X SNF, 81X hospice)
+INELIGIBLE_TOB = ('18X', '21X', '22X', '32X', '34X', '81X', '82X')
+SPECIALTIES = ('01', '06', '08', '11', '13', '29', '38', '39', '46', '50', '97')
+
+DxDistribution = Literal["uniform", "zipf"]
+
+
+class SyntheticClaimsGenerator:
+    """
+    Deterministic synthetic claims for a population of members.
+
+    Every member and claim is generated from its own seeded random stream, so the
+    output only depends on the constructor arguments: the same generator always
+    renders the same members and claims, whatever the order of the calls.
+
+    Example:
+        >>> gen = SyntheticClaimsGenerator(seed=42, n_members=1000, claims_per_member=(1, 20))
+        >>> gen.write_eob_ndjson("eobs.ndjson")
+        >>> gen.write_837("claims_837p.txt", "837P")
+        >>> demographics = gen.demographics()
+    """
+
+    def __init__(self,
+                 seed: int = 0,
+                 n_members: int = 100,
+                 claims_per_member: Tuple[int, int] = (1, 10),
+                 dx_per_claim: Tuple[int, int] = (1, 6),
+                 lines_per_claim: Tuple[int, int] = (1, 4),
+                 mapped_dx_rate: float = 0.3,
+                 dx_distribution: DxDistribution = "zipf",
+                 institutional_rate: float = 0.25,
+                 eligible_procedure_rate: float = 0.85,
+                 model_name: ModelName = "CMS-HCC Model V28",
+                 year: int = 2026,
+                 bulky: bool = True):
+        """
+        Args:
+            seed: Random seed
+            n_members: Number of members
+            claims_per_member: Inclusive (min, max) number of claims per member
+            dx_per_claim: Inclusive (min, max) number of diagnosis codes per claim
+            lines_per_claim: Inclusive (min, max) number of service lines per claim
+            mapped_dx_rate: Share of diagnosis codes drawn from the dx to CC mapping of
+                model_name; the rest are common unmapped codes
+            dx_distribution: "uniform" over the mapped codes, or "zipf" so that a small
+                number of codes dominate as in real claims
+            institutional_rate: Share of institutional claims
+            eligible_procedure_rate: Share of procedure codes drawn from the eligible
+                CPT/HCPCS list of `year`
+            model_name: Model whose mapping table the diagnosis codes are drawn from
+            year: Year of the eligible CPT/HCPCS list
+            bulky: Include the adjudication and extension sections found in real
+                Blue Button EOBs, which make up most of the payload
+
+        Raises:
+            ValueError: If a (min, max) range or a rate is invalid
+        """
+        for name, (low, high) in (('claims_per_member', claims_per_member),
+                                  ('dx_per_claim', dx_per_claim),
+                                  ('lines_per_claim', lines_per_claim)):
+            if low < 0 or high < low:
+                raise ValueError(f"{name} must be a (min, max) range with 0 <= min <= max")
+        for name, rate in (('mapped_dx_rate', mapped_dx_rate),
+                           ('institutional_rate', institutional_rate),
+                           ('eligible_procedure_rate', eligible_procedure_rate)):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"{name} must be between 0 and 1")
+        if dx_distribution not in ("uniform", "zipf"):
+            raise ValueError("dx_distribution must be 'uniform' or 'zipf'")
+
+        self.seed = seed
+        self.n_members = n_members
+        self.claims_per_member = claims_per_member
+        self.dx_per_claim = dx_per_claim
+        self.lines_per_claim = lines_per_claim
+        self.mapped_dx_rate = mapped_dx_rate
+        self.dx_distribution = dx_distribution
+        self.institutional_rate = institutional_rate
+        self.eligible_procedure_rate = eligible_procedure_rate
+        self.model_name = model_name
+        self.year = year
+        self.bulky = bulky
+
+        mapping = compile_model(model_name).dx_to_cc_mapping
+        self.mapped_dx_codes = sorted(dx for dx, _ in mapping)
+        self.unmapped_dx_codes = [dx for dx in UNMAPPED_DX_CODES if (dx, model_name) not in mapping]
+        eligible = get_eligible_cpt_hcpcs(year)
+        self.eligible_procedure_codes = sorted(eligible)
+        self.ineligible_procedure_codes = [code for code in INELIGIBLE_PROCEDURE_CODES if code not in eligible]
+        self.eligible_tob = sorted(INPATIENT_TOB | OUTPATIENT_TOB)
+
+        # Shuffle the codes once so that the zipf head is not alphabetical
+        rng = random.Random(f"{seed}:codes")
+        rng.shuffle(self.mapped_dx_codes)
+        self._dx_cum_weights = None
+        if dx_distribution == "zipf":
+            total = 0.0
+            self._dx_cum_weights = []
+            for rank in range(1, len(self.mapped_dx_codes) + 1):
+                total += 1.0 / rank
+                self._dx_cum_weights.append(total)
+
+    def _rng(self, *key: Any) -> random.Random:
+        return random.Random(":".join(str(k) for k in (self.seed,) + key))
+
+    def member_id(self, index: int) -> str:
+        return f"M{self.seed:04d}{index:08d}"
+
+    def _demographics(self, rng: random.Random) -> Dict[str, Any]:
+        disabled = rng.random() < 0.12
+        age = rng.randint(21, 64) if disabled else min(65 + int(rng.expovariate(1 / 9)), 104)
+        dual = rng.random()
+        return {
+            'age': age,
+            'sex': rng.choice('MF'),
+            'dual_elgbl_cd': '02' if dual < 0.12 else '08' if dual < 0.18 else '00',
+            'orec': '1' if disabled else rng.choices('02', weights=(90, 10))[0],
+            'crec': '1' if disabled else '0',
+            'new_enrollee': rng.random() < 0.04,
+            'snp': False,
+            'low_income': dual < 0.18,
+        }
+
+    def demographics(self) -> Dict[str, Dict[str, Any]]:
+        """Return the demographics of every member, keyed by member id."""
+        return {self.member_id(i): self._demographics(self._rng('member', i))
+                for i in range(self.n_members)}
+
+    def _diagnosis_code(self, rng: random.Random) -> str:
+        if not self.unmapped_dx_codes or rng.random() < self.mapped_dx_rate:
+            if self._dx_cum_weights is not None:
+                return rng.choices(self.mapped_dx_codes, cum_weights=self._dx_cum_weights)[0]
+            return rng.choice(self.mapped_dx_codes)
+        return rng.choice(self.unmapped_dx_codes)
+
+    def _procedure_code(self, rng: random.Random) -> str:
+        if not self.ineligible_procedure_codes or rng.random() < self.eligible_procedure_rate:
+            return rng.choice(self.eligible_procedure_codes)
+        return rng.choice(self.ineligible_procedure_codes)
+
+    def member_claims(self, index: int) -> List[Dict[str, Any]]:
+        """
+        Return the claims of one member in a format-neutral form.
+
+        Each claim is a dict with claim_id, patient_id, institutional, tob (facility
+        type + service type, institutional only), npi, specialty, from_date, to_date,
+        diagnosis_codes and lines (list of (procedure_code, service_date, charge)).
+        """
+        rng = self._rng('claims', index)
+        patient_id = self.member_id(index)
+        start = date(self.year - 1, 1, 1)
+        claims = []
+        for c in range(rng.randint(*self.claims_per_member)):
+            institutional = rng.random() < self.institutional_rate
+            from_date = start + timedelta(days=rng.randrange(365))
+            to_date = from_date + timedelta(days=rng.randint(1, 10) if institutional else 0)
+            dx_codes = list(dict.fromkeys(self._diagnosis_code(rng)
+                                          for _ in range(rng.randint(*self.dx_per_claim))))
+            tob = None
+            if institutional:
+                tob = rng.choice(self.eligible_tob if rng.random() < 0.9 else INELIGIBLE_TOB)[:2]
+            lines = []
+            for _ in range(rng.randint(*self.lines_per_claim)):
+                service_date = from_date + timedelta(days=rng.randint(0, (to_date - from_date).days))
+                lines.append((self._procedure_code(rng), service_date, rng.randint(20, 2500)))
+            claims.append({
+                'claim_id': f"{patient_id}C{c:04d}",
+                'patient_id': patient_id,
+                'institutional': institutional,
+                'tob': tob,
+                'npi': str(1000000000 + rng.randrange(900000000)),
+                'specialty': rng.choice(SPECIALTIES),
+                'from_date': from_date,
+                'to_date': to_date,
+                'diagnosis_codes': dx_codes,
+                'lines': lines,
+            })
+        return claims
+
+    def iter_claims(self) -> Iterator[Dict[str, Any]]:
+        """Yield the format-neutral claims of all members, member by member."""
+        for i in range(self.n_members):
+            yield from self.member_claims(i)
+
+    # FHIR ExplanationOfBenefit rendering
+
+    def _money_extensions(self, rng: random.Random) -> List[Dict[str, Any]]:
+        names = ('clm_pass_thru_per_diem_amt', 'nch_prmry_pyr_clm_pd_amt', 'clm_tot_pps_cptl_amt',
+                 'nch_bene_ip_ddctbl_amt', 'nch_bene_pta_coinsrnc_lblty_am', 'nch_ip_ncvrd_chrg_amt',
+                 'nch_drg_outlier_aprvd_pmt_amt', 'clm_pps_cptl_fsp_amt', 'clm_pps_old_cptl_hld_hrmls_amt')
+        return [{'url': f"{BB}/variables/{name}",
+                 'valueMoney': {'currency': 'USD', 'value': round(rng.random() * 100, 2)}}
+                for name in names]
+
+    def _adjudication(self, rng: random.Random, charge: int) -> List[Dict[str, Any]]:
+        categories = (('line_sbmtd_chrg_amt', 'submitted'), ('line_alowd_chrg_amt', 'eligible'),
+                      ('line_nch_pmt_amt', 'benefit'), ('line_bene_ptb_ddctbl_amt', 'deductible'),
+                      ('line_coinsrnc_amt', 'coinsurance'))
+        return [{'amount': {'currency': 'USD', 'value': round(charge * rng.uniform(0.2, 1.0), 2)},
+                 'category': {'coding': [
+                     {'code': code, 'system': 'http://terminology.hl7.org/CodeSystem/adjudication'},
+                     {'code': f"{BB}/variables/{name}", 'display': name,
+                      'system': 'https://bluebutton.cms.gov/resources/codesystem/adjudication'}]}}
+                for name, code in categories]
+
+    def render_eob(self, claim: Dict[str, Any]) -> Dict[str, Any]:
+        """Render a format-neutral claim as a FHIR ExplanationOfBenefit resource."""
+        rng = self._rng('eob', claim['claim_id'])
+        institutional = claim['institutional']
+        type_coding = [{'code': '60' if institutional else '71',
+                        'system': f"{BB}/variables/nch_clm_type_cd"},
+                       {'code': 'INPATIENT' if institutional else 'CARRIER',
+                        'system': f"{BB}/codesystem/eob-type"},
+                       {'code': 'institutional' if institutional else 'professional',
+                        'system': 'http://terminology.hl7.org/CodeSystem/claim-type'}]
+        if institutional:
+            type_coding.append({'code': claim['tob'][1], 'system': f"{BB}/variables/clm_srvc_clsfctn_type_cd"})
+
+        items = []
+        for seq, (procedure_code, service_date, charge) in enumerate(claim['lines'], 1):
+            item = {
+                'sequence': seq,
+                'diagnosisSequence': [rng.randint(1, len(claim['diagnosis_codes']))] if claim['diagnosis_codes'] else [],
+                'productOrService': {'coding': [{'code': procedure_code,
+                                                 'system': f"{BB}/codesystem/hcpcs"}]},
+                'quantity': {'value': rng.randint(1, 3)},
+                'servicedPeriod': {'start': service_date.isoformat(), 'end': service_date.isoformat()},
+            }
+            if self.bulky:
+                item['adjudication'] = self._adjudication(rng, charge)
+                item['locationCodeableConcept'] = {'coding': [
+                    {'code': '21' if institutional else '11', 'system': f"{BB}/variables/line_place_of_srvc_cd"}]}
+            items.append(item)
+
+        eob = {
+            'resourceType': 'ExplanationOfBenefit',
+            'id': claim['claim_id'],
+            'status': 'active',
+            'type': {'coding': type_coding},
+            'patient': {'reference': f"Patient/{claim['patient_id']}"},
+            'billablePeriod': {'start': claim['from_date'].isoformat(), 'end': claim['to_date'].isoformat()},
+            'careTeam': [{
+                'sequence': 1,
+                'provider': {'identifier': {'value': claim['npi']}},
+                'role': {'coding': [{'code': 'performing',
+                                     'system': 'http://hl7.org/fhir/us/carin-bb/CodeSystem/C4BBClaimCareTeamRole'}]},
+                'qualification': {'coding': [{'code': claim['specialty'],
+                                              'system': f"{BB}/variables/prvdr_spclty"}]},
+            }],
+            'diagnosis': [{
+                'sequence': seq,
+                'diagnosisCodeableConcept': {'coding': [{'code': dx, 'system': 'http://hl7.org/fhir/sid/icd-10-cm'}]},
+                'type': [{'coding': [{'code': 'principal' if seq == 1 else 'other',
+                                      'system': 'http://terminology.hl7.org/CodeSystem/ex-diagnosistype'}]}],
+            } for seq, dx in enumerate(claim['diagnosis_codes'], 1)],
+            'item': items,
+        }
+        if institutional:
+            eob['facility'] = {'extension': [{'url': f"{BB}/variables/clm_fac_type_cd",
+                                              'valueCoding': {'code': claim['tob'][0],
+                                                              'system': f"{BB}/variables/clm_fac_type_cd"}}]}
+        if self.bulky:
+            eob['extension'] = self._money_extensions(rng)
+            eob['meta'] = {'lastUpdated': f"{self.year}-01-01T00:00:00.000+00:00"}
+        return eob
+
+    def iter_eobs(self) -> Iterator[Dict[str, Any]]:
+        """Yield the claims of all members as ExplanationOfBenefit resources."""
+        for claim in self.iter_claims():
+            yield self.render_eob(claim)
+
+    def eob_list(self) -> List[Dict[str, Any]]:
+        return list(self.iter_eobs())
+
+    def write_eob_ndjson(self, path: str) -> int:
+        """Write all EOBs to an NDJSON file and return the number of resources written."""
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for eob in self.iter_eobs():
+                f.write(json.dumps(eob, separators=(',', ':')))
+                f.write('\n')
+                count += 1
+        return count
+
+    # Bulk Data export rendering
+
+    def render_patient(self, index: int, as_of: date) -> Dict[str, Any]:
+        """Render a member as a FHIR Patient whose age on as_of is the member's age."""
+        demographics = self._demographics(self._rng('member', index))
+        days = self._rng('birth', index).randint(0, 364)
+        birth_date = date(as_of.year - demographics['age'], as_of.month, min(as_of.day, 28)) - timedelta(days=days)
+        return {'resourceType': 'Patient', 'id': self.member_id(index),
+                'gender': 'male' if demographics['sex'] == 'M' else 'female',
+                'birthDate': birth_date.isoformat()}
+
+    def render_coverage(self, index: int) -> Dict[str, Any]:
+        """Render the Part A Coverage of a member, with its entitlement and dual status variables."""
+        demographics = self._demographics(self._rng('member', index))
+        variables = [('orec', demographics['orec']), ('crec', demographics['crec'])]
+        variables += [(f"dual_{month:02d}", demographics['dual_elgbl_cd']) for month in range(1, 13)]
+        return {'resourceType': 'Coverage', 'id': f"part-a-{self.member_id(index)}", 'status': 'active',
+                'beneficiary': {'reference': f"Patient/{self.member_id(index)}"},
+                'extension': [{'url': f"{BB}/variables/{name}",
+                               'valueCoding': {'code': code, 'system': f"{BB}/variables/{name}"}}
+                              for name, code in variables]}
+
+    def write_bulk_export(self, directory: str, files_per_type: int = 2,
+                          as_of: Optional[date] = None) -> Dict[str, List[str]]:
+        """
+        Write the population as a Bulk Data $export: ExplanationOfBenefit, Patient and
+        Coverage NDJSON files, each resource type split over files_per_type files,
+        and a manifest.json listing them.
+
+        Args:
+            directory: Existing directory
+            files_per_type: Number of files per resource type
+            as_of: Date on which the Patient ages are the member ages (default:
+                February 1 of year)
+
+        Returns:
+            File paths per resource type
+        """
+        as_of = as_of or date(self.year, 2, 1)
+        resources = {'ExplanationOfBenefit': self.iter_eobs(),
+                     'Patient': (self.render_patient(i, as_of) for i in range(self.n_members)),
+                     'Coverage': (self.render_coverage(i) for i in range(self.n_members))}
+        files: Dict[str, List[str]] = {}
+        for resource_type, iterator in resources.items():
+            paths = files[resource_type] = [os.path.join(directory, f"{resource_type}_{n + 1}.ndjson")
+                                            for n in range(files_per_type)]
+            outputs = [open(path, 'w', encoding='utf-8') for path in paths]
+            try:
+                for n, resource in enumerate(iterator):
+                    f = outputs[n % files_per_type]
+                    f.write(json.dumps(resource, separators=(',', ':')))
+                    f.write('\n')
+            finally:
+                for f in outputs:
+                    f.close()
+
+        manifest = {'transactionTime': f"{self.year}-01-01T00:00:00Z", 'requiresAccessToken': True,
+                    'request': f"https://example.org/fhir/Group/synthetic-{self.seed}/$export",
+                    'output': [{'type': resource_type, 'url': f"https://example.org/files/{os.path.basename(path)}"}
+                               for resource_type, paths in files.items() for path in paths],
+                    'error': []}
+        with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        return files
+
+    # X12 837 rendering
+
+    def render_837_claim(self, claim: Dict[str, Any], control_number: int) -> List[str]:
+        """Render a format-neutral claim as the segments of one ST/SE transaction."""
+        institutional = claim['institutional']
+        version = "005010X223A2" if institutional else "005010X222A1"
+        st = f"{control_number:09d}"
+        segments = [
+            f"ST*837*{st}*{version}",
+            f"BHT*0019*00*{claim['claim_id']}*{self.year}0101*1200*CH",
+            "NM1*41*2*SYNTHETIC CLEARINGHOUSE*****46*987654321",
+            "NM1*40*2*SYNTHETIC PAYER*****46*123456789",
+            "HL*1**20*1",
+            f"NM1*85*2*SYNTHETIC BILLING PROVIDER*****XX*{claim['npi']}",
+            "N3*123 MAIN ST",
+            "N4*ANYTOWN*WA*98000",
+            "HL*2*1*22*0",
+            "SBR*P*18*******MB",
+            f"NM1*IL*1*MEMBER*SYNTHETIC****MI*{claim['patient_id']}",
+        ]
+        charge = sum(line[2] for line in claim['lines'])
+        if institutional:
+            segments.append(f"CLM*{claim['claim_id']}*{charge}***{claim['tob']}:A:1**A*Y*Y")
+            segments.append(f"DTP*434*RD8*{claim['from_date']:%Y%m%d}-{claim['to_date']:%Y%m%d}")
+            segments.extend(f"HI*{'ABK' if seq == 0 else 'ABF'}:{dx}"
+                            for seq, dx in enumerate(claim['diagnosis_codes']))
+        else:
+            segments.append(f"CLM*{claim['claim_id']}*{charge}***11:B:1*Y*A*Y*Y")
+            if claim['diagnosis_codes']:
+                segments.append("HI*" + "*".join(f"{'ABK' if seq == 0 else 'ABF'}:{dx}"
+                                                 for seq, dx in enumerate(claim['diagnosis_codes'][:12])))
+            segments.append(f"NM1*82*1*PROVIDER*SYNTHETIC****XX*{claim['npi']}")
+            segments.append(f"PRV*PE*PXC*{claim['specialty']}")
+        n_dx = min(len(claim['diagnosis_codes']), 4)
+        for lx, (procedure_code, service_date, line_charge) in enumerate(claim['lines'], 1):
+            segments.append(f"LX*{lx}")
+            if institutional:
+                segments.append(f"SV2*0450*HC:{procedure_code}*{line_charge}*UN*1")
+            else:
+                pointers = ":".join(str(p) for p in range(1, n_dx + 1))
+                segments.append(f"SV1*HC:{procedure_code}*{line_charge}*UN*1*11**{pointers}")
+            segments.append(f"DTP*472*D8*{service_date:%Y%m%d}")
+        segments.append(f"SE*{len(segments) + 1}*{st}")
+        return segments
+
+    def iter_837(self,
+                 claim_type: Literal["837P", "837I"] = "837P",
+                 claims: Optional[Iterable[Dict[str, Any]]] = None) -> Iterator[str]:
+        """
+        Yield the segments of an 837P or 837I interchange holding the matching claims.
+
+        Args:
+            claim_type: "837P" for the professional claims, "837I" for the institutional ones
+            claims: Optional format-neutral claims to render, e.g. member_claims(i).
+                Default is the claims of all members.
+        """
+        institutional = claim_type == "837I"
+        version = "005010X223A2" if institutional else "005010X222A1"
+        yield (f"ISA*00*          *00*          *ZZ*SYNTHETIC      *ZZ*RECEIVER       "
+               f"*{self.year % 100:02d}0101*1200*^*00501*{self.seed % 10**9:09d}*0*P*:")
+        yield f"GS*HC*SYNTHETIC*RECEIVER*{self.year}0101*1200*1*X*{version}"
+        count = 0
+        for claim in (self.iter_claims() if claims is None else claims):
+            if claim['institutional'] == institutional:
+                count += 1
+                yield from self.render_837_claim(claim, count)
+        yield f"GE*{count}*1"
+        yield f"IEA*1*{self.seed % 10**9:09d}"
+
+    def x12_837(self,
+                claim_type: Literal["837P", "837I"] = "837P",
+                claims: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+        """Return an 837P (professional claims) or 837I (institutional claims) interchange."""
+        return "~\n".join(self.iter_837(claim_type, claims)) + "~\n"
+
+    def write_837(self, path: str, claim_type: Literal["837P", "837I"] = "837P") -> int:
+        """Write an 837P or 837I file and return the number of segments written."""
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for segment in self.iter_837(claim_type):
+                f.write(segment)
+                f.write("~\n")
+                count += 1
+        return count
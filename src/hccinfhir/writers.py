@@ -0,0 +1,367 @@
+"""
+Streaming writers for scoring results.
+
+A TableWriter writes one table (CSV, NDJSON or Parquet) incrementally: rows are
+buffered and written in bulk every buffer_rows rows, so only one buffer is ever in
+memory, whatever the size of the run. Columnar batches (dicts of columns, pandas
+DataFrames, pyarrow Tables or RecordBatches) can be written as they are; the
+Parquet writer hands pyarrow data to the file without converting it.
+
+ResultSink writes the results of members to up to three tables: one row per member
+and model, one row per HCC, and the filtered service lines. CSV and NDJSON need no
+extra dependency; Parquet requires pyarrow.
+"""
+
+import csv
+import json
+from typing import Any, Iterable, Iterator, List, Literal, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+from hccinfhir.datamodels import RAFResult, MultiModelRAFResult, ServiceLevelData
+
+OutputFormat = Literal["csv", "ndjson", "parquet"]
+ColumnType = Literal["string", "float", "int", "list"]
+Schema = Sequence[Tuple[str, ColumnType]]
+
+RESULT_SCHEMA: Schema = [
+    ('member_id', 'string'),
+    ('model_name', 'string'),
+    ('risk_score', 'float'),
+    ('risk_score_demographics', 'float'),
+    ('risk_score_chronic_only', 'float'),
+    ('risk_score_hcc', 'float'),
+    ('hcc_list', 'list'),
+    ('error', 'string'),
+]
+
+HCC_DETAIL_SCHEMA: Schema = [
+    ('member_id', 'string'),
+    ('model_name', 'string'),
+    ('hcc', 'string'),
+    ('coefficient', 'float'),
+    ('diagnosis_codes', 'list'),
+]
+
+SERVICE_LINE_SCHEMA: Schema = [('member_id', 'string')] + [
+    (name, 'list' if name in ('linked_diagnosis_codes', 'claim_diagnosis_codes', 'modifiers')
+     else 'float' if name in ('quantity', 'allowed_amount') else 'string')
+    for name in ServiceLevelData.model_fields
+]
+
+RESULT_COLUMNS = [name for name, _ in RESULT_SCHEMA]
+HCC_DETAIL_COLUMNS = [name for name, _ in HCC_DETAIL_SCHEMA]
+SERVICE_LINE_COLUMNS = [name for name, _ in SERVICE_LINE_SCHEMA]
+
+Result = Union[RAFResult, MultiModelRAFResult]
+
+
+def _model_results(result: Result) -> Iterable[RAFResult]:
+    return result.results.values() if isinstance(result, MultiModelRAFResult) else (result,)
+
+
+def result_rows(member_id: str, result: Optional[Result],
+                error: Optional[str] = None) -> Iterator[Tuple[Any, ...]]:
+    """Rows of RESULT_SCHEMA for the result of a member: one per model, or one if it failed."""
+    if result is None:
+        yield (member_id, None, None, None, None, None, [], error)
+        return
+    for r in _model_results(result):
+        yield (member_id, r.model_name, r.risk_score, r.risk_score_demographics,
+               r.risk_score_chronic_only, r.risk_score_hcc, r.hcc_list, error)
+
+
+def hcc_detail_rows(member_id: str, result: Result) -> Iterator[Tuple[Any, ...]]:
+    """Rows of HCC_DETAIL_SCHEMA: one per model and HCC, with its coefficient and diagnoses."""
+    for r in _model_results(result):
+        for hcc in r.hcc_list:
+            yield (member_id, r.model_name, hcc, r.coefficients.get(hcc),
+                   sorted(r.cc_to_dx.get(hcc, ())))
+
+
+class MemberRows(NamedTuple):
+    """Output rows of the result of a member, see member_rows."""
+    member_id: str
+    results: List[Tuple[Any, ...]]
+    hcc_details: List[Tuple[Any, ...]]
+    error: Optional[str]
+
+
+def member_rows(member: Tuple[str, Optional[Result], Optional[str]], hcc_details: bool = False) -> MemberRows:
+    """
+    The rows of RESULT_SCHEMA, and of HCC_DETAIL_SCHEMA if hcc_details, of a
+    (member_id, result, error) result, for ResultSink.write_rows. Much smaller than
+    the result to send between processes (see score_partitions).
+    """
+    member_id, result, error = member
+    return MemberRows(member_id, list(result_rows(member_id, result, error)),
+                      list(hcc_detail_rows(member_id, result)) if hcc_details and result is not None else [],
+                      error)
+
+
+def service_line_rows(member_id: Optional[str],
+                      service_level_data: Iterable[ServiceLevelData]) -> Iterator[Tuple[Any, ...]]:
+    """Rows of SERVICE_LINE_SCHEMA; member_id defaults to the patient id of each line."""
+    fields = SERVICE_LINE_COLUMNS[1:]
+    for sld in service_level_data:
+        yield (member_id or sld.patient_id,) + tuple(getattr(sld, name) for name in fields)
+
+
+class TableWriter:
+    """
+    Base class of the table writers.
+
+    Rows are tuples in schema order (write_values) or mappings (write_row); they are
+    buffered and written in bulk. Use as a context manager or call close().
+    """
+
+    default_buffer_rows = 8192
+
+    def __init__(self, path: str, schema: Schema, buffer_rows: Optional[int] = None):
+        self.path = path
+        self.schema = list(schema)
+        self.columns = [name for name, _ in self.schema]
+        self.buffer_rows = buffer_rows or self.default_buffer_rows
+        self.rows_written = 0
+        self._buffer: List[Sequence[Any]] = []
+
+    def write_values(self, values: Sequence[Any]) -> None:
+        self._buffer.append(values)
+        self.rows_written += 1
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def write_many(self, rows: Iterable[Sequence[Any]]) -> None:
+        for values in rows:
+            self.write_values(values)
+
+    def write_row(self, row: Mapping[str, Any]) -> None:
+        self.write_values(tuple(row.get(name) for name in self.columns))
+
+    def write_columns(self, batch: Any) -> None:
+        """
+        Write a columnar batch: a mapping of column name to equal-length sequences, a
+        pandas DataFrame, or a pyarrow Table or RecordBatch. Missing columns are null.
+        """
+        self.flush()
+        self.rows_written += self._write_columns(batch)
+
+    def _write_columns(self, batch: Any) -> int:
+        columns = _column_lists(batch, self.columns)
+        rows = list(zip(*columns))
+        if rows:
+            self._write_rows(rows)
+        return len(rows)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+
+    def _write_rows(self, rows: List[Sequence[Any]]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> 'TableWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _column_lists(batch: Any, columns: Sequence[str]) -> List[Sequence[Any]]:
+    """The columns of a batch as Python sequences, in the given order."""
+    if hasattr(batch, 'to_pydict'):  # pyarrow Table or RecordBatch
+        n_rows = batch.num_rows
+        batch = batch.select([name for name in columns if name in batch.schema.names]).to_pydict()
+    elif hasattr(batch, 'iloc'):  # pandas DataFrame
+        n_rows = len(batch)
+        batch = {name: batch[name].tolist() for name in columns if name in batch.columns}
+    else:
+        n_rows = len(next(iter(batch.values()))) if batch else 0
+    return [batch[name] if name in batch else [None] * n_rows for name in columns]
+
+
+class CSVTableWriter(TableWriter):
+    """CSV with a header row; list columns are joined with ';'."""
+
+    def __init__(self, path: str, schema: Schema, buffer_rows: Optional[int] = None):
+        super().__init__(path, schema, buffer_rows)
+        self._file = open(path, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+        self._list_columns = [i for i, (_, column_type) in enumerate(self.schema) if column_type == 'list']
+
+    def _write_rows(self, rows: List[Sequence[Any]]) -> None:
+        if self._list_columns:
+            rows = [self._join_lists(values) for values in rows]
+        self._writer.writerows(rows)
+
+    def _join_lists(self, values: Sequence[Any]) -> List[Any]:
+        values = list(values)
+        for i in self._list_columns:
+            if values[i] is not None:
+                values[i] = ';'.join(values[i])
+        return values
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class NDJSONTableWriter(TableWriter):
+    """One JSON object per line."""
+
+    def __init__(self, path: str, schema: Schema, buffer_rows: Optional[int] = None):
+        super().__init__(path, schema, buffer_rows)
+        self._file = open(path, 'w', encoding='utf-8', buffering=1 << 20)
+
+    def _write_rows(self, rows: List[Sequence[Any]]) -> None:
+        columns = self.columns
+        self._file.write(''.join([json.dumps(dict(zip(columns, values))) + '\n' for values in rows]))
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class ParquetTableWriter(TableWriter):
+    """
+    Parquet file with one row group per buffer_rows buffered rows; requires pyarrow.
+
+    pyarrow Tables and RecordBatches given to write_columns are written without
+    conversion when their column types match the schema, and pandas DataFrames
+    through pyarrow's own conversion, which does not copy numeric columns.
+    """
+
+    default_buffer_rows = 65536
+
+    def __init__(self, path: str, schema: Schema, buffer_rows: Optional[int] = None):
+        super().__init__(path, schema, buffer_rows)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self._pa = pa
+        types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'list': pa.list_(pa.string())}
+        self.arrow_schema = pa.schema([(name, types[column_type]) for name, column_type in self.schema])
+        self._writer = pq.ParquetWriter(path, self.arrow_schema)
+
+    def _write_rows(self, rows: List[Sequence[Any]]) -> None:
+        pa = self._pa
+        columns = list(zip(*rows))
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, self.arrow_schema)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.arrow_schema))
+
+    def _write_columns(self, batch: Any) -> int:
+        pa = self._pa
+        if isinstance(batch, pa.RecordBatch):
+            batch = pa.Table.from_batches([batch])
+        if isinstance(batch, pa.Table):
+            table = batch
+        elif hasattr(batch, 'iloc'):
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+        else:
+            table = pa.table(dict(batch))
+        n_rows = table.num_rows
+        arrays = [table.column(field.name) if field.name in table.column_names
+                  else pa.nulls(n_rows, type=field.type) for field in self.arrow_schema]
+        table = pa.Table.from_arrays(arrays, names=self.columns)
+        if table.schema != self.arrow_schema:
+            table = table.cast(self.arrow_schema)
+        self._writer.write_table(table)
+        return n_rows
+
+    def close(self) -> None:
+        super().close()
+        self._writer.close()
+
+
+WRITERS = {'csv': CSVTableWriter, 'ndjson': NDJSONTableWriter, 'parquet': ParquetTableWriter}
+
+
+def infer_output_format(path: str) -> OutputFormat:
+    """Output format from the file extension: .csv, .ndjson/.jsonl or .parquet."""
+    name = path.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    raise ValueError(f"Cannot infer the output format of {path}; pass csv, ndjson or parquet")
+
+
+def open_table_writer(path: str, schema: Schema, output_format: Optional[OutputFormat] = None,
+                      buffer_rows: Optional[int] = None) -> TableWriter:
+    """Open a TableWriter for path, inferring the format from its extension by default."""
+    output_format = output_format or infer_output_format(path)
+    if output_format not in WRITERS:
+        raise ValueError(f"output_format must be one of {sorted(WRITERS)}, got {output_format}")
+    return WRITERS[output_format](path, schema, buffer_rows)
+
+
+class ResultSink:
+    """
+    Streams member results to files as they are produced.
+
+    Args:
+        results: Path of the member results, one row per member and model
+        hcc_details: Optional path of the HCC details, one row per member, model and HCC
+        service_lines: Optional path of the service lines kept by the filter; the
+            results need their service level data (include_service_data=True)
+        output_format: Format of every file; inferred from each extension by default
+        buffer_rows: Rows buffered per file between bulk writes
+
+    Example:
+        >>> with ResultSink("scores.parquet", hcc_details="hccs.parquet") as sink:
+        ...     for member_id, result, error in score_population(members, ordered=False):
+        ...         sink.write(member_id, result, error)
+    """
+
+    def __init__(self,
+                 results: str,
+                 hcc_details: Optional[str] = None,
+                 service_lines: Optional[str] = None,
+                 output_format: Optional[OutputFormat] = None,
+                 buffer_rows: Optional[int] = None):
+        self.results: Optional[TableWriter] = None
+        self.hcc_details: Optional[TableWriter] = None
+        self.service_lines: Optional[TableWriter] = None
+        try:
+            self.results = open_table_writer(results, RESULT_SCHEMA, output_format, buffer_rows)
+            if hcc_details:
+                self.hcc_details = open_table_writer(hcc_details, HCC_DETAIL_SCHEMA, output_format, buffer_rows)
+            if service_lines:
+                self.service_lines = open_table_writer(service_lines, SERVICE_LINE_SCHEMA, output_format,
+                                                       buffer_rows)
+        except BaseException:
+            self.close()
+            raise
+
+    def write(self, member_id: str, result: Optional[Result], error: Optional[str] = None) -> None:
+        """Write the result of a member, or its error if result is None."""
+        self.results.write_many(result_rows(member_id, result, error))
+        if result is None:
+            return
+        if self.hcc_details is not None:
+            self.hcc_details.write_many(hcc_detail_rows(member_id, result))
+        if self.service_lines is not None and result.service_level_data:
+            self.service_lines.write_many(service_line_rows(member_id, result.service_level_data))
+
+    def write_rows(self, rows: MemberRows) -> None:
+        """Write the rows of a member built by member_rows."""
+        self.results.write_many(rows.results)
+        if self.hcc_details is not None:
+            self.hcc_details.write_many(rows.hcc_details)
+
+    def close(self) -> None:
+        for writer in (self.results, self.hcc_details, self.service_lines):
+            if writer is not None:
+                writer.close()
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
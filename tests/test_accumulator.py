@@ -0,0 +1,65 @@
+import pickle
+from functools import reduce
+import pytest
+from hccinfhir.accumulator import MemberAccumulator
+from hccinfhir.datamodels import ServiceLevelData
+from hccinfhir.filter import compile_filter
+from hccinfhir.model_calculate import calculate_raf
+
+DEMOGRAPHICS = {"age": 72, "sex": "M", "dual_elgbl_cd": "00"}
+
+def make_sld(claim_id, dx_codes, procedure_code="99213"):
+    return ServiceLevelData(claim_id=claim_id, procedure_code=procedure_code,
+                            claim_diagnosis_codes=dx_codes)
+
+def test_incremental_delta():
+    acc = MemberAccumulator(DEMOGRAPHICS, "CMS-HCC Model V28")
+    base = acc.risk_score
+    assert base == calculate_raf([], "CMS-HCC Model V28", age=72, sex='M', dual_elgbl_cd='00', orec='', crec='').risk_score
+
+    delta = acc.add([make_sld("1", ["E11.9"])])
+    assert delta > 0
+    assert acc.risk_score == pytest.approx(base + delta)
+
+    # Same diagnosis again: nothing changes
+    assert acc.add([make_sld("2", ["E119"])]) == 0.0
+    # Unmapped code: nothing changes, but it is tracked
+    assert acc.add([make_sld("3", ["Z0000"])]) == 0.0
+    assert "Z0000" in acc.result().diagnosis_codes
+
+    acc.add([make_sld("4", ["I509", "J449"])])
+    expected = calculate_raf(["E119", "I509", "J449", "Z0000"], "CMS-HCC Model V28",
+                             age=72, sex='M', dual_elgbl_cd='00', orec='', crec='')
+    assert acc.risk_score == pytest.approx(expected.risk_score)
+    assert acc.hcc_set == set(expected.hcc_list)
+    assert acc.result().cc_to_dx == expected.cc_to_dx
+    assert acc.sld_count == 4
+
+def test_merge_map_reduce():
+    shards = [["E119"], ["I509"], ["J449", "E119"]]
+    accs = []
+    for i, dx_codes in enumerate(shards):
+        acc = MemberAccumulator(DEMOGRAPHICS, "CMS-HCC Model V24", member_id="M1")
+        acc.add([make_sld(str(i), dx_codes)])
+        accs.append(pickle.loads(pickle.dumps(acc)))
+
+    merged = reduce(lambda a, b: a.merge(b), accs)
+    single = MemberAccumulator(DEMOGRAPHICS, "CMS-HCC Model V24")
+    single.add([make_sld(str(i), dx) for i, dx in enumerate(shards)])
+
+    assert merged.risk_score == pytest.approx(single.risk_score)
+    assert merged.result().cc_to_dx == single.result().cc_to_dx
+    assert merged.sld_count == 3
+
+    with pytest.raises(ValueError):
+        merged.merge(MemberAccumulator(DEMOGRAPHICS, "CMS-HCC Model V28"))
+    with pytest.raises(ValueError):
+        merged.merge(MemberAccumulator(DEMOGRAPHICS, "CMS-HCC Model V24", member_id="M2"))
+    with pytest.raises(ValueError):
+        merged.merge(MemberAccumulator({"age": 50, "sex": "F"}, "CMS-HCC Model V24"))
+
+def test_claim_filter():
+    acc = MemberAccumulator(DEMOGRAPHICS, claim_filter=compile_filter(professional_cpt={"99213"}))
+    assert acc.add([make_sld("1", ["E119"], procedure_code="0398T")]) == 0.0
+    assert acc.sld_count == 0
+    assert acc.add([make_sld("2", ["E119"])]) > 0
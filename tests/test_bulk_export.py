@@ -0,0 +1,119 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+from datetime import date
+import pytest
+from hccinfhir import HCCInFHIR
+from hccinfhir.bulk_export import (age_on, coverage_demographics, patient_demographics, read_coverage,
+                                   read_export, read_export_demographics)
+from hccinfhir.cli import main
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+EXPORT_FIELDS = ('age', 'sex', 'dual_elgbl_cd', 'orec', 'crec')
+
+
+@pytest.fixture(scope="module")
+def export(tmp_path_factory):
+    """A synthetic $export with its manifest, and the expected score of each member."""
+    root = tmp_path_factory.mktemp("export")
+    generator = SyntheticClaimsGenerator(seed=21, n_members=25)
+    files = generator.write_bulk_export(str(root), files_per_type=3)
+
+    processor = HCCInFHIR()
+    expected = {}
+    for i, (member_id, demographics) in enumerate(generator.demographics().items()):
+        member_eobs = [generator.render_eob(claim) for claim in generator.member_claims(i)]
+        expected[member_id] = processor.run(member_eobs, {k: demographics[k] for k in EXPORT_FIELDS}).risk_score
+    return root, files, generator, expected
+
+
+def test_read_export(export, tmp_path):
+    root, files, _, _ = export
+    assert read_export(str(root)) == read_export(str(root / "manifest.json")) == files
+
+    # Without a manifest, files are classified by their content whatever their names
+    for n, path in enumerate(files["ExplanationOfBenefit"] + files["Patient"]):
+        data = open(path, "rb").read()
+        if n % 2:
+            (tmp_path / f"part-{n}.ndjson.gz").write_bytes(gzip.compress(data))
+        else:
+            (tmp_path / f"part-{n}.ndjson").write_bytes(data)
+    (tmp_path / "empty.ndjson").write_text("")
+    found = read_export(str(tmp_path))
+    assert sorted(found) == ["ExplanationOfBenefit", "Patient"]
+    assert len(found["ExplanationOfBenefit"]) == 3 and len(found["Patient"]) == 3
+
+
+def test_read_export_missing_file(export, tmp_path):
+    root, files, _, _ = export
+    shutil.copy(root / "manifest.json", tmp_path / "manifest.json")
+    shutil.copy(files["Patient"][0], tmp_path)
+    with pytest.raises(ValueError, match="not in"):
+        read_export(str(tmp_path))
+
+
+def test_export_demographics(export):
+    _, files, generator, _ = export
+    coverage = read_coverage(files["Coverage"])
+    as_of = date(generator.year, 2, 1)
+    demographics = dict(read_export_demographics(files["Patient"], as_of, coverage))
+
+    assert demographics == {member_id: {k: values[k] for k in EXPORT_FIELDS}
+                            for member_id, values in generator.demographics().items()}
+
+
+def test_demographics_fields():
+    assert age_on("1950-02-02", date(2026, 2, 1)) == 75
+    assert age_on("1950-02-01", date(2026, 2, 1)) == 76
+    assert age_on("1950", date(2026, 2, 1)) == 76
+
+    bb = "https://bluebutton.cms.gov/resources/variables/"
+    coverage = {"extension": [{"url": bb + "dual_03", "valueCoding": {"code": "02"}},
+                              {"url": bb + "dual_11", "valueCoding": {"code": "08"}},
+                              {"url": bb + "dual_12", "valueCoding": {"code": "**"}},
+                              {"url": bb + "orec", "valueCoding": {"code": "1"}},
+                              {"url": "http://example.org/crec", "valueCoding": {"code": "1"}}]}
+    assert coverage_demographics(coverage) == {"dual_elgbl_cd": "08", "orec": "1"}
+    assert patient_demographics({"gender": "unknown"}, date(2026, 2, 1), {"orec": "0"}) == {"orec": "0"}
+
+
+@pytest.mark.parametrize("options", [["-w", "1"], ["-w", "2", "--eobs-per-task", "9"],
+                                     ["-w", "1", "--max-memory", "0.001"]])
+def test_score_export(export, options, tmp_path):
+    root, _, _, expected = export
+    output = tmp_path / "scores.ndjson"
+
+    status = main(["score-export", str(root), "-o", str(output), "--tmp-dir", str(tmp_path), "-q"] + options)
+
+    assert status == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert {row["member_id"]: row["risk_score"] for row in rows if row["error"] is None} == pytest.approx(expected)
+    assert os.listdir(tmp_path) == ["scores.ndjson"]
+
+
+def test_score_export_with_demographics_file(export, tmp_path):
+    root, _, generator, expected = export
+    member_ids = sorted(expected)[:5]
+    with open(tmp_path / "members.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("member_id",) + EXPORT_FIELDS)
+        for member_id in member_ids:
+            writer.writerow([member_id] + [generator.demographics()[member_id][k] for k in EXPORT_FIELDS])
+
+    status = main(["score-export", str(root / "manifest.json"), "-d", str(tmp_path / "members.csv"),
+                   "-o", str(tmp_path / "scores.csv"), "-w", "1", "-q"])
+
+    assert status == 0
+    with open(tmp_path / "scores.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    scores = {row["member_id"]: float(row["risk_score"]) for row in rows if not row["error"]}
+    assert scores == pytest.approx({member_id: expected[member_id] for member_id in member_ids})
+
+
+def test_score_export_without_eobs(tmp_path, capsys):
+    (tmp_path / "Patient.ndjson").write_text('{"resourceType": "Patient", "id": "1"}\n')
+
+    assert main(["score-export", str(tmp_path), "-o", str(tmp_path / "out.csv")]) == 1
+    assert "no ExplanationOfBenefit files" in capsys.readouterr().err
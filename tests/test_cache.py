@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import pytest
+from hccinfhir import Metrics, preload
+from hccinfhir import database
+from hccinfhir.cache import load_once
+from hccinfhir.filter import get_eligible_cpt_hcpcs
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.model_compiled import compile_model
+
+
+def test_load_once_cache_clear():
+    calls = []
+
+    @load_once
+    def load(key, scale=1):
+        calls.append(key)
+        return key * scale
+
+    assert load(2) == load(2) == 2
+    assert load(2, scale=3) == 6
+    assert calls == [2, 2]
+    load.cache_clear()
+    load(2)
+    assert calls == [2, 2, 2]
+
+
+def test_preload_fills_caches_and_closes_connections():
+    compile_model.cache_clear()
+    get_eligible_cpt_hcpcs.cache_clear()
+
+    preload(models=["CMS-HCC Model V28", "RxHCC Model V08"], years=[2026])
+    assert database._engine is None
+
+    metrics = Metrics()
+    calculate_raf(["E119"], "CMS-HCC Model V28", metrics=metrics)
+    with metrics.activate():
+        get_eligible_cpt_hcpcs(2026)
+    assert metrics.snapshot()['counters'].get('db_loads', 0) == 0
+
+
+def _child_state(_):
+    metrics = Metrics()
+    with metrics.activate():
+        compile_model("CMS-HCC Model V28")
+        get_eligible_cpt_hcpcs(2026)
+    preloaded_loads = metrics.snapshot()['counters'].get('db_loads', 0)
+    engine_inherited = database._engine is not None
+    # The child opens its own connections for what was not preloaded
+    score = calculate_raf(["E119"], "CMS-HCC Model V24", age=70, sex="F").risk_score
+    return preloaded_loads, engine_inherited, score
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_forked_children_reuse_preloaded_tables():
+    preload(models=["CMS-HCC Model V28"], years=[2026])
+    database.get_db_session().close()  # an engine exists in the parent at fork time
+    assert database._engine is not None
+
+    with multiprocessing.get_context("fork").Pool(2) as pool:
+        results = pool.map(_child_state, range(2))
+
+    expected = calculate_raf(["E119"], "CMS-HCC Model V24", age=70, sex="F").risk_score
+    assert results == [(0, False, expected)] * 2
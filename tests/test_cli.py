@@ -0,0 +1,115 @@
+import csv
+import gzip
+import json
+import pytest
+from hccinfhir import HCCInFHIR
+from hccinfhir.cli import main
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+
+@pytest.fixture(scope="module")
+def batch(tmp_path_factory):
+    """EOB NDJSON files, one of them gzipped, in a directory tree and a demographics CSV."""
+    root = tmp_path_factory.mktemp("batch")
+    generator = SyntheticClaimsGenerator(seed=11, n_members=30)
+    eobs = generator.eob_list()
+    (root / "eobs" / "2025").mkdir(parents=True)
+    (root / "eobs" / "a.ndjson").write_text("".join(json.dumps(eob) + "\n" for eob in eobs[0::2]))
+    (root / "eobs" / "2025" / "b.ndjson.gz").write_bytes(
+        gzip.compress("".join(json.dumps(eob) + "\n" for eob in eobs[1::2]).encode()))
+
+    demographics = generator.demographics()
+    member_ids = list(demographics)
+    columns = list(demographics[member_ids[0]])
+    with open(root / "members.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["member_id"] + columns)
+        for member_id in member_ids[:-2]:  # the last two members have claims but no demographics
+            writer.writerow([member_id] + [demographics[member_id][c] for c in columns])
+
+    processor = HCCInFHIR()
+    expected = {}
+    for i, member_id in enumerate(member_ids[:-2]):
+        member_eobs = [generator.render_eob(claim) for claim in generator.member_claims(i)]
+        expected[member_id] = processor.run(member_eobs, demographics[member_id]).risk_score
+    return root, expected, member_ids[-2:]
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_score_matches_run(batch, workers, tmp_path):
+    root, expected, unmatched = batch
+    output = tmp_path / "scores.csv"
+
+    status = main(["score", str(root / "eobs" / "**" / "*.ndjson*"), "-d", str(root / "members.csv"),
+                   "-o", str(output), "--workers", workers, "--eobs-per-task", "7", "--threaded-decompression", "-q"])
+
+    assert status == 0
+    rows = read_rows(output)
+    scores = {row["member_id"]: float(row["risk_score"]) for row in rows if not row["error"]}
+    assert scores == pytest.approx(expected)
+    assert sorted(row["member_id"] for row in rows if row["error"]) == sorted(unmatched)
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_spill_to_disk_gives_same_scores(batch, workers, tmp_path):
+    root, expected, unmatched = batch
+    output = tmp_path / "scores.ndjson"
+
+    status = main(["score", str(root / "eobs"), "-d", str(root / "members.csv"), "-o", str(output),
+                   "--workers", workers, "--max-memory", "0.001", "--partitions", "5", "--tmp-dir", str(tmp_path),
+                   "--hcc-details", str(tmp_path / "hccs.ndjson"), "-q"])
+
+    assert status == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert {row["member_id"]: row["risk_score"] for row in rows if row["error"] is None} == pytest.approx(expected)
+    assert sorted(row["member_id"] for row in rows if row["error"]) == sorted(unmatched)
+    hccs = [json.loads(line) for line in (tmp_path / "hccs.ndjson").read_text().splitlines()]
+    assert len(hccs) == sum(len(row["hcc_list"]) for row in rows)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["hccs.ndjson", "scores.ndjson"]  # spill files removed
+
+
+def test_837_and_several_models(tmp_path, capsys):
+    generator = SyntheticClaimsGenerator(seed=12, n_members=10)
+    generator.write_837(str(tmp_path / "claims.txt"))
+    with open(tmp_path / "members.ndjson", "w") as f:
+        for member_id, demographics in generator.demographics().items():
+            f.write(json.dumps({"member_id": member_id, **demographics}) + "\n")
+    models = ["CMS-HCC Model V28", "CMS-HCC Model V24"]
+
+    status = main(["score", str(tmp_path / "claims.txt"), "-d", str(tmp_path / "members.ndjson"),
+                   "-o", str(tmp_path / "scores.csv"), "-m", models[0], "-m", models[1], "-w", "1",
+                   "--hcc-details", str(tmp_path / "hccs.csv"), "--service-lines", str(tmp_path / "slds.csv")])
+
+    assert status == 0
+    rows = read_rows(tmp_path / "scores.csv")
+    assert len(rows) == 20
+    assert {row["model_name"] for row in rows} == set(models)
+    hccs = read_rows(tmp_path / "hccs.csv")
+    assert len(hccs) == sum(len(row["hcc_list"].split(";")) for row in rows if row["hcc_list"])
+    slds = read_rows(tmp_path / "slds.csv")
+    assert slds and all(row["member_id"] == row["patient_id"] for row in slds)
+    assert "10 members scored" in capsys.readouterr().err
+
+
+def test_no_inputs(tmp_path, capsys):
+    status = main(["score", str(tmp_path / "*.ndjson"), "-d", "members.csv", "-o", str(tmp_path / "out.csv")])
+
+    assert status == 1
+    assert "no input files" in capsys.readouterr().err
+
+
+def test_parquet_output(batch, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    root, expected, _ = batch
+
+    status = main(["score", str(root / "eobs"), "-d", str(root / "members.csv"),
+                   "-o", str(tmp_path / "scores.parquet"), "-w", "1", "-q"])
+
+    assert status == 0
+    table = pq.read_table(tmp_path / "scores.parquet")
+    assert table.num_rows == len(expected) + 2
@@ -0,0 +1,94 @@
+import math
+import random
+import pytest
+from hccinfhir import score_dataframe
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.model_compiled import compile_model
+
+pd = pytest.importorskip("pandas")
+
+MODELS = ["CMS-HCC Model V28", "CMS-HCC Model V24", "CMS-HCC ESRD Model V24"]
+
+
+@pytest.fixture(scope="module")
+def tables():
+    rng = random.Random(5)
+    codes = sorted(dx for dx, _ in compile_model("CMS-HCC Model V28").dx_to_cc_mapping)
+    codes = rng.sample(codes, 60) + ["Z0000", "NOTACODE"]
+    members = pd.DataFrame({
+        "member_id": [f"m{i}" for i in range(300)],
+        "age": [rng.randint(40, 95) for _ in range(300)],
+        "sex": [rng.choice("MF") for _ in range(300)],
+        "dual_elgbl_cd": [rng.choice(["NA", "02", "08", None]) for _ in range(300)],
+        "orec": [rng.choice([0, 1, None]) for _ in range(300)],
+    })
+    rows = [(f"m{i}", rng.choice(codes)) for i in range(300) for _ in range(rng.randint(0, 6))]
+    rows += [("m0", "e11.9"), ("m0", "E11.9"), ("unknown", "E119")]
+    diagnoses = pd.DataFrame(rows, columns=["member_id", "diagnosis_code"])
+    return members, diagnoses
+
+
+def _expected(members, diagnoses, model_name):
+    codes = diagnoses.groupby("member_id")["diagnosis_code"].apply(list).to_dict()
+    expected = {}
+    for row in members.itertuples():
+        dual = row.dual_elgbl_cd if isinstance(row.dual_elgbl_cd, str) else "NA"
+        orec = "" if math.isnan(row.orec) else str(int(row.orec))
+        expected[row.member_id] = calculate_raf(codes.get(row.member_id, []), model_name, row.age, row.sex,
+                                                dual_elgbl_cd=dual, orec=orec, crec="")
+    return expected
+
+
+@pytest.mark.parametrize("model_name", MODELS)
+def test_matches_calculate_raf(tables, model_name):
+    members, diagnoses = tables
+    expected = _expected(members, diagnoses, model_name)
+
+    scores = score_dataframe(members, diagnoses, model_name=model_name)
+
+    assert isinstance(scores, pd.DataFrame)
+    assert list(scores["member_id"]) == list(members["member_id"])
+    assert scores["error"].isna().all()
+    hcc_columns = [column for column in scores.columns if column.startswith("HCC")]
+    for row in scores.to_dict("records"):
+        result = expected[row["member_id"]]
+        for name in ("risk_score", "risk_score_demographics", "risk_score_chronic_only", "risk_score_hcc"):
+            assert row[name] == pytest.approx(getattr(result, name))
+        assert {column[3:] for column in hcc_columns if row[column]} == set(result.hcc_list)
+
+
+def test_invalid_demographics_and_dict_input():
+    members = {"member_id": [1, 2, 3], "age": [70, None, 80], "sex": ["F", "M", "X"]}
+    diagnoses = {"member_id": ["1", "1", "3"], "diagnosis_code": ["E119", "I509", "E119"]}
+
+    scores = score_dataframe(members, diagnoses, hcc_columns=False)
+
+    assert sorted(scores) == ["error", "member_id", "risk_score", "risk_score_chronic_only",
+                              "risk_score_demographics", "risk_score_hcc"]
+    assert scores["risk_score"][0] == pytest.approx(calculate_raf(["E119", "I509"], age=70, sex="F",
+                                                                  orec="", crec="").risk_score)
+    assert scores["error"][0] is None
+    assert "age" in scores["error"][1] and "sex" in scores["error"][2]
+    assert math.isnan(scores["risk_score"][1]) and math.isnan(scores["risk_score"][2])
+
+
+def test_empty_tables_and_errors():
+    members = pd.DataFrame({"member_id": [], "age": [], "sex": []})
+    diagnoses = pd.DataFrame({"member_id": [], "diagnosis_code": []})
+    assert len(score_dataframe(members, diagnoses)) == 0
+
+    with pytest.raises(ValueError, match="dx"):
+        score_dataframe({"member_id": ["a"], "age": [70], "sex": ["F"]}, diagnoses, diagnosis_column="dx")
+    with pytest.raises(ValueError, match="Duplicate"):
+        score_dataframe({"member_id": ["a", "a"], "age": [70, 71], "sex": ["F", "F"]}, diagnoses)
+
+
+def test_polars(tables):
+    pl = pytest.importorskip("polars")
+    members, diagnoses = tables
+
+    scores = score_dataframe(pl.from_pandas(members), pl.from_pandas(diagnoses))
+
+    assert isinstance(scores, pl.DataFrame)
+    assert scores["risk_score"].to_list() == pytest.approx(
+        score_dataframe(members, diagnoses)["risk_score"].tolist())
@@ -0,0 +1,52 @@
+import gc
+import json
+import pytest
+from hccinfhir.decoders import decode_lines, decoder_name, get_decoder
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.readers import read_claims
+from hccinfhir.samples import get_eob_sample_list
+
+
+@pytest.fixture(scope="module")
+def eob_lines():
+    return [json.dumps(eob).encode() for eob in get_eob_sample_list()]
+
+
+def test_get_decoder():
+    assert get_decoder("json") is json.loads
+    assert get_decoder(str.upper) is str.upper
+    assert decoder_name("json") == "json"
+    try:
+        import orjson
+    except ImportError:
+        assert get_decoder() is json.loads
+    else:
+        assert get_decoder() is orjson.loads
+        assert decoder_name() == "orjson"
+    with pytest.raises(ValueError):
+        get_decoder("yaml")
+
+
+@pytest.mark.parametrize("decoder", ["json", "auto"])
+def test_decoders_give_the_same_service_lines(eob_lines, decoder):
+    expected = extract_sld_list([json.loads(line) for line in eob_lines], "fhir")
+
+    decoded = decode_lines(eob_lines, decoder)
+
+    assert decoded == [json.loads(line) for line in eob_lines]
+    assert extract_sld_list(decoded, "fhir") == expected
+    assert gc.isenabled()
+
+
+def test_decode_error_restores_gc():
+    with pytest.raises(ValueError):
+        decode_lines([b'{"a": 1}', b'{not json'])
+    assert gc.isenabled()
+
+
+def test_read_claims_in_batches(eob_lines, tmp_path):
+    (tmp_path / "eobs.ndjson").write_bytes(b"\n".join(eob_lines) + b"\n")
+
+    eobs = list(read_claims(str(tmp_path / "eobs.ndjson"), decoder="json", batch_size=7))
+
+    assert eobs == [json.loads(line) for line in eob_lines]
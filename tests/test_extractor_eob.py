@@ -99,3 +99,77 @@ def test_extract_sld_list_mixed_validity():
     sld_list = extract_sld_list(data)
     assert len(sld_list) == 3  # Should only include valid entries
 
+
+def test_extract_sld_from_json_lines_matches_dicts():
+    from hccinfhir.filter import compile_filter
+    from hccinfhir.synthetic import SyntheticClaimsGenerator
+    eobs = load_sample_eob_list() + [load_sample_eob(i) for i in (1, 2)] + \
+        SyntheticClaimsGenerator(seed=3, n_members=20).eob_list()
+    claim_filter = compile_filter(year=2026)
+
+    for lines in ([json.dumps(eob) for eob in eobs], [json.dumps(eob).encode() for eob in eobs]):
+        assert extract_sld_list(lines) == extract_sld_list(eobs)
+        assert extract_sld_list(lines, claim_filter=claim_filter) == \
+            extract_sld_list(eobs, claim_filter=claim_filter)
+
+def test_extract_sld_from_invalid_json():
+    from hccinfhir.issues import IssueCollector
+    with pytest.raises(ValueError):
+        extract_sld('{"resourceType": "Patient"}')
+    with pytest.raises(ValueError):
+        extract_sld(b'{"resourceType": "ExplanationOfBenefit", ')  # truncated line
+    with pytest.raises(TypeError):
+        extract_sld("")
+
+    issues = IssueCollector()
+    lines = [json.dumps(load_sample_eob(1)), "{not json", json.dumps(load_sample_eob(2))]
+    assert len(extract_sld_list(lines, issues=issues)) == 3
+    assert issues.total == 1
+
+def searchset(eobs, next_url=None):
+    bundle = {"resourceType": "Bundle", "type": "searchset",
+              "entry": [{"fullUrl": f"urn:eob:{i}", "resource": eob} for i, eob in enumerate(eobs)]}
+    if next_url:
+        bundle["link"] = [{"relation": "self", "url": "self"}, {"relation": "next", "url": next_url}]
+    return bundle
+
+def test_iter_bundle_resources():
+    from hccinfhir.extractor_fhir import iter_bundle_resources
+    eobs = load_sample_eob_list()[:6]
+    patient = {"resourceType": "Patient", "id": "p1"}
+    bundle = searchset(eobs[:2])
+    bundle["entry"] += [{"resource": patient}, {"search": {"mode": "include"}},
+                        {"resource": searchset(eobs[2:4])}]
+
+    assert list(iter_bundle_resources(bundle)) == eobs[:4]
+    assert list(iter_bundle_resources([json.dumps(bundle), eobs[4], patient, searchset(eobs[5:])])) == eobs
+    assert list(iter_bundle_resources(bundle, resource_type="Patient")) == [patient]
+    assert len(list(iter_bundle_resources(bundle, resource_type=None))) == 5
+
+def test_iter_bundle_pages_is_lazy():
+    from hccinfhir.extractor_fhir import bundle_next_url, iter_bundle_pages, iter_bundle_resources
+    eobs = load_sample_eob_list()[:9]
+    pages = {"page2": searchset(eobs[3:6], "page3"), "page3": json.dumps(searchset(eobs[6:]))}
+    fetched = []
+    def fetch(url):
+        fetched.append(url)
+        return pages[url]
+
+    first = searchset(eobs[:3], "page2")
+    assert bundle_next_url(first) == "page2"
+    resources = iter_bundle_resources(iter_bundle_pages(first, fetch))
+    assert [next(resources) for _ in range(3)] == eobs[:3]
+    assert fetched == []
+    assert next(resources) == eobs[3]
+    assert fetched == ["page2"]
+    assert list(resources) == eobs[4:]
+    assert fetched == ["page2", "page3"]
+
+def test_extract_sld_list_from_bundles():
+    eobs = load_sample_eob_list()[:20]
+    bundles = [searchset(eobs[:10]), searchset(eobs[10:])]
+    bundles[1]["entry"].append({"resource": {"resourceType": "Coverage", "id": "c1"}})
+
+    assert extract_sld_list(bundles) == extract_sld_list(eobs)
+    assert extract_sld_list(iter(bundles)) == extract_sld_list(eobs)
+    assert extract_sld(bundles[0]) == extract_sld_list(eobs[:10])
@@ -1,6 +1,6 @@
 import pytest
 import importlib.resources
-from hccinfhir.filter import apply_filter
+from hccinfhir.filter import apply_filter, filter_mask, compile_filter, get_eligible_cpt_hcpcs
 from hccinfhir.extractor import extract_sld_list
 import json
 
@@ -55,4 +55,44 @@ def test_apply_filter_837():
     filtered_sld_list = apply_filter(sld_list)
     
     assert len(sld_list) == 39
-    assert len(filtered_sld_list) == 35
\ No newline at end of file
+    assert len(filtered_sld_list) == 35
+
+
+def test_filter_mask_matches_apply_filter():
+    sld_list = extract_sld_list(load_sample_eob_list())
+    sld_list += extract_sld_list(load_sample_837_list(), format='837')
+
+    mask = filter_mask(sld_list)
+    assert len(mask) == len(sld_list)
+    assert [sld for sld, keep in zip(sld_list, mask) if keep] == apply_filter(sld_list)
+
+def test_compiled_filter_rules():
+    compiled = compile_filter(professional_cpt={'99213'})
+
+    # professional: no facility/service type
+    assert compiled.is_eligible(None, None, '99213')
+    assert not compiled.is_eligible(None, None, '0398T')
+    # inpatient TOB 11X does not require an eligible CPT/HCPCS
+    assert compiled.is_eligible('1', '1', None)
+    # outpatient TOB 13X requires an eligible CPT/HCPCS
+    assert compiled.is_eligible('1', '3', '99213')
+    assert not compiled.is_eligible('1', '3', '0398T')
+    # unknown TOB
+    assert not compiled.is_eligible('2', '1', '99213')
+
+    assert compiled.mask_columns(['1', None, '2'], ['1', None, '1'], [None, '99213', '99213']) == [True, True, False]
+
+def test_eligible_cpt_hcpcs_cached():
+    assert get_eligible_cpt_hcpcs(2025) is get_eligible_cpt_hcpcs(2025)
+    assert compile_filter(year=2025).professional_cpt is get_eligible_cpt_hcpcs(2025)
+
+@pytest.mark.parametrize("year", [2023, 2025, 2026])
+def test_filter_pushdown_matches_apply_filter(year):
+    compiled = compile_filter(year=year)
+
+    eob_list = load_sample_eob_list()
+    assert extract_sld_list(eob_list, claim_filter=compiled) == apply_filter(extract_sld_list(eob_list), year=year)
+
+    x12_list = load_sample_837_list()
+    assert (extract_sld_list(x12_list, format='837', claim_filter=compiled) ==
+            apply_filter(extract_sld_list(x12_list, format='837'), year=year))
@@ -1,10 +1,14 @@
+import asyncio
 import pytest
 from hccinfhir.hccinfhir import HCCInFHIR
 from hccinfhir.datamodels import Demographics, ServiceLevelData, RAFResult
 import importlib.resources
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pydantic_core import ValidationError
 from hccinfhir import get_837_sample, extract_sld
+from hccinfhir.instrumentation import Metrics
+from hccinfhir.issues import IssueCollector
 
 @pytest.fixture
 def sample_demographics():
@@ -130,6 +134,89 @@ class TestHCCInFHIR:
         assert len(result.service_level_data) != len(sld_lst)
 
 
+    def test_run_from_bundles(self, sample_demographics, sample_eob):
+        from hccinfhir.instrumentation import Metrics
+        pages = [{"resourceType": "Bundle", "type": "searchset",
+                  "entry": [{"resource": eob} for eob in sample_eob[i:i + 50]] +
+                           [{"resource": {"resourceType": "Patient", "id": "p1"}}]}
+                 for i in range(0, len(sample_eob), 50)]
+        expected = HCCInFHIR().run(sample_eob, sample_demographics)
+
+        for processor in (HCCInFHIR(), HCCInFHIR(metrics=Metrics())):
+            result = processor.run_from_bundles((json.dumps(page) for page in pages), sample_demographics)
+            assert result.risk_score == expected.risk_score
+            assert result.service_level_data == expected.service_level_data
+
+    def test_run_multi(self, sample_demographics, sample_eob):
+        processor = HCCInFHIR(model_name="CMS-HCC Model V28")
+        weights = {"CMS-HCC Model V24": 0.33, "CMS-HCC Model V28": 0.67}
+        result = processor.run_multi(sample_eob, sample_demographics,
+                                     model_names=["CMS-HCC Model V24", "CMS-HCC Model V28", "RxHCC Model V08"],
+                                     blend_weights=weights)
+
+        assert set(result.results) == {"CMS-HCC Model V24", "CMS-HCC Model V28", "RxHCC Model V08"}
+        assert result.results["CMS-HCC Model V28"].risk_score == processor.run(sample_eob, sample_demographics).risk_score
+        assert result.blended_risk_score == pytest.approx(
+            0.33 * result.results["CMS-HCC Model V24"].risk_score +
+            0.67 * result.results["CMS-HCC Model V28"].risk_score)
+        assert isinstance(result.service_level_data, list)
+
+        # Defaults to the processor's model
+        result = processor.run_from_service_data_multi([], sample_demographics)
+        assert list(result.results) == ["CMS-HCC Model V28"]
+
+    def test_arun(self, sample_demographics, sample_eob):
+        processor = HCCInFHIR(executor=ThreadPoolExecutor(max_workers=2))
+        expected = processor.run(sample_eob, sample_demographics)
+
+        async def main():
+            return await asyncio.gather(*(processor.arun(sample_eob, sample_demographics) for _ in range(3)))
+
+        results = asyncio.run(main())
+        assert [r.risk_score for r in results] == [expected.risk_score] * 3
+        assert processor._warmed
+
+    def test_arun_process_executor(self, sample_demographics, sample_eob):
+        issues, metrics = IssueCollector(), Metrics()
+        invalid_eob = {"resourceType": "ExplanationOfBenefit", "item": "x"}
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            processor = HCCInFHIR(executor=executor, issues=issues, metrics=metrics)
+            result = asyncio.run(processor.arun(sample_eob + [invalid_eob], sample_demographics))
+
+        assert result.risk_score == HCCInFHIR().run(sample_eob, sample_demographics).risk_score
+        # The workers score a copy of the processor, without the collectors
+        assert processor.issues is issues and issues.total == 0
+        assert processor.metrics is metrics
+
+    def test_arun_many(self, sample_demographics, sample_eob):
+        processor = HCCInFHIR()
+        requests = [(sample_eob, sample_demographics), ([], {"age": 70}), ([], sample_demographics)]
+
+        results = asyncio.run(processor.arun_many(requests, max_concurrency=2, return_exceptions=True))
+        assert results[0].risk_score == processor.run(sample_eob, sample_demographics).risk_score
+        assert isinstance(results[1], ValidationError)
+        assert results[2].risk_score == processor.run([], sample_demographics).risk_score
+
+        with pytest.raises(ValidationError):
+            asyncio.run(processor.arun_many(requests))
+        with pytest.raises(ValueError):
+            asyncio.run(processor.arun_many(requests, max_concurrency=0))
+
+    def test_arun_cancellation(self, sample_demographics, sample_eob):
+        processor = HCCInFHIR()
+
+        async def main():
+            task = asyncio.ensure_future(processor.arun_many([(sample_eob, sample_demographics)] * 50,
+                                                             max_concurrency=2))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The processor is still usable after a cancelled call
+            return await processor.arun([], sample_demographics)
+
+        assert asyncio.run(main()).risk_score == processor.run([], sample_demographics).risk_score
+
     def test_calculate_from_diagnosis(self, sample_demographics):
         processor = HCCInFHIR()
         diagnosis_codes = ["E119"]  # Type 2 diabetes without complications
@@ -141,6 +228,16 @@ class TestHCCInFHIR:
         assert hasattr(result, 'hcc_list')
         assert hasattr(result, 'demographics')
 
+    def test_calculate_from_hccs(self, sample_demographics):
+        processor = HCCInFHIR()
+        from_dx = processor.calculate_from_diagnosis(["E119", "I509"], sample_demographics)
+        from_hccs = processor.calculate_from_hccs(list(from_dx.cc_to_dx), sample_demographics)
+
+        assert from_hccs.risk_score == from_dx.risk_score
+        assert set(from_hccs.hcc_list) == set(from_dx.hcc_list)
+        with pytest.raises(ValueError, match="hcc_codes must be a list"):
+            processor.calculate_from_hccs("HCC19", sample_demographics)
+
     def test_filtering_behavior(self, sample_demographics, sample_service_data):
         # Test with filtering enabled
         processor_with_filter = HCCInFHIR(filter_claims=True)
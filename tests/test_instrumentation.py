@@ -0,0 +1,59 @@
+from hccinfhir import HCCInFHIR, Metrics, calculate_raf
+from hccinfhir.instrumentation import current_metrics
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.samples import get_eob_sample_list, get_demographics_sample
+
+
+def test_run_with_metrics_matches_run_without():
+    eobs = get_eob_sample_list()
+    demographics = get_demographics_sample()
+    metrics = Metrics()
+
+    expected = HCCInFHIR().run(eobs, demographics)
+    result = HCCInFHIR(metrics=metrics).run(eobs, demographics)
+
+    assert result.risk_score == expected.risk_score
+    assert result.service_level_data == expected.service_level_data
+
+    snapshot = metrics.snapshot()
+    counters = snapshot['counters']
+    assert counters['eobs_parsed'] == len(eobs)
+    assert counters['slds_produced'] - counters['slds_filtered_out'] == len(result.service_level_data)
+    for stage in ('extract', 'filter', 'demographics', 'mapping', 'hierarchies',
+                  'interactions', 'coefficients'):
+        assert snapshot['calls'][stage] == 1
+        assert snapshot['timings'][stage] >= 0
+
+
+def test_calculate_raf_metrics_cache_and_db_loads():
+    compile_model.cache_clear()
+    metrics = Metrics()
+
+    calculate_raf(["E119", "I10", "Z0000"], "CMS-HCC Model V24", metrics=metrics)
+    calculate_raf(["E119"], "CMS-HCC Model V24", metrics=metrics)
+
+    counters = metrics.snapshot()['counters']
+    assert counters['cache_lookups'] == 2
+    assert counters['cache_misses'] == 1
+    assert counters['cache_hits'] == 1
+    assert counters['db_loads'] == 4  # dx to CC, hierarchies, coefficients, is_chronic
+    assert counters['dx_codes_unmapped'] == 2  # I10 and Z0000
+    assert current_metrics() is None
+
+
+def test_metrics_hook_and_merge():
+    events = []
+    metrics = Metrics(hook=lambda kind, name, value: events.append((kind, name)))
+    metrics.incr('eobs_parsed', 3)
+    with metrics.stage('extract'):
+        pass
+
+    assert events == [('count', 'eobs_parsed'), ('time', 'extract')]
+
+    other = Metrics()
+    other.incr('eobs_parsed', 2)
+    metrics.merge(other)
+    assert metrics.snapshot()['counters']['eobs_parsed'] == 5
+
+    metrics.reset()
+    assert metrics.snapshot() == {'timings': {}, 'calls': {}, 'counters': {}}
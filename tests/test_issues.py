@@ -0,0 +1,81 @@
+import logging
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from hccinfhir import HCCInFHIR, IssueCollector
+from hccinfhir.extractor import extract_sld_list
+from hccinfhir.extractor_837 import split_into_claims
+from hccinfhir.issues import INVALID_VALUE, INVALID_TYPE, ST_SE_MISMATCH, UNCLOSED_TRANSACTION
+from hccinfhir.samples import get_eob_sample, get_demographics_sample
+
+
+def test_extract_sld_list_collects_issues(capsys):
+    eob = get_eob_sample(1)
+    data = [eob, {"resourceType": "Invalid", "id": "bad-1"}, None, eob]
+    issues = IssueCollector()
+
+    slds = extract_sld_list(data, issues=issues)
+
+    assert len(slds) == 2 * len(extract_sld_list([eob]))
+    assert issues.counts == {INVALID_VALUE: 1, INVALID_TYPE: 1}
+    assert [(i.reason, i.index, i.claim_id) for i in issues] == [
+        (INVALID_VALUE, 1, "bad-1"),
+        (INVALID_TYPE, 2, None),
+    ]
+    assert "bad-1" in issues.records[0].message
+    assert capsys.readouterr().out == ""
+
+
+def test_issue_collector_bounds_and_rate_limits(caplog):
+    issues = IssueCollector(max_records=3, logger=logging.getLogger("hccinfhir.test"), log_limit=2)
+    with caplog.at_level(logging.WARNING, logger="hccinfhir.test"):
+        for index in range(5):
+            issues.add(INVALID_VALUE, index, f"c{index}", ValueError("bad"))
+        issues.log_summary()
+
+    assert len(issues) == 5
+    assert len(issues.records) == 3
+    assert issues.dropped == 2
+    messages = [r.getMessage() for r in caplog.records]
+    assert len(messages) == 3
+    assert "c1" in messages[1]
+    assert "3 more issues" in messages[2]
+
+
+def test_issue_collector_is_shared_by_threads_and_picklable():
+    issues = IssueCollector(max_records=100)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: [issues.add(INVALID_VALUE, index=i) for _ in range(500)], range(8)))
+    assert issues.counts == {INVALID_VALUE: 4000} and len(issues.records) == 100
+
+    copy = pickle.loads(pickle.dumps(issues))
+    assert copy.counts == issues.counts and list(copy) == list(issues)
+    copy.add(INVALID_TYPE)
+    assert copy.counts[INVALID_TYPE] == 1 and INVALID_TYPE not in issues.counts
+
+
+def test_default_issues_go_to_logging(caplog):
+    with caplog.at_level(logging.WARNING, logger="hccinfhir"):
+        extract_sld_list([{"resourceType": "Invalid"}] * 15)
+    # 10 individual records, then one aggregated record
+    assert len(caplog.records) == 11
+
+
+def test_split_into_claims_issues():
+    segments = [["ST", "837", "0001"], ["BHT"], ["SE", "2", "0002"],
+                ["ST", "837", "0003"], ["BHT"]]
+    issues = IssueCollector()
+
+    claims = split_into_claims(segments, issues)
+
+    assert len(claims) == 2
+    assert [(i.reason, i.index, i.claim_id) for i in issues] == [
+        (ST_SE_MISMATCH, 0, "0001"),
+        (UNCLOSED_TRANSACTION, 1, "0003"),
+    ]
+
+
+def test_hccinfhir_issues():
+    issues = IssueCollector()
+    processor = HCCInFHIR(issues=issues)
+    processor.run([get_eob_sample(1), {"resourceType": "Invalid"}], get_demographics_sample())
+    assert issues.counts == {INVALID_VALUE: 1}
@@ -1,5 +1,8 @@
 import pytest
-from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.model_calculate import calculate_raf, calculate_raf_multi, calculate_raf_from_hccs, calculate_raf_from_hccs_batch
+from hccinfhir.datamodels import Demographics
+from hccinfhir.model_coefficients import apply_coefficients
+from hccinfhir.model_compiled import compile_model
 
 def test_basic_cms_hcc_calculation():
     diagnosis_codes = ['E119', 'I509']  # Diabetes without complications, Heart failure
@@ -140,4 +143,88 @@ def test_hf_hcc238_v28():  # Test for heart failure and specified heart arrhythm
         sex='M',
     )
     assert isinstance(result.risk_score, float)
-    assert result.interactions['HF_HCC238_V28'] == 0 # No interaction should be 
\ No newline at end of file
+    assert result.interactions['HF_HCC238_V28'] == 0 # No interaction should be 
+
+
+def test_calculate_raf_multi_matches_single_model():
+    diagnosis_codes = ['E1169', 'I509', 'J449', 'N186']
+    model_names = ["CMS-HCC Model V24", "CMS-HCC Model V28", "RxHCC Model V08", "CMS-HCC ESRD Model V24"]
+    multi = calculate_raf_multi(diagnosis_codes, model_names, age=72, sex='M', dual_elgbl_cd='02')
+
+    assert list(multi.results) == model_names
+    assert multi.blended_risk_score is None
+    for model_name in model_names:
+        single = calculate_raf(diagnosis_codes, model_name, age=72, sex='M', dual_elgbl_cd='02')
+        assert multi.results[model_name].risk_score == single.risk_score
+        assert set(multi.results[model_name].hcc_list) == set(single.hcc_list)
+        assert multi.results[model_name].version == single.version
+
+def test_calculate_raf_multi_blend():
+    diagnosis_codes = ['E119', 'I509']
+    weights = {"CMS-HCC Model V24": 0.33, "CMS-HCC Model V28": 0.67}
+    multi = calculate_raf_multi(diagnosis_codes, list(weights), age=67, sex='F', blend_weights=weights)
+
+    expected = sum(w * multi.results[m].risk_score for m, w in weights.items())
+    assert multi.blended_risk_score == pytest.approx(expected)
+    assert multi.blend_weights == weights
+
+    with pytest.raises(ValueError):
+        calculate_raf_multi(diagnosis_codes, ["CMS-HCC Model V28"], blend_weights=weights)
+    with pytest.raises(ValueError):
+        calculate_raf_multi(diagnosis_codes, [])
+
+@pytest.mark.parametrize("model_name", ["CMS-HCC Model V24", "CMS-HCC Model V28", "CMS-HCC ESRD Model V24"])
+def test_score_decomposition_matches_three_pass(model_name):
+    diagnosis_codes = ['C509', 'E1169', 'I509', 'F319', 'A419', 'J449', 'N186']
+    result = calculate_raf(diagnosis_codes, model_name, age=60, sex='F', orec='1', dual_elgbl_cd='02')
+
+    # Reference: demographics only, then demographics + chronic HCCs
+    model = compile_model(model_name)
+    demographics = result.demographics
+    demographic_interactions = {k: v for k, v in result.interactions.items()
+                                if k.startswith(('NMCAID_', 'MCAID_', 'LTI_', 'OriginallyDisabled_'))}
+    chronic = {hcc for hcc in result.hcc_list if hcc in model.chronic_hccs}
+    demo_only = sum(apply_coefficients(demographics, set(), demographic_interactions, model_name).values())
+    chronic_only = sum(apply_coefficients(demographics, chronic, demographic_interactions, model_name).values()) - demo_only
+
+    assert result.risk_score == pytest.approx(sum(result.coefficients.values()))
+    assert result.risk_score_demographics == pytest.approx(demo_only)
+    assert result.risk_score_chronic_only == pytest.approx(chronic_only)
+    assert result.risk_score_hcc == pytest.approx(result.risk_score - demo_only)
+
+@pytest.mark.parametrize("model_name", ["CMS-HCC Model V24", "CMS-HCC Model V28", "RxHCC Model V08"])
+def test_calculate_raf_from_hccs_matches_diagnosis(model_name):
+    diagnosis_codes = ['E1169', 'E119', 'I509', 'J449', 'C509']
+    from_dx = calculate_raf(diagnosis_codes, model_name, age=72, sex='M')
+
+    # pre-hierarchy CCs
+    ccs = list(from_dx.cc_to_dx.keys())
+    from_ccs = calculate_raf_from_hccs(ccs, model_name, age=72, sex='M')
+    assert from_ccs.risk_score == from_dx.risk_score
+    assert set(from_ccs.hcc_list) == set(from_dx.hcc_list)
+    assert from_ccs.cc_to_dx == {}
+
+    # post-hierarchy HCCs, prefixed
+    hccs = [f"HCC{hcc}" for hcc in from_dx.hcc_list]
+    from_hccs = calculate_raf_from_hccs(hccs, model_name, age=72, sex='M', hierarchies_applied=True)
+    assert from_hccs.risk_score == from_dx.risk_score
+
+def test_calculate_raf_from_hccs_hierarchies_applied():
+    # In V28, CC 223 is dropped by the hierarchy stage unless another heart failure CC is present
+    pre = calculate_raf_from_hccs(['223'], "CMS-HCC Model V28", age=70, sex='F')
+    post = calculate_raf_from_hccs(['223'], "CMS-HCC Model V28", age=70, sex='F', hierarchies_applied=True)
+    assert pre.hcc_list == []
+    assert post.hcc_list == ['223']
+
+def test_calculate_raf_from_hccs_batch():
+    members = [
+        (['19', '85'], {"age": 72, "sex": "M", "dual_elgbl_cd": "00"}),
+        ([], {"age": 67, "sex": "F"}),
+        ({'HCC96'}, Demographics(age=55, sex='F', orec='1')),
+    ]
+    results = calculate_raf_from_hccs_batch(members, "CMS-HCC Model V24")
+    assert len(results) == 3
+    for (hccs, demo), result in zip(members, results):
+        demo = demo if isinstance(demo, dict) else demo.model_dump(include={'age', 'sex', 'orec'})
+        assert result.risk_score == calculate_raf_from_hccs(hccs, "CMS-HCC Model V24", 
+                                                            **{'orec': '', 'dual_elgbl_cd': 'NA', 'crec': '', **demo}).risk_score
@@ -1,5 +1,6 @@
 import pytest
-from hccinfhir.model_coefficients import get_coefficent_prefix, apply_coefficients
+from hccinfhir.model_coefficients import (get_coefficent_prefix, apply_coefficients, apply_coefficients_by_category,
+                                         DEMOGRAPHIC, CHRONIC_HCC, NON_CHRONIC_HCC, INTERACTION)
 from hccinfhir.model_demographics import categorize_demographics
 
 def test_get_coefficient_prefix_cms_hcc_community():
@@ -97,3 +98,48 @@ def test_apply_coefficients_empty():
     )
     
     assert result == {'F70_74': 0.395}
+
+def test_apply_coefficients_by_category():
+    demographics = categorize_demographics(
+        age=70,
+        sex='F',
+        dual_elgbl_cd='00',
+        orec='0',
+        crec='0',
+        version='V2'
+    )
+
+    interactions = {
+        "DIABETES_HF_V28": 1,
+        "D2": 1,
+        "OriginallyDisabled_Female": 1,
+        "D3": 0,
+    }
+    test_coefficients = {
+        ("cna_f70_74", "CMS-HCC Model V28"): 0.395,
+        ("cna_hcc37", "CMS-HCC Model V28"): 0.166,
+        ("cna_hcc226", "CMS-HCC Model V28"): 0.360,
+        ("cna_diabetes_hf_v28", "CMS-HCC Model V28"): 0.112,
+        ("cna_d2", "CMS-HCC Model V28"): 0.0,
+        ("cna_originallydisabled_female", "CMS-HCC Model V28"): 0.244,
+        ("cna_d3", "CMS-HCC Model V28"): 0.1,
+    }
+
+    result, categories = apply_coefficients_by_category(
+        demographics=demographics,
+        hcc_set={"37", "226"},
+        interactions=interactions,
+        coefficients=test_coefficients,
+        chronic_hccs=frozenset({"37"})
+    )
+
+    assert result == apply_coefficients(demographics, {"37", "226"}, interactions,
+                                        coefficients=test_coefficients)
+    assert categories == {
+        "F70_74": DEMOGRAPHIC,
+        "OriginallyDisabled_Female": DEMOGRAPHIC,
+        "37": CHRONIC_HCC,
+        "226": NON_CHRONIC_HCC,
+        "DIABETES_HF_V28": INTERACTION,
+        "D2": INTERACTION,
+    }
@@ -1,6 +1,15 @@
+import os
+import subprocess
+import sys
 import time
 from hccinfhir import HCCInFHIR, Demographics
 from hccinfhir.samples import get_eob_sample_list, get_demographics_sample
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+# Deliberately loose floors: they catch order-of-magnitude regressions (e.g. reference
+# tables reloaded for every claim) without being flaky on slow CI machines.
+# Use benchmarks/bench.py for actual measurements.
+MIN_CLAIMS_PER_SECOND = 100
 
 def test_claims_processing_performance():
     """Measures and reports the number of claims processed per second."""
@@ -18,9 +27,9 @@ def test_claims_processing_performance():
     demographics = get_demographics_sample()
 
     # Measure the processing time
-    start_time = time.time()
-    hcc_processor.run(eob_list=eob_list, demographics=demographics)
-    end_time = time.time()
+    start_time = time.perf_counter()
+    result = hcc_processor.run(eob_list=eob_list, demographics=demographics)
+    end_time = time.perf_counter()
 
     # Calculate and report performance
     processing_time = end_time - start_time
@@ -31,5 +40,36 @@ def test_claims_processing_performance():
     print(f"Claims per second: {claims_per_second:.2f}")
     print(f"--------------------------------")
 
-    # Optional: Add an assertion for a minimum performance threshold
-    # For example, assert claims_per_second > 100 # This is just an example threshold
+    assert result.risk_score > 0
+    assert claims_per_second > MIN_CLAIMS_PER_SECOND
+
+def test_synthetic_population_performance():
+    """Scores a synthetic population member by member, as a batch job would."""
+    gen = SyntheticClaimsGenerator(seed=0, n_members=50)
+    demographics = gen.demographics()
+    hcc_processor = HCCInFHIR()
+
+    num_claims = 0
+    start_time = time.perf_counter()
+    for index, member_id in enumerate(demographics):
+        eobs = [gen.render_eob(claim) for claim in gen.member_claims(index)]
+        num_claims += len(eobs)
+        hcc_processor.run(eobs, demographics[member_id])
+    processing_time = time.perf_counter() - start_time
+
+    assert num_claims > 0
+    assert num_claims / processing_time > MIN_CLAIMS_PER_SECOND
+
+
+def test_package_import_is_lazy():
+    """`import hccinfhir` must not import SQLAlchemy, pandas or the reference data."""
+    code = ("import sys, hccinfhir; "
+            "print([m for m in ('sqlalchemy', 'pandas', 'pydantic', 'hccinfhir.database') if m in sys.modules])")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            env=env, check=True).stdout
+    assert output.strip() == "[]"
+
+    import hccinfhir
+    assert "calculate_raf" in dir(hccinfhir)
+    assert hccinfhir.HCCInFHIR is HCCInFHIR
@@ -0,0 +1,129 @@
+import csv
+import random
+from datetime import date
+import pytest
+from hccinfhir.cli import main
+from hccinfhir.model_calculate import calculate_raf
+from hccinfhir.person_diag import (external_sort, merge_join, model_hccs, parse_dob, person_demographics,
+                                   score_person_diag)
+
+AS_OF = date(2026, 2, 1)
+CODES = ["E11.9", "I50.9", "N186", "E1122", "I10", "F329", "J449", "C509", "G20"]
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    """Unsorted PERSON and DIAG files and the expected result of each member."""
+    root = tmp_path_factory.mktemp("sas")
+    rng = random.Random(5)
+    persons, diags, expected = [], [], {}
+    for i in rng.sample(range(60), 60):
+        member_id = f"1{i:09d}A"
+        sex, age, fbdual = rng.choice("12"), rng.randint(30, 95), rng.random() < 0.2
+        dob = date(AS_OF.year - age, 1, 15 + i % 10).strftime("%Y%m%d" if i % 2 else "%Y-%m-%d")
+        persons.append([member_id, sex, dob, "0" if age >= 65 else "1", "1" if fbdual else "0", "0"])
+        codes = rng.sample(CODES, rng.randint(0, 4))
+        diags += [[member_id, code] for code in codes + codes[:1]]
+        expected[member_id] = calculate_raf([c.replace(".", "") for c in codes], "CMS-HCC Model V28", age=age,
+                                            sex=sex, orec=persons[-1][3], dual_elgbl_cd="02" if fbdual else "00")
+    diags += [["9999999999Z", "E119"]]  # no PERSON row
+    rng.shuffle(diags)
+    with open(root / "person.csv", "w", newline="") as f:
+        csv.writer(f).writerows([["hicno", "SEX", "DOB", "OREC", "FBDUAL", "PBDUAL"]] + persons)
+    with open(root / "diag.csv", "w", newline="") as f:
+        csv.writer(f).writerows([["HICNO", "DIAG"]] + diags)
+    return root, expected
+
+
+def test_parse_person_row():
+    assert parse_dob("19500203") == parse_dob("1950-02-03") == parse_dob("02/03/1950") == date(1950, 2, 3)
+    assert parse_dob("0") == date(1960, 1, 1) and parse_dob("-365") == date(1959, 1, 1)
+
+    row = {"SEX": "2", "DOB": "19600202", "OREC": "1", "MCAID": "1", "NEMCAID": "0", "NE": "1"}
+    assert person_demographics(row, AS_OF) == {"sex": "2", "age": 65, "orec": "1", "dual_elgbl_cd": "00",
+                                               "new_enrollee": True}
+    assert person_demographics({"AGE": "70", "PBDUAL": "1", "FBDUAL": "0"}, AS_OF) == \
+        {"age": 70.0, "dual_elgbl_cd": "01"}
+
+
+def test_invalid_person_rows(tmp_path):
+    with pytest.raises(ValueError, match="Invalid DOB '1941-13-01'"):
+        parse_dob("1941-13-01")
+    (tmp_path / "person.csv").write_text("HICNO,SEX,DOB,AGE\na,2,1941-13-01,\nb,1,,7O\nc,1,19500101,\n")
+    (tmp_path / "diag.csv").write_text("HICNO,DIAG\na,E119\nbb,E119\nc,E119\n")
+
+    counts = score_person_diag(str(tmp_path / "person.csv"), str(tmp_path / "diag.csv"),
+                               str(tmp_path / "scores.csv"), age_as_of=AS_OF)
+
+    assert counts == {"members": 1, "errors": 2, "unmatched": 1}
+    with open(tmp_path / "scores.csv", newline="") as f:
+        rows = {row["member_id"]: row for row in csv.DictReader(f)}
+    assert "Invalid DOB '1941-13-01'" in rows["a"]["error"] and "Invalid AGE '7O'" in rows["b"]["error"]
+    assert rows["bb"]["error"] == "No PERSON row for this member"
+    assert float(rows["c"]["risk_score"]) == pytest.approx(
+        calculate_raf(["E119"], age=76, sex="1", orec="", crec="").risk_score)
+
+
+def test_external_sort(tmp_path):
+    rows = [(str(random.Random(i).random()), i) for i in range(1000)]
+
+    assert list(external_sort(rows, buffer_rows=64, tmp_dir=str(tmp_path))) == sorted(rows)
+    assert list(external_sort(rows[:10], buffer_rows=64)) == sorted(rows[:10])
+    assert list(tmp_path.iterdir()) == []
+
+    runs = external_sort(rows, buffer_rows=64, tmp_dir=str(tmp_path))
+    next(runs)
+    assert len(list(tmp_path.iterdir())) == 1
+    runs.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_merge_join():
+    persons = [("a", {}), ("c", {}), ("d", {})]
+    diags = [("a", "X"), ("a", "W"), ("a", "X"), ("b", "Y"), ("d", "Z"), ("e", "V")]
+
+    assert list(merge_join(persons, diags)) == [("a", {}, ["W", "X"]), ("b", None, ["Y"]), ("c", {}, []),
+                                                ("d", {}, ["Z"]), ("e", None, ["V"])]
+    with pytest.raises(ValueError, match="DIAG is not sorted"):
+        list(merge_join(persons, diags[::-1]))
+    with pytest.raises(ValueError, match="several rows"):
+        list(merge_join([("a", {}), ("a", {})], []))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_score_person_diag(files, workers, tmp_path):
+    root, expected = files
+    output = tmp_path / "scores.csv"
+
+    counts = score_person_diag(str(root / "person.csv"), str(root / "diag.csv"), str(output), age_as_of=AS_OF,
+                               sort_buffer_rows=25, tmp_dir=str(tmp_path), max_workers=workers, chunk_size=7)
+
+    assert counts == {"members": 60, "errors": 0, "unmatched": 1}
+    with open(output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    # The error row of the unmatched member is written when the join reaches it
+    assert [row["member_id"] for row in rows if not row["error"]] == sorted(expected)
+    assert [row["member_id"] for row in rows if row["error"]] == ["9999999999Z"]
+    hccs = model_hccs(["CMS-HCC Model V28"])
+    for row in rows:
+        if row["error"]:
+            continue
+        result = expected[row["member_id"]]
+        assert float(row["risk_score"]) == pytest.approx(result.risk_score)
+        assert [hcc for hcc in hccs if row[f"HCC{hcc}"] == "1"] == sorted(result.hcc_list, key=hccs.index)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["scores.csv"]
+
+
+def test_score_person_diag_command(files, tmp_path, capsys):
+    root, expected = files
+    models = ["CMS-HCC Model V24", "CMS-HCC Model V28"]
+
+    status = main(["score-person-diag", str(root / "person.csv"), str(root / "diag.csv"), "-o",
+                   str(tmp_path / "scores.ndjson"), "-m", models[0], "-m", models[1], "-w", "1",
+                   "--age-as-of", AS_OF.isoformat()])
+
+    assert status == 0
+    assert "60 members scored" in capsys.readouterr().err
+    assert len((tmp_path / "scores.ndjson").read_text().splitlines()) == 2 * 60 + 1
+    assert main(["score-person-diag", str(root / "person.csv"), str(root / "diag.csv"), "-o",
+                 str(tmp_path / "sorted.csv"), "--presorted", "-q"]) == 1
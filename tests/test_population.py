@@ -0,0 +1,112 @@
+import json
+import pytest
+from hccinfhir import HCCInFHIR, score_population
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+
+@pytest.fixture(scope="module")
+def population():
+    generator = SyntheticClaimsGenerator(seed=7, n_members=40)
+    demographics = generator.demographics()
+    members = []
+    for i, member_id in enumerate(demographics):
+        eobs = [generator.render_eob(claim) for claim in generator.member_claims(i)]
+        members.append((member_id, demographics[member_id], eobs))
+    return members
+
+
+@pytest.fixture(scope="module")
+def expected(population):
+    processor = HCCInFHIR()
+    return {member_id: processor.run(eobs, demographics).risk_score
+            for member_id, demographics, eobs in population}
+
+
+@pytest.mark.parametrize("backend", ["serial", "thread", "process"])
+def test_backends_match_run(population, expected, backend):
+    results = list(score_population(population, backend=backend, max_workers=2, chunk_size=8))
+
+    assert [r.member_id for r in results] == [m[0] for m in population]
+    for member_id, result, error in results:
+        assert error is None
+        assert result.risk_score == pytest.approx(expected[member_id])
+
+
+@pytest.mark.parametrize("json_decoder", [None, "json"])
+def test_unordered_raw_json_lines(population, expected, json_decoder):
+    members = [(member_id, demographics, [json.dumps(eob) for eob in eobs])
+               for member_id, demographics, eobs in population]
+
+    results = list(score_population(members, backend="process", max_workers=2,
+                                    chunk_size=5, ordered=False, json_decoder=json_decoder))
+
+    assert sorted(r.member_id for r in results) == sorted(expected)
+    for member_id, result, _ in results:
+        assert result.risk_score == pytest.approx(expected[member_id])
+
+
+def test_errors_are_returned_per_member(population):
+    member_id, demographics, eobs = population[0]
+    members = [("bad", {"age": 70}, eobs), (member_id, demographics, eobs)]
+
+    results = list(score_population(members, backend="serial"))
+
+    assert results[0].result is None
+    assert "Demographics" in results[0].error
+    assert results[1].error is None
+
+    with pytest.raises(ValueError):
+        list(score_population(members, backend="serial", raise_errors=True))
+
+
+def test_diagnosis_and_multi_model_input():
+    demographics = {"age": 70, "sex": "F"}
+    members = [("m1", demographics, ["E119", "I509"]), ("m2", demographics, [])]
+    models = ["CMS-HCC Model V24", "CMS-HCC Model V28"]
+
+    results = list(score_population(members, model_names=models, input_format="diagnosis",
+                                    backend="thread", max_workers=2, chunk_size=1))
+
+    processor = HCCInFHIR()
+    for (member_id, _, codes), (result_id, result, error) in zip(members, results):
+        expected = processor._calculate_raf_multi_from_demographics(
+            codes, processor._ensure_demographics(demographics), models, None)
+        assert result_id == member_id and error is None
+        assert set(result.results) == set(models)
+        for model in models:
+            assert result.results[model].risk_score == pytest.approx(expected.results[model].risk_score)
+
+
+@pytest.mark.parametrize("backend", ["serial", "process"])
+def test_score_partitions(tmp_path, backend):
+    from functools import partial
+    from hccinfhir.population import score_partitions
+    from hccinfhir.readers import MemberDiagnoses
+    from hccinfhir.writers import member_rows
+    codes = {f"m{i}": [["E119", "I509"], ["N186"], [], ["E1122", "I10"]][i % 4] for i in range(40)}
+    demographics = [(f"m{i}", {"age": 60 + i, "sex": "MF"[i % 2]}) for i in range(38)]  # m38, m39 unmatched
+    expected = {member_id: result.risk_score for member_id, result, _ in score_population(
+        [(member_id, d, codes[member_id]) for member_id, d in demographics], input_format="diagnosis",
+        backend="serial")}
+
+    with MemberDiagnoses(max_bytes=1, n_partitions=8, tmp_dir=str(tmp_path)) as store:
+        store.update(codes)
+        partitions = store.partitions(demographics)
+        results = list(score_partitions(partitions, backend=backend, max_workers=2,
+                                        transform=partial(member_rows, hcc_details=True)))
+        assert not any(tmp_path.glob("*/*"))  # removed by the workers
+
+    assert sorted(r.index for r in results) == [p.index for p in partitions]
+    rows = [rows for r in results for rows in r.results]
+    assert {row.member_id: row.results[0][2] for row in rows} == pytest.approx(expected)
+    assert sum(len(row.hcc_details) for row in rows) > 0
+    assert sorted(member_id for r in results for member_id in r.unmatched) == ["m38", "m39"]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        score_population([], backend="gpu")
+    with pytest.raises(ValueError):
+        score_population([], input_format="csv")
+    with pytest.raises(ValueError):
+        score_population([], chunk_size=0)
@@ -0,0 +1,104 @@
+import threading
+import pytest
+from hccinfhir.readers import (MemberDiagnoses, detect_compression, detect_format, expand_inputs,
+                               iter_ndjson_lines, open_input, read_claims, read_demographics)
+
+
+def test_expand_inputs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ["a.ndjson", "b.837", "notes.md", "sub/c.jsonl"]:
+        (tmp_path / name).write_text("{}\n")
+
+    assert expand_inputs([str(tmp_path)]) == sorted(str(tmp_path / n) for n in ["a.ndjson", "b.837", "sub/c.jsonl"])
+    assert expand_inputs([str(tmp_path / "**" / "*.jsonl"), str(tmp_path / "notes.md")]) == \
+        sorted([str(tmp_path / "sub" / "c.jsonl"), str(tmp_path / "notes.md")])
+
+
+def test_detect_format(tmp_path):
+    (tmp_path / "claims.txt").write_text("ISA*00*...~")
+    (tmp_path / "eobs.txt").write_text('{"resourceType": "ExplanationOfBenefit"}\n')
+    (tmp_path / "other.txt").write_text("hello")
+
+    assert detect_format(str(tmp_path / "claims.txt")) == "837"
+    assert detect_format(str(tmp_path / "eobs.txt")) == "fhir"
+    with pytest.raises(ValueError):
+        detect_format(str(tmp_path / "other.txt"))
+
+
+def test_read_demographics_csv(tmp_path):
+    (tmp_path / "members.csv").write_text("id,age,sex,orec\nM1,70,F,\n")
+
+    assert list(read_demographics(str(tmp_path / "members.csv"), "id")) == [("M1", {"age": "70", "sex": "F"})]
+    with pytest.raises(ValueError):
+        list(read_demographics(str(tmp_path / "members.csv")))
+
+
+@pytest.mark.parametrize("max_bytes", [None, 1])
+def test_member_diagnoses_join(tmp_path, max_bytes):
+    with MemberDiagnoses(max_bytes=max_bytes, n_partitions=4, tmp_dir=str(tmp_path)) as store:
+        store.update({"M1": ["E119"], "M2": ["I10"]})
+        store.update({"M1": ["I10", "E119"], "M3": ["N186"]})
+        assert store.spilled == (max_bytes is not None)
+
+        unmatched = []
+        joined = sorted(store.join([("M1", {"age": 70}), ("M2", {"age": 80}), ("M4", {"age": 90})], unmatched))
+
+    assert joined == [("M1", {"age": 70}, ["E119", "I10"]), ("M2", {"age": 80}, ["I10"]),
+                      ("M4", {"age": 90}, [])]
+    assert unmatched == ["M3"]
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2", "lzma"])
+@pytest.mark.parametrize("threaded", [False, True])
+def test_compressed_inputs(tmp_path, compression, threaded):
+    import importlib
+    codec = importlib.import_module(compression)
+    lines = [b'{"resourceType": "ExplanationOfBenefit", "id": "%d"}\n' % i for i in range(5000)]
+    path = tmp_path / "eobs.data"  # detected from the magic bytes, not the extension
+    path.write_bytes(codec.compress(b"".join(lines)))
+
+    assert detect_compression(str(path)) == {"gzip": "gzip", "bz2": "bz2", "lzma": "xz"}[compression]
+    assert detect_format(str(path)) == "fhir"
+    with open_input(str(path), threaded=threaded, buffer_size=4096) as f:
+        assert f.read() == b"".join(lines)
+    assert [eob["id"] for eob in read_claims(str(path), threaded=threaded)] == [str(i) for i in range(5000)]
+
+
+def test_threaded_reader_closed_early(tmp_path):
+    import gzip
+    path = tmp_path / "big.ndjson.gz"
+    path.write_bytes(gzip.compress(b'{"a": 1}\n' * 200000))
+
+    lines = iter_ndjson_lines(str(path), threaded=True)
+    assert next(lines) == b'{"a": 1}\n'
+    lines.close()
+    assert "hccinfhir-decompress" not in [thread.name for thread in threading.enumerate()]
+    assert expand_inputs([str(tmp_path)]) == [str(path)]
+
+
+def test_member_diagnoses_partition_entries(tmp_path):
+    import gc
+    from hccinfhir.readers import join_partition
+    ids = ["M1", "tab\tid", "[bracket", "line\nbreak", "12345"]
+    with MemberDiagnoses(max_bytes=1, n_partitions=2, tmp_dir=str(tmp_path)) as store:
+        for member_id in ids:
+            store.add(member_id, ["E119", "I10"])
+        store.add("12345", ["N186"])
+        store.add("M1", ["odd,code"])
+        store.add("M1", [])
+
+        unmatched = []
+        joined = [member for partition in store.partitions([("M1", {}), ("M9", {})])
+                  for member in join_partition(partition, unmatched)]
+        assert not any(tmp_path.glob("*/*"))  # partition files are removed once joined
+
+    assert sorted(joined) == [("M1", {}, ["E119", "I10", "odd,code"]), ("M9", {}, [])]
+    assert sorted(unmatched) == sorted(ids[1:])
+
+    store = MemberDiagnoses(max_bytes=1, tmp_dir=str(tmp_path))
+    store.add("M1", ["E119"])
+    assert len(list(tmp_path.iterdir())) == 1
+    del store
+    gc.collect()
+    assert list(tmp_path.iterdir()) == []  # removed without close
@@ -0,0 +1,73 @@
+import pytest
+from hccinfhir import HCCInFHIR
+from hccinfhir.extractor import extract_sld, extract_sld_list
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+
+def test_generator_is_deterministic():
+    gen_a = SyntheticClaimsGenerator(seed=7, n_members=5)
+    gen_b = SyntheticClaimsGenerator(seed=7, n_members=5)
+    gen_c = SyntheticClaimsGenerator(seed=8, n_members=5)
+
+    assert gen_a.eob_list() == gen_b.eob_list()
+    assert gen_a.x12_837("837P") == gen_b.x12_837("837P")
+    assert gen_a.demographics() == gen_b.demographics()
+    assert gen_a.eob_list() != gen_c.eob_list()
+    # Order of the calls does not matter
+    assert gen_a.member_claims(3) == SyntheticClaimsGenerator(seed=7, n_members=5).member_claims(3)
+
+
+def test_generator_configuration():
+    gen = SyntheticClaimsGenerator(seed=1, n_members=4, claims_per_member=(2, 2),
+                                   dx_per_claim=(3, 3), mapped_dx_rate=1.0,
+                                   dx_distribution="uniform")
+    claims = list(gen.iter_claims())
+    assert len(claims) == 8
+    mapping = compile_model("CMS-HCC Model V28").dx_to_cc_mapping
+    for claim in claims:
+        assert 1 <= len(claim["diagnosis_codes"]) <= 3
+        assert all((dx, "CMS-HCC Model V28") in mapping for dx in claim["diagnosis_codes"])
+    assert set(gen.demographics()) == {gen.member_id(i) for i in range(4)}
+
+
+def test_generator_invalid_arguments():
+    with pytest.raises(ValueError):
+        SyntheticClaimsGenerator(claims_per_member=(3, 1))
+    with pytest.raises(ValueError):
+        SyntheticClaimsGenerator(mapped_dx_rate=1.5)
+    with pytest.raises(ValueError):
+        SyntheticClaimsGenerator(dx_distribution="normal")
+
+
+def test_generated_eobs_and_837_are_parseable(tmp_path):
+    gen = SyntheticClaimsGenerator(seed=3, n_members=20)
+    claims = list(gen.iter_claims())
+    n_lines = sum(len(c["lines"]) for c in claims)
+
+    ndjson = tmp_path / "eobs.ndjson"
+    assert gen.write_eob_ndjson(str(ndjson)) == len(claims)
+    assert len(ndjson.read_text().splitlines()) == len(claims)
+    assert len(extract_sld_list(gen.eob_list())) == n_lines
+
+    slds_837 = extract_sld(gen.x12_837("837P"), "837") + extract_sld(gen.x12_837("837I"), "837")
+    assert len(slds_837) == n_lines
+    institutional = [sld for sld in slds_837 if sld.claim_type == "837I"]
+    assert all(sld.facility_type and sld.service_type for sld in institutional)
+
+    path_837 = tmp_path / "claims.txt"
+    gen.write_837(str(path_837), "837I")
+    assert extract_sld(path_837.read_text(), "837") == institutional
+
+
+def test_eob_and_837_renderings_score_the_same():
+    gen = SyntheticClaimsGenerator(seed=11, n_members=10)
+    processor = HCCInFHIR(model_name="CMS-HCC Model V28")
+    for index, (member_id, demographics) in enumerate(gen.demographics().items()):
+        claims = gen.member_claims(index)
+        fhir_result = processor.run([gen.render_eob(c) for c in claims], demographics)
+        slds_837 = [sld for claim_type in ("837P", "837I")
+                    for sld in extract_sld(gen.x12_837(claim_type, claims), "837")]
+        x12_result = processor.run_from_service_data(slds_837, demographics)
+        assert fhir_result.risk_score == pytest.approx(x12_result.risk_score)
+        assert set(fhir_result.hcc_list) == set(x12_result.hcc_list)
@@ -0,0 +1,94 @@
+"""
+Stress tests of the thread safety of the scoring core.
+
+Many threads start together (behind a barrier, with a short switch interval to
+force interleaving) and score the same synthetic members through one shared
+HCCInFHIR, starting from empty caches. Every thread must get exactly the results
+of a serial run, and the reference data must be loaded once.
+"""
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from hccinfhir import HCCInFHIR, IssueCollector
+from hccinfhir.cache import load_once
+from hccinfhir.filter import get_eligible_cpt_hcpcs
+from hccinfhir.model_compiled import compile_model
+from hccinfhir.model_hierarchies import apply_hierarchies
+from hccinfhir.synthetic import SyntheticClaimsGenerator
+
+N_THREADS = 16
+
+
+@pytest.fixture
+def fast_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run_together(func, n_threads=N_THREADS):
+    barrier = threading.Barrier(n_threads)
+
+    def task(i):
+        barrier.wait()
+        return func(i)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        return list(executor.map(task, range(n_threads)))
+
+
+def test_concurrent_scoring_is_deterministic(fast_switching):
+    generator = SyntheticClaimsGenerator(seed=11, n_members=30)
+    demographics = generator.demographics()
+    members = [(member_id, [generator.render_eob(c) for c in generator.member_claims(i)])
+               for i, member_id in enumerate(demographics)]
+
+    def score_all(processor, offset=0):
+        # Each thread walks the members from a different offset
+        ordered = members[offset:] + members[:offset]
+        results = {member_id: processor.run(eobs, demographics[member_id]).model_dump()
+                   for member_id, eobs in ordered}
+        return results
+
+    expected = score_all(HCCInFHIR())
+
+    compile_model.cache_clear()
+    get_eligible_cpt_hcpcs.cache_clear()
+    processor = HCCInFHIR(issues=IssueCollector())
+    results = _run_together(lambda i: score_all(processor, i % len(members)))
+
+    for result in results:
+        assert result == expected
+
+
+def test_load_once_under_contention(fast_switching):
+    calls = []
+
+    @load_once
+    def load(key):
+        calls.append(key)
+        return frozenset({key})
+
+    results = _run_together(lambda i: load(i % 2))
+
+    assert sorted(calls) == [0, 1]
+    assert all(result == frozenset({i % 2}) for i, result in enumerate(results))
+
+    compile_model.cache_clear()
+    models = _run_together(lambda i: compile_model("CMS-HCC Model V28"))
+    assert all(model is models[0] for model in models)
+
+
+def test_shared_tables_are_immutable():
+    model = compile_model("CMS-HCC Model V28")
+    with pytest.raises(TypeError):
+        model.coefficients[("HCC1", "CMS-HCC Model V28")] = 0.0
+    with pytest.raises(AttributeError):
+        model.hierarchies = {}
+    assert all(isinstance(ccs, frozenset) for ccs in model.dx_to_cc_mapping.values())
+
+    cc_set = {"223", "17"}
+    assert "223" not in apply_hierarchies(cc_set, "CMS-HCC Model V28", model.hierarchies)
+    assert cc_set == {"223", "17"}
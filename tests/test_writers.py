@@ -0,0 +1,92 @@
+import csv
+import json
+import pytest
+from hccinfhir import HCCInFHIR, ResultSink
+from hccinfhir.samples import get_demographics_sample, get_eob_sample_list
+from hccinfhir.writers import RESULT_SCHEMA, SERVICE_LINE_COLUMNS, open_table_writer
+
+
+@pytest.fixture(scope="module")
+def result():
+    processor = HCCInFHIR()
+    eobs = get_eob_sample_list()
+    demographics = get_demographics_sample()
+    service_data = processor._extract_service_data(eobs)
+    diagnosis_codes = processor._get_unique_diagnosis_codes(service_data)
+    multi = processor._calculate_raf_multi_from_demographics(
+        diagnosis_codes, processor._ensure_demographics(demographics),
+        ["CMS-HCC Model V28", "CMS-HCC Model V24"], None)
+    return multi.model_copy(update={'service_level_data': service_data})
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_sink_writes_results_hccs_and_service_lines(result, tmp_path):
+    with ResultSink(str(tmp_path / "scores.csv"), hcc_details=str(tmp_path / "hccs.csv"),
+                    service_lines=str(tmp_path / "slds.ndjson"), buffer_rows=2) as sink:
+        sink.write("M1", result)
+        sink.write("M2", None, "ValueError: bad member")
+
+    scores = read_csv(tmp_path / "scores.csv")
+    assert [(row["member_id"], row["model_name"]) for row in scores] == \
+        [("M1", "CMS-HCC Model V28"), ("M1", "CMS-HCC Model V24"), ("M2", "")]
+    v28 = result.results["CMS-HCC Model V28"]
+    assert float(scores[0]["risk_score"]) == pytest.approx(v28.risk_score)
+    assert scores[0]["hcc_list"] == ";".join(v28.hcc_list)
+    assert scores[2]["error"] == "ValueError: bad member"
+
+    hccs = read_csv(tmp_path / "hccs.csv")
+    assert len(hccs) == sum(len(r.hcc_list) for r in result.results.values())
+    first = hccs[0]
+    assert float(first["coefficient"]) == pytest.approx(v28.coefficients[first["hcc"]])
+    assert first["diagnosis_codes"].split(";") == sorted(v28.cc_to_dx[first["hcc"]])
+
+    slds = [json.loads(line) for line in (tmp_path / "slds.ndjson").read_text().splitlines()]
+    assert len(slds) == len(result.service_level_data)
+    assert list(slds[0]) == SERVICE_LINE_COLUMNS
+    assert slds[0]["claim_diagnosis_codes"] == result.service_level_data[0].claim_diagnosis_codes
+
+
+def test_rows_are_buffered(tmp_path):
+    writer = open_table_writer(str(tmp_path / "out.ndjson"), RESULT_SCHEMA, buffer_rows=3)
+    for i in range(5):
+        writer.write_row({"member_id": f"M{i}", "hcc_list": []})
+    assert len((tmp_path / "out.ndjson").read_text().splitlines()) == 0  # still in the file buffer
+    writer.flush()
+    writer._file.flush()
+    assert len((tmp_path / "out.ndjson").read_text().splitlines()) == 5
+    writer.close()
+
+
+@pytest.mark.parametrize("output", ["out.csv", "out.ndjson"])
+def test_write_columns(tmp_path, output):
+    pd = pytest.importorskip("pandas")
+    with open_table_writer(str(tmp_path / output), RESULT_SCHEMA) as writer:
+        writer.write_values(("M0", "CMS-HCC Model V28", 1.5, None, None, None, ["19"], None))
+        writer.write_columns({"member_id": ["M1", "M2"], "risk_score": [0.5, 0.25], "hcc_list": [["1"], []]})
+        writer.write_columns(pd.DataFrame({"member_id": ["M3"], "risk_score": [2.0], "hcc_list": [["2", "3"]]}))
+
+    assert writer.rows_written == 4
+    if output.endswith(".csv"):
+        rows = read_csv(tmp_path / output)
+        assert [row["hcc_list"] for row in rows] == ["19", "1", "", "2;3"]
+    else:
+        rows = [json.loads(line) for line in (tmp_path / output).read_text().splitlines()]
+        assert [row["hcc_list"] for row in rows] == [["19"], ["1"], [], ["2", "3"]]
+        assert rows[1]["model_name"] is None
+    assert [float(row["risk_score"]) for row in rows] == [1.5, 0.5, 0.25, 2.0]
+
+
+def test_parquet_columnar_batches(result, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    with ResultSink(str(tmp_path / "scores.parquet")) as sink:
+        sink.write("M1", result)
+        sink.results.write_columns(pa.table({"member_id": ["M2"], "risk_score": [0.5]}))
+
+    table = pq.read_table(tmp_path / "scores.parquet")
+    assert table.column("member_id").to_pylist() == ["M1", "M1", "M2"]
+    assert table.column("model_name").to_pylist()[2] is None